@@ -4,176 +4,189 @@
 # Last Update: 09/10/2025
 
 import asyncio
-import math
-import time 
 import threading
 from typing import Optional
 
-import st7735
-from PIL import Image, ImageDraw, ImageFont
-from fonts.ttf import RobotoBold as UserFont
-from bme280 import BME280
-from smbus2 import SMBus
-from enviroplus import gas 
+import config
+import metrics
+from Air_Quality.calibration import GasCalibration
+from Air_Quality.display import DisplayLock, LcdCompositor, default_font, default_layout
+from Air_Quality.ip_address import get_local_ip
+from Air_Quality.sampler import SensorSampler, summarise
+from Hardware.enviro import CHANNELS as SAMPLER_CHANNELS, NullDisplay
+from results_bus import ResultsBus
 
-try:
-    from ltr559 import LTR559
-    ltr559 = LTR559()
-except ImportError: 
-    import ltr559
+# Rolling window for the CPU temperature used in compensation
+CPU_TEMP_WINDOW_S = config.AQ_CPU_TEMP_WINDOW_S
 
-# Sensing Resistance Values for Gas conversion
-R0_OXIDISING = 200000  
-R0_REDUCING = 150000 
-R0_NH3 = 570000    
+IP_REFRESH_STEPS = 15  # ~30 s at the 2 s step rate
 
 class AirQualityTask:
     def __init__(
             self, 
             loop: asyncio.AbstractEventLoop,
             stop_event: asyncio.Event,
-            results_q: Optional[asyncio.Queue] = None ):
+            bus: Optional[ResultsBus] = None,
+            devices = None ):
         
         self.loop = loop
         self.stop_flag = threading.Event()
         self.inited = False
         self.stop_event = stop_event or asyncio.Event()
-        self.results_q = results_q 
+        self.bus = bus 
         self.cap = None
 
-        self.disp = st7735.ST7735(
-            port = 0, 
-            cs = 1, 
-            dc = "GPIO9", 
-            backlight = "GPIO12", 
-            rotation = 270, 
-            spi_speed_hz = 10000000
+        # Sensors and LCD come from a Hardware.enviro backend (the Enviro+ board unless one is passed in)
+        self._owns_devices = devices is None
+        if devices is None:
+            from Hardware.enviro import RealEnviro
+            devices = RealEnviro()
+        self.devices = devices
+        self.disp = devices.display
+        # The panel is ours while the app runs; a standalone IP screen sees this and exits
+        self.display_lock = DisplayLock(config.LCD_LOCK_PATH)
+        if not isinstance(self.disp, NullDisplay):
+            self.display_lock.acquire()
+
+        # Shared compositor: cached fonts/backgrounds, redraws only what changed
+        self.lcd = LcdCompositor(self.disp, max_fps = config.LCD_MAX_FPS)
+        default_layout(self.lcd, default_font())
+        self._steps = 0
+
+        # Sensors are read at SAMPLE_HZ on a background thread; step() only aggregates
+        self.sampler = SensorSampler(
+            self.read_raw,
+            SAMPLER_CHANNELS,
+            rate_hz = config.AQ_SAMPLE_HZ,
+            seconds = config.AQ_BUFFER_SECONDS,
+            paced = not devices.self_paced,
         )
+        self.sampler.start()
+        metrics.REGISTRY.gauge_fn("sampler_samples", lambda: self.sampler.count, "Sensor samples taken")
+        metrics.REGISTRY.gauge_fn("sampler_overruns", lambda: self.sampler.overruns,
+                                  "Sensor reads that missed their deadline")
+        metrics.REGISTRY.gauge_fn("sampler_errors", lambda: self.sampler.errors, "Sensor reads that raised")
 
-        self.disp.begin()
+        # Per-board R0 values and gas curves (see Air_Quality/calibration.json)
+        self.calibration = GasCalibration.load(config.AQ_CALIBRATION_PATH)
 
-        self.bus = SMBus(1)
-        self.bme280 = BME280(i2c_dev = self.bus)
-
-    # get_cpu_temperature: gets cpu temp for temperature compensation 
-    # Input: none 
-    # Output: CPU Temperature  
-    def get_cpu_temperature(self) -> float: 
-        try:
-            with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
-                temp = int(f.read())/ 1000
-                return temp
-        except Exception:
-            return 0.0
-
-    # get_compensate_temperature: temperature compensation 
+    # read_raw: one raw reading of every sensor, called by the sampler thread at SAMPLE_HZ 
     # Input: none 
+    # Output: dict of channel -> raw value (None where a sensor isn't available) 
+    def read_raw(self) -> dict: 
+        return self.devices.read()
+
+    # compensate_temperature: temperature compensation using the rolling CPU temperature window 
+    # Input: raw_temp: BME280 temperature to compensate 
     # Output: compensated temperature 
-    def compensate_temperature(self) -> float: 
+    def compensate_temperature(self, raw_temp: float) -> float: 
         factor = 2.25 
-        cpu_temps = [self.get_cpu_temperature()] * 5
-        cpu_temp = self.get_cpu_temperature()
-        cpu_temps = cpu_temps[1:] + [cpu_temp]
-        avg_cpu_temp = sum(cpu_temps) / float(len(cpu_temps))
-        raw_temp = self.bme280.get_temperature()
+        avg_cpu_temp = self.sampler.mean("cpu_temp", CPU_TEMP_WINDOW_S)
+        if avg_cpu_temp is None:
+            return raw_temp
         comp_temp = raw_temp - ((avg_cpu_temp - raw_temp) / factor)
         return comp_temp
-    
-    # get_sensor_data: reads data from all enviro+ sensors 
+
+    # get_sensor_data: aggregates everything sampled since the last call 
     # input: none
-    # output: a dict containing sensor readings linked with the measurement type 
+    # output: a dict with the mean of each measurement under the keys the app and dashboard use, 
+    #         plus mean/min/max/last of every channel under "stats" and the samples themselves under "series" 
     def get_sensor_data(self) -> dict: 
-        temperature = self.compensate_temperature() 
-        gas_readings = gas.read_all()
-        pressure = self.bme280.get_pressure()
-        humidity = self.bme280.get_humidity()
-        lux = ltr559.get_lux() if hasattr(ltr559, "get_lux") else None
-
-        try: 
-            raw_oxidising = gas_readings.oxidising()
-            raw_reducing = gas_readings.reducing()
-            raw_nh3 = gas_readings.nh3()
-
-            ratio_oxidising = raw_oxidising / R0_OXIDISING
-            ratio_reducing = raw_reducing / R0_REDUCING
-            ratio_nh3 = raw_nh3 / R0_NH3
-
-            if ratio_oxidising > 0: 
-                ppm_oxidising = math.pow(10, math.log10(ratio_oxidising) - 0.8129)
-            else:
-                ppm_oxidising = 0
-
-            if ratio_reducing > 0: 
-                ppm_reducing = math.pow(10, (-1.25 * math.log10(ratio_reducing)) + 0.64)
-            else:
-                ppm_reducing = 0
-
-            if ratio_nh3 > 0: 
-                ppm_nh3 = math.pow(10, (-1.8 * math.log10(ratio_nh3)) - 0.163)
-            else: 
-                ppm_nh3 = 0
-
-            data = { "Temperature": temperature, 
-                "Reducing Gas": ppm_reducing, 
-                "Oxidizing Gas": ppm_oxidising, 
-                "Nh3": ppm_nh3, 
-                "Pressure": pressure, 
-                "Humidity": humidity, 
-                "Light": lux
-            }
-        except (TypeError, ValueError):         
-            data = { "Temperature": temperature, 
-                "Reducing Gas": gas_readings.reducing(), 
-                "Oxidizing Gas": gas_readings.oxidising(), 
-                "Nh3": gas_readings.nh3(), 
-                "Pressure": pressure, 
-                "Humidity": humidity, 
-                "Light": lux
-            }
+        windows = self.sampler.drain(with_times = True)
+        times = windows.pop("t")
+
+        # Every sample is converted to ppm in one vectorised call, then summarised
+        ppm = self.calibration.to_ppm(
+            windows["raw_ox"], windows["raw_red"], windows["raw_nh3"],
+            temp = windows["raw_temp"], hum = windows["hum"])
+        windows["ox_gas"], windows["red_gas"], windows["nh3"] = ppm["oxidising"], ppm["reducing"], ppm["nh3"]
+        stats = {name: summarise(values) for name, values in windows.items()}
+
+        # Automatic R0 learning looks at the whole buffer, not just the last publish period
+        if self.calibration.baseline["enabled"]:
+            hist = self.sampler.windows(("raw_ox", "raw_red", "raw_nh3", "raw_temp", "hum"), config.AQ_BUFFER_SECONDS)
+            self.calibration.update_baseline(hist["raw_ox"], hist["raw_red"], hist["raw_nh3"],
+                                             temp = hist["raw_temp"], hum = hist["hum"])
+
+        def mean(name):
+            return stats[name]["mean"] if stats.get(name) else None
+
+        raw_temp = mean("raw_temp")
+        temperature = self.compensate_temperature(raw_temp) if raw_temp is not None else None
+
+        data = { "temp": temperature, 
+            "hum": mean("hum"), 
+            "light": mean("light"), 
+            "press": mean("press"), 
+            "red_gas": mean("red_gas"), 
+            "ox_gas": mean("ox_gas"), 
+            "nh3": mean("nh3"),
+            "samples": self.sampler.count,
+            "stats": stats,
+            # Every sample since the last publish (with ppm), for the time-series store
+            "series": dict(windows, t = times),
+        }
         return data
 
     # write_temp_to_lcd: writes temperature measurements to LCD 
     # input: temperature: the current temperature sensor reading 
     # return: none 
     def write_temp_to_lcd(self, temperature: float): 
-        img = Image.new('RGB', (self.disp.width, self.disp.height), color = (0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        rect_colour = (0, 180, 180)
-        draw.rectangle((0, 0, 160, 80), rect_colour)
-
-        font_size = 18 
-        font = ImageFont.truetype(UserFont, font_size)
+        self.lcd.set("temp", temperature)
+        self.lcd.render()
 
-        colour = (225, 225, 225)
-        disp_temperature = "Temp: {:.2f} *C".format(temperature)
-
-        x = 0 
-        y = 0 
-        draw.text((x, y), disp_temperature, font = font, fill = colour)
-        self.disp.display(img)
+    # update_lcd: updates every widget on the LCD; only changed widgets are redrawn 
+    # input: data: the dict returned by get_sensor_data 
+    # return: none 
+    def update_lcd(self, data: dict): 
+        self.lcd.set("temp", data["temp"])
+
+        alarms = [name for name, limit in config.AQ_GAS_ALARM_PPM.items()
+                  if data.get(name) is not None and data[name] > limit]
+        if alarms:
+            self.lcd.set("gas", "GAS: " + ", ".join(alarms))
+            self.lcd.set_style("gas", bg = (200, 0, 0))
+        else:
+            self.lcd.set("gas", "Gas OK")
+            self.lcd.set_style("gas", bg = (0, 120, 0))
+
+        # The address rarely changes; re-check it every IP_REFRESH_STEPS steps
+        if self._steps % IP_REFRESH_STEPS == 0:
+            self.lcd.set("ip", get_local_ip())
+        self._steps += 1
+
+        errors = self.sampler.errors
+        self.lcd.set("status", "Sensors OK" if not errors else f"Sensor errors: {errors}")
+        self.lcd.render()
+
+    # set_interval: called by the scheduler when it throttles this task; sampling slows down in proportion 
+    # input: interval: the new publish period in seconds 
+    # return: none 
+    def set_interval(self, interval: float): 
+        self.sampler.set_rate(config.AQ_SAMPLE_HZ * config.AQ_INTERVAL / interval)
 
     async def step(self): 
         if self.stop_event.is_set():
             return
-        data = await asyncio.to_thread(self.get_sensor_data)
-        await asyncio.to_thread(self.write_temp_to_lcd, data["Temperature"])
+        data = self.get_sensor_data()  # cheap: numpy reductions over the ring buffers
+        await asyncio.to_thread(self.update_lcd, data)
 
-        if self.results_q: 
-            try: 
-                self.results_q.put_nowait(data)
-            except asyncio.QueueFull:
-                pass
+        if self.bus: 
+            self.bus.publish("air_quality", data)
 
     def __enter__(self):
         return self 
 
     def __exit__(self, exc_type, exc_val, exc_tb): 
         self.shutdown()
-        if hasattr(self, 'bus'): 
-            self.bus.close()
 
     def shutdown(self):
-        try:
-            self.disp.set_backlight(0)
-        except Exception:
-            pass 
+        self.sampler.stop()
+        if self.calibration.baseline["enabled"]:
+            try:
+                self.calibration.save()  # keep the learnt R0 values for the next flight
+            except OSError:
+                pass
+        if self._owns_devices:
+            self.devices.close()
+        self.display_lock.release()
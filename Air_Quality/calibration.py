@@ -0,0 +1,137 @@
+# calibration.py
+# Vectorised MiCS-6814 gas calibration for the Enviro+ board.
+# Converts whole arrays of sensing resistances to ppm in one call, so the same
+# code serves the live sampler buffers and recorded history (e.g. recomputing a
+# flight after recalibrating). R0 values and curve coefficients are loaded per
+# board from a JSON file.
+
+import json
+import logging
+import os
+import socket
+from typing import Dict, Optional
+
+import numpy as np
+
+CHANNELS = ("oxidising", "reducing", "nh3")
+
+# ppm = 10 ** (slope * log10(R / R0) + intercept), matching the original hardcoded curves
+DEFAULT_CURVES = {
+    "oxidising": {"r0": 200000.0, "slope": 1.0, "intercept": -0.8129},
+    "reducing": {"r0": 150000.0, "slope": -1.25, "intercept": 0.64},
+    "nh3": {"r0": 570000.0, "slope": -1.8, "intercept": -0.163},
+}
+
+# Resistance is divided by 1 + temp_coeff * (T - ref_temp) + hum_coeff * (RH - ref_hum)
+DEFAULT_CORRECTION = {"ref_temp": 20.0, "ref_hum": 40.0, "temp_coeff": 0.0, "hum_coeff": 0.0}
+
+# Clean air is where reducing/NH3 resistance is highest and oxidising resistance lowest,
+# so the baseline is learnt from a high (or low) percentile of recent samples.
+DEFAULT_BASELINE = {"enabled": False, "alpha": 0.02, "min_samples": 100,
+                    "percentile": {"oxidising": 5.0, "reducing": 95.0, "nh3": 95.0}}
+
+
+def board_id() -> str:
+    """Raspberry Pi serial number, or the hostname when it can't be read."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("Serial"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return socket.gethostname()
+
+
+class GasCalibration:
+    def __init__(self, curves: Optional[dict] = None, correction: Optional[dict] = None,
+                 baseline: Optional[dict] = None, board: Optional[str] = None, path: Optional[str] = None):
+        self.curves = {ch: dict(DEFAULT_CURVES[ch], **(curves or {}).get(ch, {})) for ch in CHANNELS}
+        self.correction = {
+            ch: dict(DEFAULT_CORRECTION, **(correction or {}).get(ch, {})) for ch in CHANNELS
+        }
+        self.baseline = dict(DEFAULT_BASELINE, **(baseline or {}))
+        self.board = board
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str, board: Optional[str] = None) -> "GasCalibration":
+        """Loads this board's entry from path, falling back to "default" then the built-in curves."""
+        board = board or board_id()
+        try:
+            with open(path) as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            logging.warning(f"no gas calibration at {path}; using built-in curves")
+            return cls(board=board, path=path)
+        entry = doc.get("boards", {}).get(board) or doc.get("default", {})
+        return cls(entry.get("curves"), entry.get("correction"), entry.get("baseline"), board=board, path=path)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Writes this board's curves (including learnt R0 values) back to the file."""
+        path = path or self.path
+        try:
+            with open(path) as f:
+                doc = json.load(f)
+        except (FileNotFoundError, ValueError):
+            doc = {}
+        doc.setdefault("boards", {})[self.board] = {
+            "curves": self.curves,
+            "correction": self.correction,
+            "baseline": self.baseline,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(doc, f, indent=2)
+        os.replace(tmp, path)
+
+    def r0(self, channel: str) -> float:
+        return self.curves[channel]["r0"]
+
+    def corrected(self, channel: str, resistance, temp=None, hum=None) -> np.ndarray:
+        """Resistance with the temperature/humidity dependence divided out."""
+        r = np.asarray(resistance, dtype=np.float64)
+        c = self.correction[channel]
+        factor = 1.0
+        if temp is not None and c["temp_coeff"]:
+            factor = factor + c["temp_coeff"] * (np.asarray(temp, np.float64) - c["ref_temp"])
+        if hum is not None and c["hum_coeff"]:
+            factor = factor + c["hum_coeff"] * (np.asarray(hum, np.float64) - c["ref_hum"])
+        return r / factor
+
+    def channel_to_ppm(self, channel: str, resistance, temp=None, hum=None) -> np.ndarray:
+        curve = self.curves[channel]
+        ratio = self.corrected(channel, resistance, temp, hum) / curve["r0"]
+        out = np.zeros_like(ratio)
+        # Non-positive ratios (sensor not warmed up / bad read) map to 0 ppm, NaN stays NaN
+        ok = ratio > 0
+        np.power(10.0, curve["slope"] * np.log10(ratio, where=ok, out=np.ones_like(ratio)) + curve["intercept"],
+                 where=ok, out=out)
+        out[np.isnan(ratio)] = np.nan
+        return out
+
+    def to_ppm(self, oxidising, reducing, nh3, temp=None, hum=None) -> Dict[str, np.ndarray]:
+        """Converts arrays (or scalars) of raw resistances for all three channels at once."""
+        raw = {"oxidising": oxidising, "reducing": reducing, "nh3": nh3}
+        return {ch: self.channel_to_ppm(ch, raw[ch], temp, hum) for ch in CHANNELS}
+
+    def learn_baseline(self, channel: str, resistance, temp=None, hum=None) -> Optional[float]:
+        """Moves R0 towards the clean-air level seen in a window of samples.
+
+        Returns the new R0, or None when the window was too short to trust.
+        """
+        r = self.corrected(channel, resistance, temp, hum)
+        r = r[np.isfinite(r) & (r > 0)]
+        if r.size < self.baseline["min_samples"]:
+            return None
+        target = float(np.percentile(r, self.baseline["percentile"][channel]))
+        curve = self.curves[channel]
+        curve["r0"] += self.baseline["alpha"] * (target - curve["r0"])
+        return curve["r0"]
+
+    def update_baseline(self, oxidising, reducing, nh3, temp=None, hum=None) -> None:
+        if not self.baseline["enabled"]:
+            return
+        raw = {"oxidising": oxidising, "reducing": reducing, "nh3": nh3}
+        for ch in CHANNELS:
+            self.learn_baseline(ch, raw[ch], temp, hum)
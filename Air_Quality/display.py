@@ -0,0 +1,162 @@
+# display.py
+# Widget compositor for the 0.96" ST7735 LCD on the Enviro+ board.
+# Fonts and background tiles are built once, only widgets whose text changed
+# are redrawn, and pushes over SPI are rate limited. Shared by AirQualityTask
+# and the IP screen so both draw into the same frame instead of fighting.
+# DisplayLock keeps them off the panel at the same time: the app holds it for
+# as long as it runs, the IP screen only while it draws.
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+Colour = Tuple[int, int, int]
+
+
+@lru_cache(maxsize=None)
+def load_font(path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+    """ImageFont.truetype reads the file from disk; cache it per (font, size).
+
+    A path of None gives Pillow's built-in font.
+    """
+    if path is None:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1 only has the fixed-size bitmap font
+            return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+
+def default_font() -> Optional[str]:
+    """Path of Roboto Bold from the Pimoroni fonts package, or None when it isn't installed."""
+    try:
+        from fonts.ttf import RobotoBold
+    except ImportError:
+        logging.warning("LCD: fonts package not installed, using Pillow's built-in font")
+        return None
+    return RobotoBold
+
+
+class Widget:
+    def __init__(self, box: Tuple[int, int, int, int], font: ImageFont.FreeTypeFont,
+                 fmt: Callable[[object], str], fg: Colour, bg: Colour, centre: bool = False):
+        self.box = box
+        self.font = font
+        self.fmt = fmt
+        self.fg = fg
+        self.bg = bg
+        self.centre = centre
+        self.text: Optional[str] = None
+        x, y, w, h = box
+        self.tile = Image.new("RGB", (w, h), bg)  # cached background for this widget's area
+
+
+class LcdCompositor:
+    """Keeps one persistent canvas and redraws only the widgets whose text changed."""
+
+    def __init__(self, disp, max_fps: float = 2.0, background: Colour = (0, 0, 0)):
+        self.disp = disp
+        self.min_interval = 1.0 / max_fps
+        self.canvas = Image.new("RGB", (disp.width, disp.height), background)
+        self.draw = ImageDraw.Draw(self.canvas)
+        self.widgets: Dict[str, Widget] = {}
+        self._dirty = set()
+        self._last_push = 0.0
+        self._lock = threading.Lock()
+        self.pushes = 0
+
+    def add_widget(self, name: str, box: Tuple[int, int, int, int], font_path: str, font_size: int,
+                   fmt: Callable[[object], str] = str, fg: Colour = (225, 225, 225),
+                   bg: Colour = (0, 180, 180), centre: bool = False) -> None:
+        with self._lock:
+            self.widgets[name] = Widget(box, load_font(font_path, font_size), fmt, fg, bg, centre)
+            self._dirty.add(name)
+
+    def set(self, name: str, value) -> None:
+        """Updates a widget's value; it is only redrawn if its formatted text changed."""
+        with self._lock:
+            w = self.widgets[name]
+            text = w.fmt(value) if value is not None else "--"
+            if text != w.text:
+                w.text = text
+                self._dirty.add(name)
+
+    def set_style(self, name: str, fg: Optional[Colour] = None, bg: Optional[Colour] = None) -> None:
+        with self._lock:
+            w = self.widgets[name]
+            if (fg or w.fg) != w.fg or (bg or w.bg) != w.bg:
+                w.fg = fg or w.fg
+                if bg and bg != w.bg:
+                    w.bg = bg
+                    w.tile = Image.new("RGB", w.tile.size, bg)
+                self._dirty.add(name)
+
+    def render(self, force: bool = False) -> bool:
+        """Redraws dirty widgets and pushes the frame; returns True if the panel was updated.
+
+        Pushes are capped at max_fps. Changes that arrive in between stay dirty
+        and go out with the next render() call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._dirty and not force:
+                return False
+            if now - self._last_push < self.min_interval and not force:
+                return False
+            for name in self._dirty:
+                w = self.widgets[name]
+                x, y, bw, bh = w.box
+                self.canvas.paste(w.tile, (x, y))
+                text = w.text if w.text is not None else ""
+                if w.centre:
+                    x1, y1, x2, y2 = w.font.getbbox(text)
+                    tx = x + (bw - (x2 - x1)) / 2
+                    ty = y + (bh - (y2 - y1)) / 2 - y1
+                else:
+                    tx, ty = x, y
+                self.draw.text((tx, ty), text, font=w.font, fill=w.fg)
+            self._dirty.clear()
+            self._last_push = now
+            self.disp.display(self.canvas)
+            self.pushes += 1
+            return True
+
+
+class DisplayLock:
+    """Advisory lock (flock) on the LCD, shared between processes through a lock file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock; with blocking=False returns False if another process holds it."""
+        try:
+            import fcntl
+        except ImportError:
+            return True  # no flock (Windows): there is no Enviro+ panel to share there
+        if self._file is None:
+            self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # closing the file drops the flock
+            self._file = None
+
+
+# Standard layout for the 160x80 panel: four 20 px rows
+def default_layout(lcd: LcdCompositor, font_path: Optional[str]) -> None:
+    lcd.add_widget("temp", (0, 0, 160, 20), font_path, 18, fmt=lambda t: "Temp: {:.2f} *C".format(t))
+    lcd.add_widget("gas", (0, 20, 160, 20), font_path, 15, fmt=str)
+    lcd.add_widget("ip", (0, 40, 160, 20), font_path, 15, fmt=lambda ip: "IP: " + ip,
+                   fg=(255, 255, 255), bg=(255, 0, 0))
+    lcd.add_widget("status", (0, 60, 160, 20), font_path, 13, fmt=str, bg=(0, 0, 0))
@@ -1,80 +1,80 @@
 ## ip_address.py 
-# This script displays the local and public IP address on a 0.96" LCD using the ST7735 driver.
+# Shows the drone's local IP address on the Enviro+ LCD while the app isn't running,
+# so a headless drone can be found. The app shows it in the same widget.
 # Author: Lily Stacey 
 # Date: 2025-08-22
+# Run from the repository root: python3 -m Air_Quality.ip_address
 
 import logging
 import socket 
-import st7735
-from fonts.ttf import RobotoMedium as UserFont
-from PIL import Image, ImageDraw, ImageFont
-import os 
-import requests 
+import time
 
-# Get IP address by reaching out to Google's public DNS server
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-s.connect(("8.8.8.8", 80))
-public_ip = s.getsockname()[0]
-s.close()
+import config
+from Air_Quality.display import DisplayLock, LcdCompositor, default_font, default_layout
 
-logging.basicConfig(
-    format="%(asctime)s.%(msecs)03d %(levelname)-8s %(message)s",
-    level=logging.INFO,
-    datefmt="%Y-%m-%d %H:%M:%S")
+REFRESH_S = 30  # how often to re-check the address (DHCP may change it)
 
-logging.info(""" ip_address.py
-This script displays the local and public IP address on a 0.96" LCD using the ST7735 driver.
-Press Ctrl+C to exit!
-""")
-
-# Create LCD class instance.
-disp = st7735.ST7735(
-    port=0,
-    cs=1,
-    dc="GPIO9",
-    backlight="GPIO12",
-    rotation=270,
-    spi_speed_hz=10000000
-)
+# get_local_ip: IP address of the interface used to reach the internet 
+# input: none 
+# output: the address as a string, or "no network" 
+def get_local_ip() -> str: 
+    # Get IP address by reaching out to Google's public DNS server
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("8.8.8.8", 80))
+        return s.getsockname()[0]
+    except OSError:
+        return "no network"
+    finally:
+        s.close()
 
-# Initialize display.
-disp.begin()
 
-# Width and height to calculate text position.
-WIDTH = disp.width
-HEIGHT = disp.height
+def main():
+    logging.basicConfig(
+        format="%(asctime)s.%(msecs)03d %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S")
 
-# New canvas to draw on.
-img = Image.new("RGB", (WIDTH, HEIGHT), color=(0, 0, 0))
-draw = ImageDraw.Draw(img)
+    logging.info(""" ip_address.py
+Shows the local IP address on the 0.96" LCD until the app takes the display over.
+Press Ctrl+C to exit!
+""")
+    print(get_local_ip())
 
-# Text settings.
-font_size = 15
-font = ImageFont.truetype(UserFont, font_size)
-text_colour = (255, 255, 255)
-back_colour = (255, 0, 0)
+    # The app holds the lock for as long as it runs; don't draw over its screen
+    lock = DisplayLock(config.LCD_LOCK_PATH)
+    if not lock.acquire(blocking=False):
+        logging.info("the app is driving the LCD (its IP widget shows the address); exiting")
+        return
 
-#message = "IP: " + public_ip
-message = "IP: " + public_ip
+    # Hardware is imported here so get_local_ip works off the drone
+    from Hardware.enviro import open_display
+    disp = open_display()
 
-x1, y1, x2, y2 = font.getbbox(message)
-size_x = x2 - x1
-size_y = y2 - y1
+    # The app's layout, so the address sits where it will once the app starts
+    lcd = LcdCompositor(disp, max_fps=config.LCD_MAX_FPS)
+    default_layout(lcd, default_font())
+    lcd.set("status", "App not running")
+    lock.release()
 
-# Calculate text position
-x = (WIDTH - size_x) / 2
-y = (HEIGHT / 2) - (size_y / 2)
+    # Keep running; the compositor only pushes to the panel when the address changes.
+    try:
+        while True:
+            # Only draw while the app hasn't claimed the panel
+            if not lock.acquire(blocking=False):
+                logging.info("the app has taken over the LCD; exiting")
+                break
+            try:
+                lcd.set("ip", get_local_ip())
+                lcd.render()
+            finally:
+                lock.release()
+            time.sleep(REFRESH_S)
 
-# Draw background rectangle and write text.
-draw.rectangle((0, 0, 160, 80), back_colour)
-draw.text((x, y), message, font=font, fill=text_colour)
-disp.display(img)
+    # Turn off backlight on control-c
+    except KeyboardInterrupt:
+        disp.set_backlight(0)
 
-# Keep running.
-try:
-    while True:
-        pass
 
-# Turn off backlight on control-c
-except KeyboardInterrupt:
-    disp.set_backlight(0)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# sampler.py
+# High-rate sensor sampling into preallocated numpy ring buffers.
+# A background thread reads the Enviro+ sensors at a fixed rate; the 2 s
+# AirQualityTask step only aggregates what was collected since its last publish.
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+ERROR_LOG_INTERVAL = 60.0  # seconds between log lines while read() keeps failing
+
+
+class RingBuffer:
+    """Fixed-capacity ring of float samples with their timestamps."""
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.values = np.full(self.capacity, np.nan)
+        self.times = np.zeros(self.capacity)
+        self.count = 0  # total samples ever written; the write index is count % capacity
+
+    def append(self, value: Optional[float], t: float) -> None:
+        i = self.count % self.capacity
+        self.values[i] = np.nan if value is None else value
+        self.times[i] = t
+        self.count += 1
+
+    # Last n samples in time order (a copy, so it is safe to use after the lock is released)
+    def last(self, n: int) -> np.ndarray:
+        n = min(n, self.count, self.capacity)
+        if n <= 0:
+            return self.values[:0].copy()
+        end = self.count % self.capacity
+        start = end - n
+        if start >= 0:
+            return self.values[start:end].copy()
+        return np.concatenate((self.values[start:], self.values[:end]))
+
+    def last_times(self, n: int) -> np.ndarray:
+        n = min(n, self.count, self.capacity)
+        end = self.count % self.capacity
+        start = end - n
+        if start >= 0:
+            return self.times[start:end].copy()
+        return np.concatenate((self.times[start:], self.times[:end]))
+
+
+def summarise(values: np.ndarray) -> Optional[dict]:
+    """mean / min / max / last of a window, ignoring missing (NaN) samples."""
+    valid = values[~np.isnan(values)]
+    if valid.size == 0:
+        return None
+    return {
+        "mean": float(valid.mean()),
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "last": float(valid[-1]),
+        "n": int(valid.size),
+    }
+
+
+class SensorSampler:
+    """Calls read() at rate_hz on its own thread and keeps one RingBuffer per channel.
+
+    read() returns a dict of channel -> value (None for a missing reading).
+    aggregate() summarises everything sampled since the previous aggregate()
+    call, which is what gets published at the slower rate. With paced=False
+    read() sets the pace itself (e.g. a replayed recording) and is called back
+    to back; rate_hz then only sizes the buffers and windows.
+    """
+
+    def __init__(self, read: Callable[[], Dict[str, Optional[float]]], channels: Iterable[str],
+                 rate_hz: float = 10.0, seconds: float = 60.0, paced: bool = True):
+        self.read = read
+        self.period = 1.0 / rate_hz
+        self.paced = paced
+        capacity = max(1, int(rate_hz * seconds))
+        self.buffers = {name: RingBuffer(capacity) for name in channels}
+        self._lock = threading.Lock()
+        self._halt = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._published = 0  # sample count at the last aggregate()
+        self.count = 0
+        self.errors = 0
+        self.overruns = 0
+        self._failing = 0  # consecutive failed reads
+        self._logged_at = -ERROR_LOG_INTERVAL
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="aq-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._halt.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # Changes the sampling rate on the fly (e.g. throttled while the camera is saturated).
+    # Buffers keep their size, so they then cover a longer or shorter span of time.
+    def set_rate(self, rate_hz: float) -> None:
+        self.period = 1.0 / rate_hz
+
+    def sample_once(self) -> None:
+        try:
+            reading = self.read()
+        except Exception:
+            self.errors += 1
+            self._failing += 1
+            # A dead I2C bus fails every read; say so straight away, then once a minute
+            now = time.monotonic()
+            if self._failing == 1 or now - self._logged_at >= ERROR_LOG_INTERVAL:
+                self._logged_at = now
+                logging.exception(f"sensor read failed ({self._failing} in a row, {self.errors} in total)")
+            return
+        if self._failing:
+            logging.info(f"sensor reads recovered after {self._failing} failures")
+            self._failing = 0
+        t = time.time()
+        with self._lock:
+            for name, buf in self.buffers.items():
+                buf.append(reading.get(name), t)
+            self.count += 1
+
+    def _run(self) -> None:
+        deadline = time.monotonic()
+        while not self._halt.is_set():
+            self.sample_once()
+            if not self.paced:
+                continue
+            deadline += self.period
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Fell behind (slow I2C read); restart the schedule rather than bursting
+                self.overruns += 1
+                deadline = time.monotonic()
+                delay = 0
+            self._halt.wait(delay)
+
+    def window(self, name: str, seconds: float) -> np.ndarray:
+        """Samples of one channel from the last `seconds`, oldest first."""
+        n = int(round(seconds / self.period))
+        with self._lock:
+            return self.buffers[name].last(n)
+
+    def windows(self, names: Iterable[str], seconds: float) -> Dict[str, np.ndarray]:
+        """Like window() for several channels, taken together so the arrays line up."""
+        n = int(round(seconds / self.period))
+        with self._lock:
+            return {name: self.buffers[name].last(n) for name in names}
+
+    def mean(self, name: str, seconds: float) -> Optional[float]:
+        s = summarise(self.window(name, seconds))
+        return s["mean"] if s else None
+
+    def drain(self, with_times: bool = False) -> Dict[str, np.ndarray]:
+        """Per-channel arrays of every sample since the last drain()/aggregate() call.
+
+        with_times adds the sample timestamps (time.time()) under "t".
+        """
+        with self._lock:
+            n = self.count - self._published
+            self._published = self.count
+            out = {name: buf.last(n) for name, buf in self.buffers.items()}
+            if with_times and self.buffers:
+                out["t"] = next(iter(self.buffers.values())).last_times(n)
+            return out
+
+    def aggregate(self) -> Dict[str, Optional[dict]]:
+        """Per-channel mean/min/max/last over the samples since the last call."""
+        return {name: summarise(values) for name, values in self.drain().items()}
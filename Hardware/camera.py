@@ -0,0 +1,252 @@
+# camera.py
+# Camera backends with the subset of the cv2.VideoCapture API the pipeline uses
+# (isOpened / read(image) / set / get / release), so FrameGrabber and CameraTask
+# don't care whether frames come from the USB camera, a recording or a generator.
+
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from Hardware.recording import RecordingReader, RecordingWriter, ReplayClock
+
+
+def _into(image: Optional[np.ndarray], frame: np.ndarray) -> np.ndarray:
+    # Honour read(image): fill the caller's buffer in place when the shape matches
+    if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+        np.copyto(image, frame)
+        return image
+    return frame
+
+
+class RealCamera:
+    """The onboard USB camera."""
+
+    def __init__(self, index: int = 23):
+        self.cap = cv2.VideoCapture(index)  # On bottom USB3 port, 23-26, 31-34 were identifiable
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self, image: Optional[np.ndarray] = None):
+        return self.cap.read(image) if image is not None else self.cap.read()
+
+    def set(self, prop: int, value) -> bool:
+        return self.cap.set(prop, value)
+
+    def get(self, prop: int) -> float:
+        return self.cap.get(prop)
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+def negotiate(cap, width: int = 0, height: int = 0, fourcc: str = "", fps: float = 0.0) -> Tuple[int, int, str, float]:
+    """Asks any camera backend for a pixel format, resolution and frame rate (0/"" = leave as is).
+
+    The driver picks the nearest mode it supports, so what was granted is read
+    back and returned as (width, height, fourcc, fps). The pixel format goes
+    first: on V4L2 it decides which resolutions are available, and MJPG is
+    what lets USB cameras deliver full resolution at full frame rate.
+    """
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if width:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    if height:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    granted = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)) if code else ""
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            granted, cap.get(cv2.CAP_PROP_FPS))
+
+
+def discover_cameras(candidates: Iterable[int], limit: int = 0) -> Dict[int, RealCamera]:
+    """Opens every candidate device index that delivers a frame, up to limit (0 = no limit).
+
+    One USB camera shows up as several /dev/video nodes, of which only the
+    capture node produces frames, so probing a range finds each camera once.
+    """
+    found: Dict[int, RealCamera] = {}
+    for index in candidates:
+        cam = RealCamera(index)
+        if cam.isOpened() and cam.read()[0]:
+            found[index] = cam
+            if limit and len(found) >= limit:
+                break
+        else:
+            cam.release()
+    return found
+
+
+class RecordingCamera:
+    """Wraps another camera and writes every frame it reads to a recording."""
+
+    def __init__(self, inner, writer: RecordingWriter):
+        self.inner = inner
+        self.writer = writer
+
+    def isOpened(self) -> bool:
+        return self.inner.isOpened()
+
+    def read(self, image: Optional[np.ndarray] = None):
+        ok, frame = self.inner.read(image)
+        if ok:
+            self.writer.write_frame(frame)
+        return ok, frame
+
+    def set(self, prop: int, value) -> bool:
+        return self.inner.set(prop, value)
+
+    def get(self, prop: int) -> float:
+        return self.inner.get(prop)
+
+    def release(self) -> None:
+        self.inner.release()
+
+
+class RecordedCamera:
+    """Plays the frames of a recording back, paced by a shared ReplayClock.
+
+    read() returns (False, None) at the end of the recording, which stops the
+    app exactly like an unplugged camera would, unless loop is set.
+    """
+
+    def __init__(self, reader: RecordingReader, clock: ReplayClock, loop: bool = False):
+        self.reader = reader
+        self.clock = clock
+        self.loop = loop
+        self._i = 0
+        self._opened = bool(reader.frames)
+        self._halt = threading.Event()
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def read(self, image: Optional[np.ndarray] = None):
+        if self._i >= len(self.reader.frames):
+            if not self.loop or not self.reader.frames:
+                self.clock.advance(math.inf)  # let followers play out the rest of their readings
+                return False, None
+            self._i = 0
+        rec = self.reader.frames[self._i]
+        self._i += 1
+        self.clock.wait(rec.timestamp, self._halt)
+        if self._halt.is_set():
+            return False, None
+        self.clock.advance(rec.timestamp)
+        return True, _into(image, self.reader.frame(rec))
+
+    def set(self, prop: int, value) -> bool:
+        return False
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.reader.frames))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._i)
+        return 0.0
+
+    def release(self) -> None:
+        self._halt.set()
+        self._opened = False
+        self.clock.advance(math.inf)
+
+
+class SyntheticCamera:
+    """Generates a deterministic scene: a dial gauge with a sweeping needle and an ArUco marker.
+
+    The scene drifts slowly so the motion gate and tracker have something to do.
+    fps=0 generates frames as fast as they are read.
+    """
+
+    def __init__(self, width: int = 1280, height: int = 720, fps: float = 30.0, seed: int = 0,
+                 marker_id: int = 7, dictionary: str = "DICT_4X4_50"):
+        self.width = width
+        self.height = height
+        self.period = 1.0 / fps if fps else 0.0
+        self.rng = np.random.default_rng(seed)
+        self.n = 0
+        self._next = time.monotonic()
+        self._opened = True
+        self._halt = threading.Event()
+        self._background = self._make_background()
+        self._marker = None
+        aruco = getattr(cv2, "aruco", None)
+        if aruco is not None:
+            d = aruco.getPredefinedDictionary(getattr(aruco, dictionary))
+            size = min(width, height) // 5
+            gen = getattr(aruco, "generateImageMarker", None) or aruco.drawMarker
+            self._marker = cv2.cvtColor(gen(d, marker_id, size), cv2.COLOR_GRAY2BGR)
+
+    def _make_background(self) -> np.ndarray:
+        # Low-frequency texture so optical flow finds corners to track
+        small = self.rng.integers(60, 160, (self.height // 40 + 1, self.width // 40 + 1, 3), dtype=np.uint8)
+        return cv2.resize(small, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+
+    def _render(self, image: Optional[np.ndarray]) -> np.ndarray:
+        t = self.n * (self.period or 1 / 30)
+        frame = _into(image, self._background)
+        if frame is self._background:
+            frame = self._background.copy()
+        # Slow circular drift, like a hovering drone
+        dx = int(20 * math.sin(t * 0.5))
+        dy = int(10 * math.cos(t * 0.3))
+
+        h, w = self.height, self.width
+        cx, cy, r = w // 3 + dx, h // 2 + dy, min(w, h) // 5
+        cv2.circle(frame, (cx, cy), r, (235, 235, 235), -1)
+        cv2.circle(frame, (cx, cy), r, (30, 30, 30), 4)
+        for k in range(9):
+            a = math.radians(135 + k * 33.75)
+            cv2.putText(frame, str(k * 500), (int(cx + 0.72 * r * math.cos(a)) - 18, int(cy + 0.72 * r * math.sin(a)) + 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 200), 1, cv2.LINE_AA)
+        sweep = math.radians(135 + 270 * (0.5 + 0.5 * math.sin(t * 0.2)))
+        tip = (int(cx + 0.85 * r * math.cos(sweep)), int(cy + 0.85 * r * math.sin(sweep)))
+        cv2.line(frame, (cx, cy), tip, (0, 0, 220), 5, cv2.LINE_AA)
+        cv2.circle(frame, (cx, cy), 8, (20, 20, 20), -1)
+
+        if self._marker is not None:
+            m = self._marker.shape[0]
+            x0, y0 = 2 * w // 3 + dx, h // 2 - m // 2 + dy
+            if 0 <= x0 and x0 + m <= w and 0 <= y0 and y0 + m <= h:
+                frame[y0:y0 + m, x0:x0 + m] = self._marker
+        return frame
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def read(self, image: Optional[np.ndarray] = None):
+        if not self._opened:
+            return False, None
+        if self.period:
+            self._next += self.period
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                self._halt.wait(delay)
+            else:
+                self._next = time.monotonic()
+        frame = self._render(image)
+        self.n += 1
+        return True, frame
+
+    def set(self, prop: int, value) -> bool:
+        return False
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return 1.0 / self.period if self.period else 0.0
+        return 0.0
+
+    def release(self) -> None:
+        self._opened = False
+        self._halt.set()
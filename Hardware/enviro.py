@@ -0,0 +1,181 @@
+# enviro.py
+# Enviro+ backends. Each one provides read() -> dict of raw channel values (the
+# same keys AirQualityTask samples) and a `display` with the bits of the
+# st7735.ST7735 API the LCD compositor uses. The hardware libraries are only
+# imported by RealEnviro, so recorded and synthetic runs work on any laptop.
+
+import math
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from Hardware.recording import RecordingReader, RecordingWriter, ReplayClock
+
+CHANNELS = ("raw_temp", "cpu_temp", "press", "hum", "light", "raw_ox", "raw_red", "raw_nh3")
+
+
+class NullDisplay:
+    """Stands in for the ST7735 off the drone; keeps the last frame for inspection."""
+
+    def __init__(self, width: int = 160, height: int = 80):
+        self.width = width
+        self.height = height
+        self.image = None
+        self.frames = 0
+
+    def begin(self) -> None:
+        pass
+
+    def display(self, image) -> None:
+        self.image = image
+        self.frames += 1
+
+    def set_backlight(self, value) -> None:
+        pass
+
+
+def open_display():
+    """The Enviro+ ST7735 LCD, initialised (for the IP screen, which needs no sensors)."""
+    import st7735
+    display = st7735.ST7735(
+        port=0,
+        cs=1,
+        dc="GPIO9",
+        backlight="GPIO12",
+        rotation=270,
+        spi_speed_hz=10000000,
+    )
+    display.begin()
+    return display
+
+
+def get_cpu_temperature() -> float:
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
+            return int(f.read()) / 1000
+    except Exception:
+        return 0.0
+
+
+class RealEnviro:
+    """BME280, LTR559, MiCS-6814 and the ST7735 LCD on the Enviro+ board."""
+
+    self_paced = False
+
+    def __init__(self):
+        from bme280 import BME280
+        from enviroplus import gas
+        from smbus2 import SMBus
+        try:
+            from ltr559 import LTR559
+            self.ltr559 = LTR559()
+        except ImportError:
+            import ltr559
+            self.ltr559 = ltr559
+
+        self.display = open_display()
+        self.gas = gas
+        self.bus = SMBus(1)
+        self.bme280 = BME280(i2c_dev=self.bus)
+
+    def read(self) -> dict:
+        gas_readings = self.gas.read_all()
+        return {
+            "raw_temp": self.bme280.get_temperature(),
+            "cpu_temp": get_cpu_temperature(),
+            "press": self.bme280.get_pressure(),
+            "hum": self.bme280.get_humidity(),
+            "light": self.ltr559.get_lux() if hasattr(self.ltr559, "get_lux") else None,
+            "raw_ox": gas_readings.oxidising(),
+            "raw_red": gas_readings.reducing(),
+            "raw_nh3": gas_readings.nh3(),
+        }
+
+    def close(self) -> None:
+        try:
+            self.display.set_backlight(0)
+        except Exception:
+            pass
+        self.bus.close()
+
+
+class RecordingEnviro:
+    """Wraps another backend and logs every reading it returns."""
+
+    def __init__(self, inner, writer: RecordingWriter):
+        self.inner = inner
+        self.writer = writer
+        self.display = inner.display
+        self.self_paced = inner.self_paced
+
+    def read(self) -> dict:
+        reading = self.inner.read()
+        self.writer.write_sensor(reading)
+        return reading
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class RecordedEnviro:
+    """Plays back recorded readings in time with the recorded camera frames.
+
+    read() blocks until the next reading is due, so the sampler should not add
+    its own pacing (self_paced). When replaying as fast as possible, a reading
+    is due once the camera has replayed the frames up to it. After the last
+    reading it keeps returning it.
+    """
+
+    self_paced = True
+
+    def __init__(self, reader: RecordingReader, clock: ReplayClock, display=None):
+        self.reader = reader
+        self.clock = clock
+        self.display = display or NullDisplay()
+        self._i = 0
+        self._last = {name: None for name in CHANNELS}
+        self._halt = threading.Event()
+
+    def read(self) -> dict:
+        if self._i < len(self.reader.sensors):
+            rec = self.reader.sensors[self._i]
+            self._i += 1
+            self.clock.follow(rec.timestamp, self._halt)
+            self._last = self.reader.sensor(rec)
+        else:
+            self._halt.wait(0.1)  # out of readings; don't spin the sampler
+        return self._last
+
+    def close(self) -> None:
+        self._halt.set()
+
+
+class SyntheticEnviro:
+    """Plausible, reproducible readings: slow drifts plus noise, and an occasional gas plume."""
+
+    self_paced = False
+
+    def __init__(self, seed: int = 0, display=None):
+        self.rng = np.random.default_rng(seed)
+        self.display = display or NullDisplay()
+        self._t0 = time.monotonic()
+
+    def read(self) -> dict:
+        t = time.monotonic() - self._t0
+        n = self.rng.normal
+        plume = math.exp(-((t % 120.0) - 60.0) ** 2 / 50.0)  # a 10 s plume every two minutes
+        return {
+            "raw_temp": 24.0 + 0.5 * math.sin(t / 60.0) + n(0, 0.05),
+            "cpu_temp": 48.0 + n(0, 0.3),
+            "press": 1013.0 + n(0, 0.1),
+            "hum": 40.0 + 2.0 * math.sin(t / 90.0) + n(0, 0.2),
+            "light": max(0.0, 300.0 + n(0, 5.0)),
+            "raw_ox": 20000.0 * (1 + 3 * plume) + n(0, 200.0),
+            "raw_red": 300000.0 / (1 + 4 * plume) + n(0, 2000.0),
+            "raw_nh3": 600000.0 / (1 + 2 * plume) + n(0, 4000.0),
+        }
+
+    def close(self) -> None:
+        pass
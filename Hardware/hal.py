@@ -0,0 +1,95 @@
+# hal.py
+# Picks the camera and Enviro+ backends for a run:
+#   real       the drone hardware
+#   synthetic  generated camera frames and sensor readings
+#   replay     a recording made with record_path set, at recorded speed or as fast as possible
+# With record_path set (real or synthetic), everything read is also written to a recording.
+# Several cameras can run at once (config.CAMERA_INDICES or CAMERA_DISCOVER); they are keyed
+# by camera id and the first one is the primary camera.
+
+import logging
+from typing import Dict, Optional
+
+import config
+from Hardware.camera import RealCamera, RecordedCamera, RecordingCamera, SyntheticCamera, discover_cameras
+from Hardware.enviro import RealEnviro, RecordedEnviro, RecordingEnviro, SyntheticEnviro
+from Hardware.recording import RecordingReader, RecordingWriter, ReplayClock
+
+MODES = ("real", "synthetic", "replay")
+
+
+def camera_name(index: int) -> str:
+    return config.CAMERA_NAMES.get(index, f"cam{index}")
+
+
+class Hal:
+    def __init__(self, cameras: Dict[str, object], enviro, writer: Optional[RecordingWriter] = None,
+                 reader: Optional[RecordingReader] = None, clock: Optional[ReplayClock] = None):
+        self.cameras = cameras  # camera id -> backend, primary first
+        self.enviro = enviro
+        self.writer = writer
+        self.reader = reader
+        self.clock = clock
+
+    @property
+    def camera(self):
+        """The primary camera."""
+        return next(iter(self.cameras.values()))
+
+    @property
+    def fast(self) -> bool:
+        """True when replaying as fast as possible (nothing should wait on wall time)."""
+        return self.clock is not None and not self.clock.realtime
+
+    def close(self) -> None:
+        self.enviro.close()
+        if self.writer:
+            self.writer.close()
+        if self.reader:
+            self.reader.close()
+
+
+def open_hal(mode: Optional[str] = None, record_path: Optional[str] = None,
+             replay_path: Optional[str] = None, speed: Optional[float] = None) -> Hal:
+    mode = mode or config.HAL_MODE
+    record_path = record_path if record_path is not None else config.HAL_RECORD_PATH
+    replay_path = replay_path if replay_path is not None else config.HAL_REPLAY_PATH
+    speed = config.HAL_REPLAY_SPEED if speed is None else speed
+    if mode not in MODES:
+        raise ValueError(f"unknown HAL mode {mode!r}, expected one of {MODES}")
+
+    if mode == "replay":
+        if not replay_path:
+            raise ValueError("replay mode needs a recording (HAL_REPLAY_PATH / --replay)")
+        reader = RecordingReader(replay_path)
+        clock = ReplayClock(reader.start_time or 0.0, speed)
+        return Hal({"replay": RecordedCamera(reader, clock)}, RecordedEnviro(reader, clock),
+                   reader=reader, clock=clock)
+
+    if mode == "real":
+        cameras, enviro = _real_cameras(), RealEnviro()
+    else:
+        cameras = {f"synthetic{i}": SyntheticCamera(fps=config.HAL_SYNTHETIC_FPS, seed=i)
+                   for i in range(max(1, config.HAL_SYNTHETIC_CAMERAS))}
+        enviro = SyntheticEnviro()
+
+    writer = None
+    if record_path:
+        # Recordings hold one camera stream; the primary camera's
+        writer = RecordingWriter(record_path)
+        primary = next(iter(cameras))
+        cameras[primary] = RecordingCamera(cameras[primary], writer)
+        enviro = RecordingEnviro(enviro, writer)
+    return Hal(cameras, enviro, writer=writer)
+
+
+def _real_cameras() -> Dict[str, RealCamera]:
+    if config.CAMERA_DISCOVER:
+        found = discover_cameras(config.CAMERA_CANDIDATES, limit=config.CAMERA_MAX)
+        logging.info(f"cameras found at {sorted(found) or 'none'}")
+    else:
+        found = {index: RealCamera(index) for index in config.CAMERA_INDICES}
+    if not found:
+        # Nothing answered; open the default so CameraTask reports it like a missing camera
+        found = {config.CAMERA_INDEX: RealCamera(config.CAMERA_INDEX)}
+    return {camera_name(index): cam for index, cam in found.items()}
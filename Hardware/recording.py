@@ -0,0 +1,172 @@
+# recording.py
+# Compact on-disk log of timestamped camera frames and sensor readings.
+#
+# File layout: MAGIC, then records of
+#   kind (u8) | timestamp (f64, unix seconds) | length (u32) | payload
+# Frames are stored as JPEG, sensor readings as JSON. The reader indexes record
+# offsets once so replay never has to parse payloads it doesn't need.
+
+import json
+import math
+import struct
+import threading
+import time
+from typing import Iterator, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+MAGIC = b"EGH455REC1\n"
+FRAME = 1
+SENSOR = 2
+_HEADER = struct.Struct("<BdI")
+
+
+class Record(NamedTuple):
+    kind: int
+    timestamp: float
+    offset: int   # file offset of the payload
+    length: int
+
+
+class RecordingWriter:
+    """Appends records from any thread (camera grabber, sensor sampler)."""
+
+    def __init__(self, path: str, jpeg_quality: int = 90):
+        self.path = path
+        self.jpeg_quality = jpeg_quality
+        self._f = open(path, "wb")
+        self._f.write(MAGIC)
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.readings = 0
+
+    def _append(self, kind: int, timestamp: float, payload: bytes) -> None:
+        with self._lock:
+            self._f.write(_HEADER.pack(kind, timestamp, len(payload)))
+            self._f.write(payload)
+
+    def write_frame(self, frame: np.ndarray, timestamp: Optional[float] = None) -> None:
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if ok:
+            self._append(FRAME, time.time() if timestamp is None else timestamp, buf.tobytes())
+            self.frames += 1
+
+    def write_sensor(self, reading: dict, timestamp: Optional[float] = None) -> None:
+        payload = json.dumps(reading, separators=(",", ":")).encode()
+        self._append(SENSOR, time.time() if timestamp is None else timestamp, payload)
+        self.readings += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+
+class RecordingReader:
+    """Random access to a recording; records are indexed by kind on open."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        if self._f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an EGH455 recording")
+        self._lock = threading.Lock()
+        self.records: List[Record] = []
+        while True:
+            head = self._f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                break  # end of file, or a record cut short by a crash
+            kind, ts, length = _HEADER.unpack(head)
+            offset = self._f.tell()
+            if offset + length > self._file_size():
+                break
+            self.records.append(Record(kind, ts, offset, length))
+            self._f.seek(length, 1)
+        self.frames = [r for r in self.records if r.kind == FRAME]
+        self.sensors = [r for r in self.records if r.kind == SENSOR]
+
+    def _file_size(self) -> int:
+        pos = self._f.tell()
+        self._f.seek(0, 2)
+        size = self._f.tell()
+        self._f.seek(pos)
+        return size
+
+    @property
+    def start_time(self) -> Optional[float]:
+        return self.records[0].timestamp if self.records else None
+
+    def payload(self, rec: Record) -> bytes:
+        with self._lock:
+            self._f.seek(rec.offset)
+            return self._f.read(rec.length)
+
+    def frame(self, rec: Record) -> np.ndarray:
+        return cv2.imdecode(np.frombuffer(self.payload(rec), np.uint8), cv2.IMREAD_COLOR)
+
+    def sensor(self, rec: Record) -> dict:
+        return json.loads(self.payload(rec))
+
+    def iter_frames(self) -> Iterator:
+        for rec in self.frames:
+            yield rec.timestamp, self.frame(rec)
+
+    def iter_sensors(self) -> Iterator:
+        for rec in self.sensors:
+            yield rec.timestamp, self.sensor(rec)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class ReplayClock:
+    """Maps recorded timestamps onto wall time so every replayed device stays in step.
+
+    speed 1.0 replays at recorded speed, 2.0 twice as fast; speed 0 (or None)
+    means as fast as possible, i.e. wait() never sleeps. The camera then sets
+    the pace: it advance()s the clock to each frame it hands out, and devices
+    that follow() it release their readings only up to that point.
+    """
+
+    def __init__(self, start_time: float, speed: Optional[float] = 1.0):
+        self.start_time = start_time
+        self.speed = speed or 0.0
+        self._origin: Optional[float] = None
+        self._lock = threading.Lock()
+        self._position = -math.inf  # recorded time of the newest frame replayed
+        self._moved = threading.Condition(self._lock)
+
+    @property
+    def realtime(self) -> bool:
+        return self.speed > 0
+
+    def wait(self, timestamp: float, stop: Optional[threading.Event] = None) -> None:
+        if not self.realtime:
+            return
+        with self._lock:
+            if self._origin is None:
+                self._origin = time.monotonic()
+        due = self._origin + (timestamp - self.start_time) / self.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def advance(self, timestamp: float) -> None:
+        """Called by the camera for each replayed frame (math.inf once it runs out)."""
+        with self._moved:
+            if timestamp > self._position:
+                self._position = timestamp
+                self._moved.notify_all()
+
+    def follow(self, timestamp: float, stop: Optional[threading.Event] = None) -> None:
+        """Like wait(), but when replaying as fast as possible, waits for the camera to get there."""
+        if self.realtime:
+            self.wait(timestamp, stop)
+            return
+        with self._moved:
+            while self._position < timestamp and not (stop is not None and stop.is_set()):
+                self._moved.wait(0.1)
@@ -0,0 +1,177 @@
+# aruco.py
+# ArUco marker detection restricted to the YOLO "marker" boxes.
+# Detectors for every candidate dictionary are built once; once one dictionary
+# has produced consistent hits it is locked in and remembered between runs.
+# OpenCV's predefined dictionaries of one marker size share their first codes
+# (DICT_4X4_50 is the start of DICT_4X4_100), so a hit counts for the largest
+# candidate of its family; otherwise low ids would lock in the smallest one
+# and every marker above its range would go unseen.
+
+import json
+import logging
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+CANDIDATE_DICTS = [
+    "DICT_4X4_50", "DICT_4X4_100", "DICT_4X4_250",
+    "DICT_5X5_50", "DICT_5X5_100", "DICT_5X5_250",
+    "DICT_6X6_50", "DICT_6X6_100", "DICT_6X6_250",
+    "DICT_APRILTAG_36h11",  # include if your sheet might be AprilTags
+]
+
+
+def _family(name: str) -> Tuple[str, int]:
+    # "DICT_4X4_100" -> ("DICT_4X4", 100); names without a size are a family of their own
+    prefix, _, size = name.rpartition("_")
+    return (prefix, int(size)) if size.isdigit() else (name, 0)
+
+
+class ArucoDetectorPool:
+    """Prebuilt ArucoDetectors plus the logic to pick and lock a dictionary."""
+
+    def __init__(self, candidates: Iterable[str] = CANDIDATE_DICTS, lock_after: int = 5,
+                 state_path: Optional[str] = None, roi_pad: float = 0.25, min_roi: int = 120,
+                 max_upscale: float = 4.0):
+        params = cv2.aruco.DetectorParameters()
+        self.detectors = {
+            name: cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, name)), params)
+            for name in candidates
+        }
+        self.order = list(self.detectors)
+        # Each candidate's largest superset among the candidates (itself if none)
+        self.widest = {
+            name: max((n for n in self.detectors if _family(n)[0] == _family(name)[0]),
+                      key=lambda n: _family(n)[1])
+            for name in self.detectors
+        }
+        self.lock_after = lock_after
+        self.state_path = state_path
+        self.roi_pad = roi_pad
+        self.min_roi = min_roi
+        self.max_upscale = max_upscale
+        self.locked: Optional[str] = None
+        self._streak_name: Optional[str] = None
+        self._streak = 0
+        self._load_state()
+
+    def _load_state(self) -> None:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                name = json.load(f).get("dictionary")
+        except (OSError, ValueError):
+            return
+        if name in self.detectors:
+            self.locked = self.widest[name]
+            logging.info(f"ArUco dictionary {self.locked} restored from {self.state_path}")
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"dictionary": self.locked}, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logging.warning(f"could not save ArUco state: {e}")
+
+    def unlock(self) -> None:
+        """Forget the locked dictionary, e.g. when the marker sheet changes."""
+        self.locked = None
+        self._streak_name, self._streak = None, 0
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def _record_hit(self, name: str) -> None:
+        name = self.widest[name]
+        if name == self._streak_name:
+            self._streak += 1
+        else:
+            self._streak_name, self._streak = name, 1
+        # Try the dictionary that last worked first next time
+        self.order.remove(name)
+        self.order.insert(0, name)
+        if self._streak >= self.lock_after:
+            self.locked = name
+            logging.info(f"ArUco dictionary locked to {name}")
+            self._save_state()
+
+    # Padded grayscale crop around a box, upscaled when the marker is small.
+    # Returns the crop plus (x0, y0, scale) for mapping corners back to the frame.
+    def _crop(self, frame: np.ndarray, bbox) -> Tuple[np.ndarray, Tuple[int, int, float]]:
+        H, W = frame.shape[:2]
+        x1, y1, x2, y2 = (float(v) for v in bbox)
+        px, py = (x2 - x1) * self.roi_pad, (y2 - y1) * self.roi_pad
+        x0, y0 = max(int(x1 - px), 0), max(int(y1 - py), 0)
+        xe, ye = min(int(x2 + px), W), min(int(y2 + py), H)
+        crop = frame[y0:ye, x0:xe]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        scale = 1.0
+        side = min(crop.shape[:2]) if crop.size else 0
+        if 0 < side < self.min_roi:
+            scale = min(self.min_roi / side, self.max_upscale)
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        return crop, (x0, y0, scale)
+
+    def candidates(self) -> List[str]:
+        """Dictionaries to try, in order: just the locked one once there is one."""
+        return [self.locked] if self.locked else list(self.order)
+
+    def _detect_one(self, gray: np.ndarray, names: List[str]):
+        for name in names:
+            corners, ids, _ = self.detectors[name].detectMarkers(gray)
+            if ids is not None and len(ids) > 0:
+                return name, corners, ids
+        return None, (), None
+
+    def detect(self, frame: np.ndarray, boxes: Optional[Iterable] = None) -> Tuple[List[np.ndarray], Optional[np.ndarray], Optional[str]]:
+        """Detects markers inside boxes (or the whole frame if none are given).
+
+        Returns (corners, ids, dictionary name) in full-frame coordinates, in the
+        same shapes cv2.aruco.drawDetectedMarkers expects.
+        """
+        result = self.search(frame, boxes, self.candidates())
+        self.observe(result[2])
+        return result
+
+    def observe(self, used: Optional[str]) -> None:
+        """Counts a hit for the dictionary a search() found markers with, towards locking it."""
+        if used and not self.locked:
+            self._record_hit(used)
+
+    def search(self, frame: np.ndarray, boxes: Optional[Iterable], names: List[str]) -> Tuple[List[np.ndarray], Optional[np.ndarray], Optional[str]]:
+        """detect() without the lock-in bookkeeping, trying the given dictionaries.
+
+        Only reads the prebuilt detectors, so it can run off the camera thread
+        (or in a worker process with its own pool) and be observe()d afterwards.
+        """
+        boxes = list(boxes) if boxes is not None else []
+        if not boxes:
+            boxes = [(0, 0, frame.shape[1], frame.shape[0])]
+
+        all_corners, all_ids, used = [], [], None
+        seen = set()
+        for bbox in boxes:
+            crop, (x0, y0, scale) = self._crop(frame, bbox)
+            if crop.size == 0:
+                continue
+            name, corners, ids = self._detect_one(crop, names)
+            if ids is None:
+                continue
+            used = name
+            for c, i in zip(corners, ids.flatten()):
+                if int(i) in seen:  # overlapping boxes can see the same marker twice
+                    continue
+                seen.add(int(i))
+                all_corners.append((c / scale + (x0, y0)).astype(np.float32))
+                all_ids.append(int(i))
+
+        if not all_ids:
+            return [], None, used
+        return all_corners, np.array(all_ids, np.int32).reshape(-1, 1), used
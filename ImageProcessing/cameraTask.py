@@ -3,35 +3,91 @@
 # Last Update: 08/10/2025 by Hunter Wilde
 
 import asyncio
-import math
+import logging
 import threading
 from collections import defaultdict
 from datetime import datetime
+from functools import partial
 from typing import Any, Dict, Optional
 
 import cv2
 import numpy as np
-import pytesseract
 from PIL import Image
-from inference_sdk import InferenceHTTPClient
-from ultralytics import YOLO
+
+import config
+import metrics
+from Hardware.camera import RealCamera, negotiate
+from ImageProcessing.aruco import ArucoDetectorPool
+from ImageProcessing.capture import FrameGrabber, LatestFrame
+from ImageProcessing.events import EventDetector
+from ImageProcessing.executor import STAGE_STALE, OrderedPipeline, StageExecutor, StaleFrame
+from ImageProcessing.frame_buffer import FrameRing
+from ImageProcessing.gauge_ocr import GaugeOcr, extract_candidates, mask_text, ocr_batch
+from ImageProcessing.inference import InferenceBackend, draw_detections, make_backend
+from ImageProcessing.motion_gate import MotionGate
+from ImageProcessing.tracking import AngleSmoother, DetectionTracker, needle_angle
+from results_bus import ResultsBus
 
 class CameraTask:
     def __init__(self, loop: asyncio.AbstractEventLoop, stop_event: asyncio.Event,
-                 results_q: Optional[asyncio.Queue] | None = None):
+                 bus: Optional[ResultsBus] = None,
+                 frames: Optional[FrameRing] = None,
+                 backend: Optional[InferenceBackend] = None,
+                 camera=None, lossless: bool = False, executor: Optional[StageExecutor] = None,
+                 camera_id: Optional[str] = None, aruco_state_path: Optional[str] = config.ARUCO_STATE_PATH):
         self.loop = loop  # event loop to post back into
         self.stop_flag = threading.Event()  # thread-safe flag for this worker thread
-        self.results_q = results_q  # optional queue to publish detections
+        self.bus = bus  # optional results bus; payloads go to the "camera" topic
+        self.camera_id = camera_id  # tags payloads when several cameras publish to the bus
+        # Frames are published as FrameRefs into this ring rather than as arrays
+        self._owns_frames = frames is None
+        self.frames = frames if frames is not None else FrameRing()
         self._inited = False
+        self._size_checked = False  # first frame checked against the ring's slot size
         self.stop_event = stop_event or asyncio.Event()
-        self.cap = None
-
-        self.aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
-        self.aruco_params = cv2.aruco.DetectorParameters()
-        # self.aruco_detector = cv2.aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
-        self.aruco_detector = None
+        self.cap = camera  # any Hardware.camera backend; the USB camera unless one is passed in
+        self.model = backend  # built from config in _init_hw unless one is passed in
+        # Closed on shutdown only if built here; a passed-in model or executor may be shared
+        self._owns_model = backend is None
+        self._owns_executor = executor is None
+        # OCR preparation and ArUco search run through this (inline, threads or worker processes);
+        # frames still waiting on it are finished and published strictly in order
+        self.executor = executor
+        self.pipeline = OrderedPipeline()
+        # Frames that may be waiting on the executor while the next one is processed; bounded
+        # by the ring so a frame's slot can't be reused before its stages have read it
+        self.max_pending = max(0, min(config.VISION_MAX_PENDING, (self.frames.slots - 3) // 2))
+        self.annotated_frame = None
+        # Newest frame from the grabber thread, plus its detection-resolution copy
+        self.latest = LatestFrame(max_age=0.2, lossless=lossless, detect_width=config.DETECT_WIDTH)
+        self.grabber: Optional[FrameGrabber] = None
+        for stat in ("grabbed", "dropped", "late"):
+            metrics.REGISTRY.gauge_fn("camera_frames", lambda stat=stat: getattr(self.latest, stat),
+                                      "Frames by capture outcome", outcome=stat, camera=camera_id or "")
+
+        # Detectors for all candidate dictionaries, built once; locks onto one after a few hits
+        self.aruco = ArucoDetectorPool(
+            lock_after=config.ARUCO_LOCK_AFTER,
+            state_path=aruco_state_path,
+            roi_pad=config.ARUCO_ROI_PAD,
+            min_roi=config.ARUCO_MIN_ROI,
+        )
+        self.frame = None  # raw (unannotated) frame for the current step
+        self.gauge_ocr = GaugeOcr()  # scale numerals are read once per gauge then cached
+        self.scale_numbers = []
+        # Full detector pass every few frames; boxes are tracked with optical flow in between
+        self.tracker = DetectionTracker(detect_every=config.TRACK_DETECT_EVERY, low_conf=config.TRACK_LOW_CONF)
+        self.needle_smoothers: Dict[Any, AngleSmoother] = {}
+        # Skips inference on frames that barely differ from the last inferred one
+        self.gate = MotionGate(
+            method=config.MOTION_GATE_METHOD,
+            threshold=config.MOTION_GATE_THRESHOLD,
+            max_skip=config.MOTION_GATE_MAX_SKIP,
+        ) if config.MOTION_GATE else None
 
         self.payload = {}
+        # Valve, marker and gauge state; only changes go out, on the "events" topic
+        self.events = EventDetector(camera_id, confirm=config.EVENT_CONFIRM, psi_band=config.EVENT_PSI_BAND)
 
         self.object_actions = {
             "gauge": self.handle_gauge,
@@ -41,21 +97,46 @@ class CameraTask:
             "valve_closed": self.handle_valve_closed,
             "marker": self.handle_marker
         }
+        # Handlers whose heavy part can be offloaded: submit it ahead, finish with the result
+        self.stage_submitters = {
+            self.handle_gauge: self._submit_gauge,
+            self.handle_marker: self._submit_marker,
+        }
 
         print("Starting webcam detection... Press 'q' to quit.")
 
+    # Builds the detector selected in config.py (local ONNX by default, no network needed)
+    @staticmethod
+    def _make_backend() -> InferenceBackend:
+        kind = config.INFERENCE_BACKEND
+        if kind == "onnx":
+            return make_backend(kind, model_path=config.MODEL_PATH, imgsz=config.MODEL_IMGSZ,
+                                conf=config.CONF_THRESHOLD, iou=config.IOU_THRESHOLD,
+                                threads=config.INFERENCE_THREADS)
+        if kind == "ultralytics":
+            return make_backend(kind, model_path=config.MODEL_PATH, imgsz=config.MODEL_IMGSZ,
+                                conf=config.CONF_THRESHOLD, iou=config.IOU_THRESHOLD,
+                                half=config.MODEL_HALF)
+        if kind == "roboflow":
+            return make_backend(kind, api_url=config.ROBOFLOW_API_URL, api_key=config.ROBOFLOW_API_KEY,
+                                model_id=config.ROBOFLOW_MODEL_ID)
+        return make_backend(kind)
+
     def _init_hw(self):
-        # Load the YOLOv5 model
-        #self.model = YOLO('yolov5s.pt')  # Replace with custom model 'yolov5n.pt' once completed
+        # Load the detection model once; the session is reused for every frame
+        if not self._load_model():
+            return
 
-        # Connect to the roboflow API
-        self.model = InferenceHTTPClient(
-            api_url="https://serverless.roboflow.com",
-            api_key="tD2CNvbXmeLSQZ5QGdup"
-        )
+        if self.executor is None:
+            self.executor = StageExecutor(
+                self.frames, config.VISION_STAGES,
+                workers=config.VISION_WORKERS,
+                start_method=config.VISION_START_METHOD,
+                aruco_kwargs=dict(roi_pad=config.ARUCO_ROI_PAD, min_roi=config.ARUCO_MIN_ROI),
+            )
 
-        # Open webcam (0 = default camera) needs to be updated for the onboard camera not laptop webcam
-        self.cap = cv2.VideoCapture(23) # On bottom USB3 port, 23-26, 31-34 were identifiable
+        if self.cap is None:
+            self.cap = RealCamera(config.CAMERA_INDEX)
 
         if not self.cap.isOpened():
             print("Cannot open camera")
@@ -63,33 +144,59 @@ class CameraTask:
             self.stop_flag.set()
             return
 
+        # Capture format first (MJPG at full resolution), then keep the driver queue short;
+        # the grabber thread drains it continuously anyway
+        width, height, fourcc, fps = negotiate(self.cap, config.CAMERA_WIDTH, config.CAMERA_HEIGHT,
+                                               config.CAMERA_FOURCC, config.CAMERA_FPS)
+        logging.info(f"camera {self.camera_id or config.CAMERA_INDEX}: {width}x{height} {fourcc or '?'} @ {fps:g} fps")
+        # Backends that can't report a size (recordings) are checked on their first frame instead
+        if width and height and not self._fits_ring(height, width):
+            return
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.grabber = FrameGrabber(self.cap, self.latest)
+        self.grabber.start()
+
+    # A missing or unreadable model would fail every step, so stop with a message that says what to set
+    def _load_model(self) -> bool:
+        try:
+            if self.model is None:
+                self.model = self._make_backend()
+            self.model.names  # a shared detector is only built on first use; build it now
+            return True
+        except Exception as e:
+            logging.error(f"cannot load the {config.INFERENCE_BACKEND!r} detector ({e}); point EGH455_MODEL_PATH "
+                          f"at an exported model (see README: Detection model) or choose another "
+                          f"EGH455_INFERENCE_BACKEND")
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+            self.stop_flag.set()
+            return False
+
+    # Frames are written to the ring every step; one it can't hold would fail every step, so stop now
+    def _fits_ring(self, height, width) -> bool:
+        max_h, max_w = self.frames.max_shape[:2]
+        if height * width <= max_h * max_w and height <= max_h and width <= max_w:
+            return True
+        logging.error(f"camera {self.camera_id or config.CAMERA_INDEX} delivers {width}x{height}, larger than "
+                      f"the frame ring's {max_w}x{max_h}; set EGH455_FRAME_MAX_SHAPE or EGH455_CAMERA_WIDTH/HEIGHT")
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.stop_flag.set()
+        return False
+
     def shutdown(self):
         self.stop_flag.set()  # NEW: release resources here
+        self.latest.close()  # wakes a grabber waiting for a lossless hand-off
+        if self.grabber:
+            self.grabber.stop()
         if self.cap:
             self.cap.release()
-        cv2.destroyAllWindows()
-
-    def make_detector(self, dict_id):
-        aruco_dict = cv2.aruco.getPredefinedDictionary(dict_id)
-        return cv2.aruco.ArucoDetector(aruco_dict, self.aruco_params)
-
-    def autodetect_aruco_dict(self, gray):
-        """Tries several common aruso dictionaries and returns the one with the most hits."""
-        candidate_dicts = [
-            cv2.aruco.DICT_4X4_50, cv2.aruco.DICT_4X4_100, cv2.aruco.DICT_4X4_250,
-            cv2.aruco.DICT_5X5_50, cv2.aruco.DICT_5X5_100, cv2.aruco.DICT_5X5_250,
-            cv2.aruco.DICT_6X6_50, cv2.aruco.DICT_6X6_100, cv2.aruco.DICT_6X6_250,
-            cv2.aruco.DICT_APRILTAG_36h11  # include if your sheet might be AprilTags
-        ]
-        best = (None, -1, None)  # (dict_id, count, (corners, ids))
-
-        for d in candidate_dicts:
-            det = self.make_detector(d)
-            corners, ids, _ = det.detectMarkers(gray)
-            cnt = 0 if ids is None else len(ids)
-            if cnt > best[1]:
-                best = (d, cnt, (corners, ids))
-        return best
+        if self.model and self._owns_model:
+            self.model.close()
+        if self.executor and self._owns_executor:
+            self.executor.close()  # frames still pending are dropped
+        if config.SHOW_WINDOW:
+            cv2.destroyAllWindows()
+        if self._owns_frames:
+            self.frames.close()
 
     def renderAnnotatedGuage(self, coordinate, frame, info, theta):
         # Writes text and boxes on each frame - used for boxes, degrees, and psi
@@ -127,176 +234,139 @@ class CameraTask:
 
     # mask_text and ocr_numbers_from_mask are additional function for the identification of the guage text
     # mask_text takes either red or black and and will singel out the text with that particular colour
-    def mask_text(frame, color='red'):
-        "Return a binary mask for red or black text"
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-        if color == 'red':
-            # Two hue bands for red
-            lower1 = np.array([0, 90, 80], np.uint8)
-            upper1 = np.array([10, 255, 255], np.uint8)
-            lower2 = np.array([170, 90, 80], np.uint8)
-            upper2 = np.array([180, 255, 255], np.uint8)
-            m1 = cv2.inRange(hsv, lower1, upper1)
-            m2 = cv2.inRange(hsv, lower2, upper2)
-            mask = cv2.bitwise_or(m1, m2)
-        else:
-            # Black/gray: low value & low saturation (exclude colored stuff)
-            # Tweak thresh if needed
-            s, v = hsv[:, :, 1], hsv[:, :, 2]
-            mask = cv2.inRange(s, 0, 60) & cv2.inRange(v, 0, 120)
-
-        # Clean small noise
-        kernel = np.ones((3, 3), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=1)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=1)
-        return mask
-
-    # tesseract_psm = 7 for small dissconneced text good for the guage numbers
-    def ocr_numbers_from_mask(img_bgr, mask, tesseract_psm=7):
-        "OCR masked regions; returns list of (numbers, bbox)."
-        # keep only masked pixels
-        masked = cv2.bitwise_and(img_bgr, img_bgr, mask=mask)
-        gray = cv2.cvtColor(masked, cv2.COLOR_BGR2GRAY)
-        gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
-        # binary for OCR; Tesseract prefers dark text on light bg
-        _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        if (th == 0).sum() < (th == 255).sum():
-            th = cv2.bitwise_not(th)
-
-        # find candidate regions
-        contours, _ = cv2.findContours((th < 128).astype(np.uint8) * 255,
-                                       cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        H, W = th.shape
-        cfg = f"--oem 3 --psm {tesseract_psm} -c tessedit_char_whitelist=0123456789"
-        out = []
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            if w * h < 150 or h < 12:
-                continue
-            pad = 4
-            x0, y0 = max(x - pad, 0), max(y - pad, 0)
-            x1, y1 = min(x + w + pad, W), min(y + h + pad, H)
-            crop = th[y0:y1, x0:x1]
-
-            # quick deskew per region
-            rect = cv2.minAreaRect(cnt)
-            angle = rect[2]
-            if angle < -45: angle += 90
-            M = cv2.getRotationMatrix2D(((x1 - x0) // 2, (y1 - y0) // 2), angle, 1.0)
-            crop = cv2.warpAffine(crop, M, (x1 - x0, y1 - y0),
-                                  flags=cv2.INTER_LINEAR,
-                                  borderMode=cv2.BORDER_CONSTANT, borderValue=255)
-
-            txt = pytesseract.image_to_string(crop, config=cfg).strip()
-            digits = "".join(ch for ch in txt if ch.isdigit())
-            if digits:
-                out.append((digits, [int(x0), int(y0), int(x1), int(y1)]))
-        return out
-
-    # Make data available to other threads
-    def _publish(self, payload: Dict[str, Any]) -> None:
-        """Called on the event loop thread via call_soon_threadsafe."""
-        if not self.results_q:
-            return
-        try:
-            self.results_q.put_nowait(payload)  # non-blocking; may raise QueueFull
-        except asyncio.QueueFull:
-            # drop oldest / newest as desired; simplest: drop this one
-            pass
+    # (Lives in gauge_ocr so executor worker processes can run it without importing this module)
+    mask_text = staticmethod(mask_text)
 
-    def handle_gauge(self, frame, detections, full_context):
+    # Batched replacement for the old per-contour OCR: one tesseract call for all regions.
+    # Use self.gauge_ocr.read() instead when the gauge identity is known, to get caching.
+    @staticmethod
+    def ocr_numbers_from_mask(img_bgr, mask):
+        "OCR masked regions; returns list of (numbers, bbox)."
+        candidates = extract_candidates(img_bgr, mask)
+        texts = ocr_batch([crop for crop, _ in candidates])
+        return [(digits, bbox) for digits, (_, bbox) in zip(texts, candidates) if digits]
+
+    # Make data available to other threads: hand the payload to the bus on the event loop thread
+    def _publish(self, payload: Dict[str, Any], topic: str = "camera") -> None:
+        if self.bus:
+            self.loop.call_soon_threadsafe(self.bus.publish, topic, payload)
+
+    # Gauge the handler will read the scale from, and the executor's half of that read
+    @staticmethod
+    def _ocr_gauge(full_context):
+        gauge_det = next((d for d in reversed(full_context) if d["name"].lower() == "gauge"), None)
+        if gauge_det is None or gauge_det["roi"] is None or gauge_det.get("tracked"):
+            return None
+        return gauge_det
+
+    def _submit_gauge(self, ref, detections, full_context):
+        gauge_det = self._ocr_gauge(full_context)
+        return self.executor.submit("gauge_prepare", ref, gauge_det["bbox"]) if gauge_det else None
+
+    def _submit_marker(self, ref, detections, full_context):
+        return self.executor.submit("aruco_search", ref, [det["bbox"] for det in detections],
+                                    self.aruco.candidates())
+
+    def handle_gauge(self, frame, detections, full_context, staged=None):
+        timestamp = datetime.now().isoformat()
+        center_bbox = needle_bbox = gauge_det = None
         for det in full_context:
             name = det["name"].lower()
-            if name == "centre":
+            if name in ("centre", "gauge_centre"):
                 center_bbox = det["bbox"]
             elif name == "needle_tip":
                 needle_bbox = det["bbox"]
-        if center_bbox is not None and needle_bbox is not None:
-            center_x_side_center = center_bbox[0] + ((center_bbox[2] - center_bbox[0]) / 2)
-            center_y_side_center = center_bbox[1] + ((center_bbox[3] - center_bbox[1]) / 2)
-
-            tip_x_side_center = needle_bbox[0] + ((needle_bbox[2] - needle_bbox[0]) / 2)
-            tip_y_side_center = needle_bbox[1] + ((needle_bbox[3] - needle_bbox[1]) / 2)
-
-            dy = tip_y_side_center - center_y_side_center
-            dx = tip_x_side_center - center_x_side_center
-            theta = math.atan2(dy, dx)
-            theta = math.degrees(theta)
-            theta = round(theta)
-
-            # Changes negative theta to appropriate value
-            if theta < 0:
-                theta *= -1
-                theta = (180 - theta) + 180
-
-            # Sets new starting point
-            theta = theta - 90
-
-            # Changes negative thetat to appropriate value
-            if theta < 0:
-                theta *= -1
-                theta = theta + 270
-
-            # theta of 74 is 500 psi and theta of 173 is 2,000 psi
-            if theta <= 74 or theta >= 173:
-                Drill_Trigger = False
+            elif name == "gauge":
+                gauge_det = det
+
+        # Tracked identity of the gauge, stable across frames while the tracker holds it
+        gauge_id = gauge_det.get("track_id") if gauge_det is not None else None
+
+        # Scale numerals only need reading on full detector passes; the OCR cache does the rest.
+        # staged is the executor's GaugeOcr.prepare() result when the step offloaded it
+        if self._ocr_gauge(full_context) is not None:
+            if staged is None:
+                roi = gauge_det["roi"]
+                staged = GaugeOcr.prepare(roi, self.mask_text(roi, 'black'))
+            self.scale_numbers = self.gauge_ocr.resolve(staged, gauge_id)
+
+        if center_bbox is None or needle_bbox is None:
+            return None
+
+        center = ((center_bbox[0] + center_bbox[2]) / 2, (center_bbox[1] + center_bbox[3]) / 2)
+        tip = ((needle_bbox[0] + needle_bbox[2]) / 2, (needle_bbox[1] + needle_bbox[3]) / 2)
+        smoother = self.needle_smoothers.setdefault(gauge_id, AngleSmoother(config.NEEDLE_SMOOTHING))
+        theta = round(smoother.update(needle_angle(center, tip)))
+
+        # theta of 74 is 500 psi and theta of 173 is 2,000 psi
+        psi = int(15.21 * theta - 638.21)  # TODO: Fill out the right values
+        self.payload = {
+            "timestamp": timestamp,
+            "info": self._public_detections(detections),
+            "gauge_theta": theta,
+            "gauge_psi": psi,
+            "Drill_Trigger": 74 < theta < 173,
+            "scale_numbers": [n for n, _ in self.scale_numbers],
+        }
+        return self.payload
 
-    def handle_valve_open(self, frame, detections, full_context):
+    def handle_valve_open(self, frame, detections, full_context, staged=None):
         timestamp = datetime.now().isoformat()
-        cv2.imshow("YOLOv5 Live", frame)
+        self._show(frame)
         self.payload = {
             "timestamp": timestamp,
-            "image": frame,
-            "info": detections,
+            "info": self._public_detections(detections),
             "Valve_position": "open",
         }
 
-    def handle_valve_closed(self, frame, detections, full_context):
+    def handle_valve_closed(self, frame, detections, full_context, staged=None):
         timestamp = datetime.now().isoformat()
-        cv2.imshow("YOLOv5 Live", frame)
+        self._show(frame)
         self.payload = {
             "timestamp": timestamp,
-            "image": frame,
-            "info": detections,
+            "info": self._public_detections(detections),
             "Valve_position": "closed",
         }
 
-    def handle_marker(self, frame, detections, full_context):
+    def handle_marker(self, frame, detections, full_context, staged=None):
         timestamp = datetime.now().isoformat()
-        for det in detections:
-            src = det["roi"] if det["roi"] is not None else frame
-            # Skip tiny ROIs; use full frame if the crop is too small
-            h, w = src.shape[:2]
-            if min(h, w) < 60:
-                src = frame  # fallback to full frame for robustness
-
-        # Work in grayscale for detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        if self.aruco_detector is None:
-            dict_id, count, first = self.autodetect_aruco_dict(gray)
-            if dict_id is not None and count > 0:
-                self.aruco_dict_id = dict_id
-                self.aruco_detector = self.make_detector(dict_id)
-        corners, ids, _ = self.aruco_detector.detectMarkers(gray)
+
+        # Only search inside the YOLO marker boxes (padded, upscaled if small), on the raw frame.
+        # staged is the executor's search of the same boxes when the step offloaded it
+        if staged is None:
+            src = self.frame if self.frame is not None else frame
+            corners, ids, dict_name = self.aruco.detect(src, [det["bbox"] for det in detections])
+        else:
+            corners, ids, dict_name = staged
+            self.aruco.observe(dict_name)
         self.payload = {}
 
         if ids is not None and len(ids) > 0:
             cv2.aruco.drawDetectedMarkers(frame, corners, ids)
-            cv2.imshow("YOLOv5 Live", frame)
+            self._show(frame)
             self.payload = {
                 "timestamp": timestamp,
-                "image": gray,
-                "info": detections,
-                "ArUco_Marker_id": ids
+                "info": self._public_detections(detections),
+                "ArUco_Marker_id": ids.flatten().tolist(),
+                "ArUco_dictionary": dict_name,
             }
         else:
-            cv2.imshow("YOLOv5 Live", gray)
-            print("YOLO said marker ≥80%, but no ArUco found")
+            self._show(frame)
+            logging.debug("YOLO said marker ≥80%, but no ArUco found")
         return self.payload
 
+    # Preview window; off for headless runs (replay/benchmarks on a laptop or CI)
+    def _show(self, frame):
+        if config.SHOW_WINDOW:
+            cv2.imshow(f"YOLOv5 Live {self.camera_id}" if self.camera_id else "YOLOv5 Live", frame)
+
+    # Maps detections from the detection copy onto the full frame (copies; the tracker keeps its own)
+    @staticmethod
+    def _upscale(detections, scale):
+        if scale == 1.0:
+            return detections
+        return [dict(d, bbox=np.asarray(d["bbox"], np.float32) * scale) for d in detections]
+
     # Takes a imaged maked by YOLO box and returns just the box as a image
     # Reduces comput time as only box area is proccesed. 
     def _crop_roi(self, frame, xyxy):
@@ -309,11 +379,83 @@ class CameraTask:
 
         return frame if x2 <= x1 or y2 <= y1 else frame[y1:y2, x1:x2]  # fallback
 
+    # Detections without the roi arrays, which would otherwise keep the whole frame alive
+    # in the queue. Consumers crop from the ring frame using bbox if they need pixels.
+    @staticmethod
+    def _public_detections(detections):
+        return [
+            {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in det.items() if k != "roi"}
+            for det in detections
+        ]
+
     # Turn images from cam into jpeg for sending to ques and using in website.
     def _encode_jpeg(self, img, quality: int = 85):
         ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
         return buf.tobytes() if ok else None
 
+    # Republishes the last payload for a frame the motion gate judged unchanged
+    def _reuse_payload(self, frame, timestamp):
+        # Earlier frames may still be in the executor; the repeat goes out after them
+        if len(self.pipeline):
+            frame = frame.copy()  # the grabber reuses this buffer after the next take()
+        self.pipeline.add(lambda staged: self._republish(frame, timestamp))
+        self.pipeline.drain()
+
+    def _republish(self, frame, timestamp):
+        payload = dict(self.payload, timestamp=timestamp, reused=True)
+        payload["capture"] = self.latest.stats()
+        payload["gate"] = self.gate.stats()
+        # The ring may have wrapped since; only then is the frame written again
+        if not self.frames.is_valid(payload.get("frame")):
+            payload["frame"] = self.frames.write(frame)
+        if self.annotated_frame is not None and not self.frames.is_valid(payload.get("annotated")):
+            payload["annotated"] = self.frames.write(self.annotated_frame)
+        self.payload = payload
+        self._publish(self.payload)
+
+    # Second half of a step: runs the handlers with any offloaded results and publishes
+    def _finish_frame(self, timestamp, frame_ref, annotated, grouped, full_context, staged):
+        sw = metrics.Stopwatch(metrics.CAMERA_STAGE_SECONDS)
+        # Handlers replace this; reset so a previous frame's reading isn't republished
+        self.payload = {"timestamp": timestamp}
+
+        # Call each action once with its batch
+        for action, detections in grouped.items():
+            result = staged.get(action)
+            if isinstance(result, StaleFrame):
+                STAGE_STALE.inc()
+                continue
+            if isinstance(result, Exception):
+                raise result
+            # Action is gotten from object_actions list and is based on the returned text of cls from YOLO image
+            # full_context contains all info on other boxes
+            action(annotated, detections, full_context, staged=result)
+        sw.lap("handlers")
+
+        # Frames go into the shared ring once; the payload only carries the refs
+        self.payload = dict(self.payload)
+        if self.camera_id is not None:
+            self.payload["camera_id"] = self.camera_id
+        names = [d["name"] for batch in grouped.values() for d in batch]
+        self.payload["names"] = names
+        self.payload["count"] = len(names)
+        self.payload["capture"] = self.latest.stats()
+        if self.gate is not None:
+            self.payload["gate"] = self.gate.stats()
+        self.payload["frame"] = frame_ref
+        self.payload["annotated"] = self.frames.write(annotated)
+
+        # Thread-safe handoff to the event loop -> results bus
+        self._publish(self.payload)
+        events = self.events.update(self.payload)
+        if events:
+            # Ring slots are reused within a couple of seconds; events keep their frame, encoded once
+            keyframe = self._encode_jpeg(annotated, config.EVENT_KEYFRAME_QUALITY)
+            for event in events:
+                event["keyframe"] = keyframe
+                self._publish(event, "events")
+        sw.lap("publish")
+
     def step(self):
         if self.stop_event.is_set():  # NEW: quick exit if stopping
             return
@@ -324,34 +466,65 @@ class CameraTask:
             if self.stop_event.is_set():  # if init failed
                 return
 
-        success, frame = self.cap.read()
+        # Per-stage latencies; each lap() records the time since the previous one
+        sw = metrics.Stopwatch(metrics.CAMERA_STAGE_SECONDS)
 
-        if not success:
+        # Newest frame from the grabber; anything it captured while we were busy is skipped
+        frame, _, _ = self.latest.take(timeout=1.0)
+        sw.lap("grab")
+
+        if frame is None:
+            if not self.latest.closed:
+                return  # nothing new yet
             print("Failed to grab frame")
             self.loop.call_soon_threadsafe(self.stop_event.set)
             self.stop_flag.set()
             return
 
-        # run inference on a local image (from roboflow)
-        print(self.model.infer(
-            frame,
-            model_id="gauge-video-frames-mocuo/2"
-        ))
-
         timestamp = datetime.now().isoformat()
 
         # FOR TESTING Aruco Markers!!!!
         # frame = cv2.imread("ImageProcessing\singlemarkersoriginal.jpg")
 
-        # Run inference on the frame (as a numpy array)
-        self.results = self.model(frame, verbose=False)
-        self.result = self.results[0]
+        if not self._size_checked:
+            self._size_checked = True
+            if not self._fits_ring(*frame.shape[:2]):
+                return
 
-        # Visualize detections on frame
-        self.annotated_frame = self.result.plot()
+        self.frame = frame
+        # Detector, tracker and gate work on the small copy; scale maps its boxes back to frame
+        small, scale = self.latest.detection_frame()
+
+        # Static scene: reuse the previous detections and payload instead of running inference
+        if self.gate is not None and not self.gate.changed(small):
+            sw.lap("gate")
+            self._reuse_payload(frame, timestamp)
+            sw.lap("publish")
+            return
+        sw.lap("gate")
+
+        # Run inference on the frame (as a numpy array), or carry the last boxes forward
+        if self.tracker.needs_detection():
+            accepted = [d for d in self.model.infer(small) if d["conf"] >= config.CONF_THRESHOLD]
+            results = self.tracker.update(small, accepted)
+            # Drop smoothers for gauges the tracker no longer knows about
+            live = {d["track_id"] for d in results}
+            self.needle_smoothers = {k: v for k, v in self.needle_smoothers.items() if k in live}
+            sw.lap("infer")
+        else:
+            results = self.tracker.propagate(small)
+            sw.lap("track")
+        # Everything from here on (drawing, crops, OCR, ArUco) is in full-resolution coordinates
+        self.results = self._upscale(results, scale)
+
+        # Visualize detections on frame. The buffer is reused unless earlier frames can still
+        # be waiting on the executor, in which case each keeps its own until it is published
+        out = None if self.executor.concurrent else self.annotated_frame
+        self.annotated_frame = annotated = draw_detections(frame, self.results, out=out)
 
         # Show frame in window
-        cv2.imshow("YOLOv5 Live", self.annotated_frame)
+        self._show(annotated)
+        sw.lap("plot")
 
         # detected_class_ids = result.boxes.cls.tolist() if result.boxes else []
 
@@ -361,18 +534,12 @@ class CameraTask:
         grouped = defaultdict(list)
 
         # Check if there are any detected boxes
-        if getattr(self.result, "boxes", None) and len(self.result.boxes) > 0:
-            # xyxy: (N,4), cls: (N,), conf: (N,)
-            xyxy = self.result.boxes.xyxy.cpu().numpy()
-            cls = self.result.boxes.cls.cpu().numpy()
-            conf = self.result.boxes.conf.cpu().numpy()
-
-            for bbox, cls_id, c in zip(xyxy, cls, conf):
-                c = float(c)
-                if c < 0.9:
-                    continue
-                cls_id = int(cls_id)
-                name = self.result.names[cls_id].lower()
+        if self.results:
+            for det in self.results:
+                c = det["conf"]
+                cls_id = det["cls_id"]
+                name = det["name"]
+                bbox = det["bbox"]
                 action = self.object_actions.get(name)
                 if not action:
                     continue
@@ -383,37 +550,39 @@ class CameraTask:
                     "cls_id": cls_id,
                     "conf": c,
                     "bbox": bbox,
-                    "roi": roi
+                    "roi": roi,
+                    "track_id": det["track_id"],
+                    "tracked": det["tracked"],
                 })
 
-            # Save the current frame’s boxes
-            self.current_detections = [d for batch in grouped.values() for d in batch]
-
-            # Call each action once with its batch
-            for action, detections in grouped.items():
-                # Action is gotten from object_actions list and is based on the returned text of cls from YOLO image
-                # full_context = self.current_detections contails all info on other boxes
-                full_context = self.current_detections
-                payload = action(self.annotated_frame, detections, full_context)
-                if payload is None:
-                    continue
-
-        if not detected_any:
-            self.payload = {
-                "timestamp": timestamp,
-                "image": self.annotated_frame,
-            }
+        # Save the current frame’s boxes
+        self.current_detections = [d for batch in grouped.values() for d in batch]
 
         if not detected_any:
-            print("No objects >=80% confidence.")
-
-        # Thread-safe handoff to the event loop -> queue
-        if self.results_q:
-            self.loop.call_soon_threadsafe(self._publish, self.payload)
+            logging.debug("No objects >=80% confidence.")
+
+        # The raw frame goes into the shared ring now, so offloaded stages can read it by ref
+        frame_ref = self.frames.write(frame)
+        futures = {}
+        for action, detections in grouped.items():
+            submit = self.stage_submitters.get(action)
+            fut = submit(frame_ref, detections, self.current_detections) if submit else None
+            if fut is not None:
+                futures[action] = fut
+        sw.lap("submit")
+
+        # Handlers and publishing happen in frame order once the stages are back; only
+        # wait here if too many frames are already in flight
+        self.pipeline.add(partial(self._finish_frame, timestamp, frame_ref, annotated, grouped,
+                                  self.current_detections), futures)
+        self.pipeline.drain()
+        if len(self.pipeline) > self.max_pending:
+            self.pipeline.drain(block=True, keep=self.max_pending)
+        sw.lap("drain")
 
         # Break on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            self.loop.call_soon_threadsafe(self.stop_event.set())
+        if config.SHOW_WINDOW and cv2.waitKey(1) & 0xFF == ord('q'):
+            self.loop.call_soon_threadsafe(self.stop_event.set)
             self.stop_flag.set()
             return
 
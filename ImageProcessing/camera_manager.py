@@ -0,0 +1,187 @@
+# camera_manager.py
+# Runs one CameraTask per camera (e.g. forward and downward at once).
+#
+# Every camera keeps its own capture thread, tracker, motion gate, smoothing
+# and handlers, and tags its payloads with its camera_id. The expensive parts
+# are shared: one detector session (the model is loaded once) and one vision
+# stage executor. SharedInference hands the detector out fairly, to the
+# waiting camera that has used the least inference time so far, so a camera
+# whose frames are slow to infer can't starve the others.
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+import config
+import metrics
+from ImageProcessing.cameraTask import CameraTask
+from ImageProcessing.executor import StageExecutor
+from ImageProcessing.frame_buffer import FrameRing
+from ImageProcessing.inference import InferenceBackend
+
+INFERENCE_WAIT = metrics.REGISTRY.counter(
+    "inference_wait_seconds_total", "Time cameras spent waiting for the shared detector")
+
+
+class SharedInference:
+    """One detector shared by several cameras, granted fairly by accumulated inference time.
+
+    Up to `slots` cameras infer at once (1 unless the backend is safe to call
+    concurrently). backend may be a built InferenceBackend or a factory, which
+    is called on first use from whichever camera thread gets there first.
+    """
+
+    def __init__(self, backend: Union[InferenceBackend, Callable[[], InferenceBackend]], slots: int = 1):
+        self._backend = backend if isinstance(backend, InferenceBackend) else None
+        self._factory = None if self._backend is not None else backend
+        self.slots = max(1, slots)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting: Dict[str, int] = {}  # camera -> arrival order, for ties
+        self._arrivals = 0
+        self.used: Dict[str, float] = {}  # camera -> inference seconds so far
+        self._waited: Dict[str, metrics.Counter] = {}
+
+    @property
+    def backend(self) -> InferenceBackend:
+        with self._cond:
+            if self._backend is None:
+                self._backend = self._factory()
+            return self._backend
+
+    def client(self, camera_id: str) -> "InferenceClient":
+        with self._cond:
+            self.used.setdefault(camera_id, 0.0)
+            self._waited[camera_id] = INFERENCE_WAIT.labels(camera=camera_id)
+        metrics.REGISTRY.gauge_fn("inference_seconds", lambda: self.used[camera_id],
+                                  "Detector time used per camera", camera=camera_id)
+        return InferenceClient(self, camera_id)
+
+    def _next(self) -> Optional[str]:
+        if not self._waiting:
+            return None
+        return min(self._waiting, key=lambda cam: (self.used[cam], self._waiting[cam]))
+
+    def _acquire(self, camera_id: str) -> None:
+        with self._cond:
+            # A camera that sat idle (no detections wanted, motion gate skipping) comes back level
+            # with the others rather than with a backlog of credit to spend
+            others = [self.used[cam] for cam in self._waiting]
+            if others:
+                self.used[camera_id] = max(self.used[camera_id], min(others))
+            self._waiting[camera_id] = self._arrivals
+            self._arrivals += 1
+            self._cond.wait_for(lambda: self._active < self.slots and self._next() == camera_id)
+            del self._waiting[camera_id]
+            self._active += 1
+
+    def _release(self, camera_id: str, elapsed: float) -> None:
+        with self._cond:
+            self._active -= 1
+            self.used[camera_id] += elapsed
+            self._cond.notify_all()
+
+    def infer(self, camera_id: str, frame: np.ndarray) -> List[dict]:
+        backend = self.backend
+        t0 = time.perf_counter()
+        self._acquire(camera_id)
+        t1 = time.perf_counter()
+        try:
+            self._waited[camera_id].inc(t1 - t0)
+            return backend.infer(frame)
+        finally:
+            self._release(camera_id, time.perf_counter() - t1)
+
+    def close(self) -> None:
+        if self._backend is not None:
+            self._backend.close()
+
+
+class InferenceClient(InferenceBackend):
+    """A camera's handle on the shared detector; closing it leaves the detector open."""
+
+    def __init__(self, shared: SharedInference, camera_id: str):
+        self.shared = shared
+        self.camera_id = camera_id
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.shared.backend.names
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        return self.shared.infer(self.camera_id, frame)
+
+
+def _state_path(path: Optional[str], camera_id: str, primary: bool) -> Optional[str]:
+    # ArUco lock-in state: the primary camera keeps the usual file, the others get their own
+    if not path or primary:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{camera_id}{ext}"
+
+
+class CameraManager:
+    """CameraTasks for a {camera_id: camera} dict, sharing the detector, executor and frame ring.
+
+    The first camera is the primary one: it feeds the dashboard's camera view
+    and keeps the unsuffixed time-series names.
+    """
+
+    def __init__(self, loop, stop_event, cameras: Dict[str, object], bus=None,
+                 frames: Optional[FrameRing] = None, backend: Optional[InferenceBackend] = None,
+                 lossless: bool = False):
+        if not cameras:
+            raise ValueError("no cameras to manage")
+        self.frames = frames if frames is not None else FrameRing()
+        self._owns_frames = frames is None
+        self.inference = SharedInference(backend or CameraTask._make_backend, slots=config.INFERENCE_SLOTS)
+        self.executor = StageExecutor(
+            self.frames, config.VISION_STAGES,
+            workers=config.VISION_WORKERS,
+            start_method=config.VISION_START_METHOD,
+            aruco_kwargs=dict(roi_pad=config.ARUCO_ROI_PAD, min_roi=config.ARUCO_MIN_ROI),
+        )
+        self.primary = next(iter(cameras))
+        self.tasks: Dict[str, CameraTask] = {}
+        for camera_id, camera in cameras.items():
+            self.tasks[camera_id] = CameraTask(
+                loop=loop,
+                stop_event=stop_event,
+                bus=bus,
+                frames=self.frames,
+                backend=self.inference.client(camera_id),
+                camera=camera,
+                lossless=lossless,
+                executor=self.executor,
+                camera_id=camera_id,
+                aruco_state_path=_state_path(config.ARUCO_STATE_PATH, camera_id, camera_id == self.primary),
+            )
+        # The ring is shared too, so each camera gets its share of the frames that may be in flight
+        for task in self.tasks.values():
+            task.max_pending = min(task.max_pending, max(0, (self.frames.slots - 3) // (2 * len(cameras))))
+        logging.info(f"cameras: {', '.join(self.tasks)} (primary {self.primary})")
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __getitem__(self, camera_id: str) -> CameraTask:
+        return self.tasks[camera_id]
+
+    def items(self) -> Iterable[Tuple[str, CameraTask]]:
+        return self.tasks.items()
+
+    @property
+    def primary_task(self) -> CameraTask:
+        return self.tasks[self.primary]
+
+    def shutdown(self) -> None:
+        for task in self.tasks.values():
+            task.shutdown()
+        self.executor.close()
+        self.inference.close()
+        if self._owns_frames:
+            self.frames.close()
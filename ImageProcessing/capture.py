@@ -0,0 +1,153 @@
+# capture.py
+# Dedicated grabber thread that keeps only the newest camera frame.
+# Inference pulls whatever is latest when it is free, so a slow model never
+# leaves us working through a backlog of stale, buffered frames.
+#
+# The grabber also keeps a detection-resolution copy of every frame, so the
+# detector, tracker and motion gate work on few pixels while crops for OCR
+# and ArUco still come from the full-resolution original.
+
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def detection_size(shape, width: int) -> Tuple[int, int]:
+    """(w, h) of the detection copy of a frame of this shape; the frame's own size if width is 0 or larger."""
+    h, w = shape[:2]
+    if not width or w <= width:
+        return w, h
+    return width, max(1, round(h * width / w))
+
+
+class LatestFrame:
+    """One-slot "latest frame wins" holder with triple buffering.
+
+    The grabber writes into a buffer nobody is reading, then publishes it as the
+    latest. A frame that is replaced before anyone took it counts as dropped; a
+    frame older than max_age when it is taken counts as late.
+
+    With lossless=True the grabber instead waits until the newest frame has
+    been taken, so every frame is processed (used when replaying a recording
+    as fast as possible, where dropping frames would make runs irreproducible).
+
+    With detect_width set, each buffer has a downscaled copy of at most that
+    width alongside it, made by the grabber before the frame is published.
+    """
+
+    def __init__(self, max_age: float = 0.2, lossless: bool = False, detect_width: int = 0):
+        self.max_age = max_age
+        self.lossless = lossless
+        self.detect_width = detect_width
+        self._cond = threading.Condition()
+        self._buffers: list[Optional[np.ndarray]] = [None, None, None]
+        self._small: list[Optional[np.ndarray]] = [None, None, None]
+        self._latest = -1        # buffer index of the newest frame
+        self._reading = -1       # buffer index held by the consumer
+        self._seq = 0            # sequence number of the newest frame
+        self._taken_seq = 0      # last sequence number handed to the consumer
+        self._stamp = 0.0
+        self.grabbed = 0
+        self.dropped = 0
+        self.late = 0
+        self.closed = False
+
+    # Buffer the grabber may write the next frame into (never the latest or the one being read)
+    def write_buffer(self) -> Tuple[int, Optional[np.ndarray]]:
+        with self._cond:
+            if self.lossless:
+                self._cond.wait_for(lambda: self._seq == self._taken_seq or self.closed)
+            idx = next(i for i in range(3) if i != self._latest and i != self._reading)
+            return idx, self._buffers[idx]
+
+    # Grabber side, before publish(): refreshes buffer idx's detection copy (nobody else holds idx)
+    def shrink(self, idx: int, frame: np.ndarray) -> None:
+        size = detection_size(frame.shape, self.detect_width)
+        if size == (frame.shape[1], frame.shape[0]):
+            self._small[idx] = None
+            return
+        small = self._small[idx]
+        if small is None or small.shape != (size[1], size[0]) + frame.shape[2:]:
+            small = np.empty((size[1], size[0]) + frame.shape[2:], frame.dtype)
+        cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        self._small[idx] = small
+
+    def publish(self, idx: int, frame: np.ndarray) -> None:
+        with self._cond:
+            self._buffers[idx] = frame
+            if self._latest >= 0 and self._seq > self._taken_seq:
+                self.dropped += 1
+            self._latest = idx
+            self._seq += 1
+            self._stamp = time.monotonic()
+            self.grabbed += 1
+            self._cond.notify_all()
+
+    # Waits for a frame newer than the last one taken. The returned array stays valid
+    # until the next call to take(), after which the grabber may reuse it.
+    def take(self, timeout: Optional[float] = None) -> Tuple[Optional[np.ndarray], int, float]:
+        with self._cond:
+            self._reading = -1
+            if not self._cond.wait_for(lambda: self._seq > self._taken_seq or self.closed, timeout):
+                return None, self._taken_seq, 0.0
+            if self._seq == self._taken_seq:
+                return None, self._taken_seq, 0.0
+            age = time.monotonic() - self._stamp
+            if age > self.max_age:
+                self.late += 1
+            self._reading = self._latest
+            self._taken_seq = self._seq
+            self._cond.notify_all()
+            return self._buffers[self._latest], self._seq, age
+
+    # The detection copy of the frame last returned by take() (the frame itself when there is
+    # none) and the factor that maps its coordinates back onto the full frame
+    def detection_frame(self) -> Tuple[np.ndarray, float]:
+        with self._cond:
+            frame, small = self._buffers[self._reading], self._small[self._reading]
+        if small is None:
+            return frame, 1.0
+        return small, frame.shape[1] / small.shape[1]
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"grabbed": self.grabbed, "dropped": self.dropped, "late": self.late}
+
+
+class FrameGrabber(threading.Thread):
+    """Continuously drains a VideoCapture into a LatestFrame holder."""
+
+    def __init__(self, cap, holder: LatestFrame, on_error=None):
+        super().__init__(name="camera-grabber", daemon=True)
+        self.cap = cap
+        self.holder = holder
+        self.on_error = on_error
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            idx, buf = self.holder.write_buffer()
+            if self.holder.closed:
+                break
+            # read() fills buf in place when the size matches, so steady state allocates nothing
+            success, frame = self.cap.read(buf) if buf is not None else self.cap.read()
+            if not success:
+                if self.on_error and not self._halt.is_set():
+                    self.on_error()
+                break
+            self.holder.shrink(idx, frame)
+            self.holder.publish(idx, frame)
+        self.holder.close()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._halt.set()
+        if self.is_alive():
+            self.join(timeout)
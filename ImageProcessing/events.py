@@ -0,0 +1,104 @@
+# events.py
+# Turns the per-frame camera payloads into change events.
+#
+# CameraTask publishes a payload every frame whether or not anything in the
+# scene changed. EventDetector keeps the state of each object of interest and
+# only reports transitions: the valve settling in a new position, an ArUco id
+# seen for the first time, the gauge reading moving by more than a band, and
+# the drill trigger range being entered or left. Events are small dicts on
+# the lossless "events" topic. CameraTask attaches the frame that caused them
+# as JPEG bytes ("keyframe"), so it outlives the ring slot it came from.
+
+from typing import Any, Dict, List, Optional, Set
+
+import metrics
+
+EVENTS = metrics.REGISTRY.counter("camera_events_total", "Change events by kind")
+
+
+class Debounced:
+    """A discrete state that only changes after `confirm` consecutive frames agree."""
+
+    def __init__(self, confirm: int = 3):
+        self.confirm = max(1, confirm)
+        self.state: Any = None
+        self._candidate: Any = None
+        self._count = 0
+
+    def update(self, value: Any) -> bool:
+        """Feeds one observation; True when it makes the state change."""
+        if value == self.state:
+            self._candidate, self._count = None, 0
+            return False
+        if value != self._candidate:
+            self._candidate, self._count = value, 0
+        self._count += 1
+        if self._count < self.confirm:
+            return False
+        self.state, self._candidate, self._count = value, None, 0
+        return True
+
+
+class Hysteresis:
+    """A reading that is only reported again once it moves more than `band` from the last report."""
+
+    def __init__(self, band: float):
+        self.band = band
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> bool:
+        if self.value is not None and abs(value - self.value) < self.band:
+            return False
+        self.value = value
+        return True
+
+
+class EventDetector:
+    """Per-camera object state; update() returns the events one payload causes."""
+
+    def __init__(self, camera_id: Optional[str] = None, confirm: int = 3, psi_band: float = 50.0):
+        self.camera_id = camera_id
+        self.valve = Debounced(confirm)
+        self.trigger = Debounced(confirm)
+        self.gauge = Hysteresis(psi_band)
+        self.markers: Set[int] = set()
+        self.count = 0
+
+    def _event(self, kind: str, payload: Dict[str, Any], **fields) -> Dict[str, Any]:
+        EVENTS.labels(kind=kind).inc()
+        self.count += 1
+        event = {"kind": kind, "timestamp": payload.get("timestamp")}
+        if self.camera_id is not None:
+            event["camera_id"] = self.camera_id
+        event.update(fields)
+        return event
+
+    def update(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if payload.get("reused"):
+            return []  # motion-gated repeat of an earlier frame; nothing new was seen
+        events = []
+
+        position = payload.get("Valve_position")
+        if position is not None:
+            previous = self.valve.state
+            if self.valve.update(position):
+                events.append(self._event("valve", payload, state=position, previous=previous))
+
+        ids = payload.get("ArUco_Marker_id") or []
+        new = [i for i in ids if i not in self.markers]
+        if new:
+            self.markers.update(new)
+            events.append(self._event("marker", payload, ids=new,
+                                      dictionary=payload.get("ArUco_dictionary")))
+
+        psi = payload.get("gauge_psi")
+        if psi is not None:
+            previous = self.gauge.value
+            if self.gauge.update(psi):
+                events.append(self._event("gauge", payload, psi=psi, previous=previous,
+                                          theta=payload.get("gauge_theta")))
+        trigger = payload.get("Drill_Trigger")
+        if trigger is not None:
+            if self.trigger.update(bool(trigger)):
+                events.append(self._event("drill_trigger", payload, active=bool(trigger)))
+        return events
@@ -0,0 +1,190 @@
+# executor.py
+# Runs the CPU-heavy vision stages off the camera thread.
+#
+# Each stage (gauge numeral preparation, ArUco search, ...) is a plain function
+# of a frame and some arguments, and runs inline, on a thread pool or on a
+# persistent process pool, chosen per stage in config.py. Frames are never
+# pickled: a stage is handed the FrameRef of a frame already in the shared
+# FrameRing, and worker processes attach to the ring once at start-up and read
+# the slot directly. A stage whose slot is reused before it finishes raises
+# StaleFrame instead of returning results for the wrong frame.
+#
+# Stages for several frames can be in flight at once; OrderedPipeline hands
+# their results back strictly in frame order, so handlers, smoothing and
+# publishing still see frames one at a time, oldest first.
+
+import collections
+import logging
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from ImageProcessing.aruco import ArucoDetectorPool
+from ImageProcessing.frame_buffer import FrameRef, FrameRing
+from ImageProcessing.gauge_ocr import GaugeOcr, mask_text
+
+MODES = ("inline", "thread", "process")
+
+STAGE_STALE = metrics.REGISTRY.counter(
+    "camera_stage_stale_total", "Offloaded stages whose frame slot was reused before they finished").labels()
+
+
+class StaleFrame(Exception):
+    """The frame a stage was given has been overwritten in the ring."""
+
+
+# Same clamping as CameraTask._crop_roi
+def crop_box(frame: np.ndarray, xyxy) -> np.ndarray:
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = map(int, xyxy)
+    x1 = max(0, min(w - 1, x1))
+    x2 = max(0, min(w, x2))
+    y1 = max(0, min(h - 1, y1))
+    y2 = max(0, min(h, y2))
+    return frame if x2 <= x1 or y2 <= y1 else frame[y1:y2, x1:x2]
+
+
+class StageContext:
+    """Per-process state the stages need (one in the app, one in each worker)."""
+
+    def __init__(self, ring: FrameRing, aruco_kwargs: Optional[dict] = None):
+        self.ring = ring
+        # Detectors only; lock-in state stays with the camera task's own pool
+        self.aruco = ArucoDetectorPool(**dict(aruco_kwargs or {}, state_path=None))
+
+
+# ===================== Stages ===================== #
+# Each takes (ctx, frame, *args) and must not keep references into the frame.
+
+def gauge_prepare(ctx: StageContext, frame: np.ndarray, bbox) -> Any:
+    """Black-text mask of the gauge box, candidate numeral crops and their hashes."""
+    roi = crop_box(frame, bbox)
+    return GaugeOcr.prepare(roi, mask_text(roi, 'black'))
+
+
+def aruco_search(ctx: StageContext, frame: np.ndarray, boxes, names: List[str]) -> Any:
+    """Markers inside the boxes, trying the dictionaries in names."""
+    return ctx.aruco.search(frame, boxes, names)
+
+
+STAGES: Dict[str, Callable[..., Any]] = {
+    "gauge_prepare": gauge_prepare,
+    "aruco_search": aruco_search,
+}
+
+
+def _run(ctx: StageContext, stage: str, ref: FrameRef, args: tuple) -> Any:
+    frame = ctx.ring.view(ref)
+    if frame is None:
+        raise StaleFrame(stage)
+    result = STAGES[stage](ctx, frame, *args)
+    # The writer may have wrapped round onto this slot while we were reading it
+    if not ctx.ring.is_valid(ref):
+        raise StaleFrame(stage)
+    return result
+
+
+# ===================== Worker processes ===================== #
+_worker_ctx: Optional[StageContext] = None
+
+
+def _init_worker(ring_name: str, slots: int, max_shape: Tuple[int, int, int], aruco_kwargs: dict) -> None:
+    global _worker_ctx
+    # Workers share the app's resource tracker, so attaching doesn't make them owners of the
+    # segment; it is unlinked once, by the FrameRing that created it
+    _worker_ctx = StageContext(FrameRing.attach(ring_name, slots, max_shape), aruco_kwargs)
+
+
+def _run_in_worker(stage: str, ref: FrameRef, args: tuple) -> Any:
+    return _run(_worker_ctx, stage, ref, args)
+
+
+class StageExecutor:
+    """Dispatches stages to inline, thread or process execution by name."""
+
+    def __init__(self, frames: FrameRing, modes: Dict[str, str], workers: int = 3,
+                 start_method: str = "forkserver", aruco_kwargs: Optional[dict] = None):
+        for stage, mode in modes.items():
+            if stage not in STAGES:
+                raise ValueError(f"unknown stage {stage!r}, expected one of {sorted(STAGES)}")
+            if mode not in MODES:
+                raise ValueError(f"unknown mode {mode!r} for {stage}, expected one of {MODES}")
+        self.frames = frames
+        self.modes = {stage: modes.get(stage, "inline") for stage in STAGES}
+        self.ctx = StageContext(frames, aruco_kwargs)
+        self._threads: Optional[Executor] = None
+        self._processes: Optional[Executor] = None
+        used = set(self.modes.values())
+        if "thread" in used:
+            self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision")
+        if "process" in used:
+            self._processes = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=_init_worker,
+                initargs=(frames.name, frames.slots, frames.max_shape, dict(aruco_kwargs or {})),
+            )
+        logging.info("vision stages: " + ", ".join(f"{s}={m}" for s, m in self.modes.items()))
+
+    @property
+    def concurrent(self) -> bool:
+        """True if any stage can still be running after submit() returns."""
+        return self._threads is not None or self._processes is not None
+
+    def submit(self, stage: str, ref: FrameRef, *args) -> Future:
+        mode = self.modes[stage]
+        if mode == "process":
+            return self._processes.submit(_run_in_worker, stage, ref, args)
+        if mode == "thread":
+            return self._threads.submit(_run, self.ctx, stage, ref, args)
+        fut: Future = Future()
+        try:
+            fut.set_result(_run(self.ctx, stage, ref, args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def close(self) -> None:
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        self._threads = self._processes = None
+
+
+class OrderedPipeline:
+    """Finishes frames strictly in the order they were added, once their stages are done.
+
+    finish(results) is called with {key: result} for each future, where a
+    stage that failed contributes its exception instead of a result.
+    """
+
+    def __init__(self):
+        self._items: "collections.deque[Tuple[Callable[[Dict[str, Any]], None], Dict[str, Future]]]" = \
+            collections.deque()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, finish: Callable[[Dict[str, Any]], None], futures: Optional[Dict[str, Future]] = None) -> None:
+        self._items.append((finish, futures or {}))
+
+    def drain(self, block: bool = False, keep: int = 0) -> int:
+        """Finishes ready frames from the front; with block=True waits until at most `keep` remain."""
+        done = 0
+        while len(self._items) > keep:
+            finish, futures = self._items[0]
+            if not block and not all(f.done() for f in futures.values()):
+                break
+            results = {}
+            for key, fut in futures.items():
+                try:
+                    results[key] = fut.result()
+                except Exception as e:
+                    results[key] = e
+            self._items.popleft()
+            finish(results)
+            done += 1
+        return done
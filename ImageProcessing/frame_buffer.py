@@ -0,0 +1,117 @@
+# frame_buffer.py
+# Fixed-size ring of camera frame slots held in shared memory.
+# Payloads carry a FrameRef (slot + generation) instead of the frame itself, so
+# the main loop, web server and recorder can all read frames without copying.
+
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Per-slot header columns (int64): generation, height, width, channels, timestamp (ns)
+_GEN, _H, _W, _C, _TS = range(5)
+_HEADER_COLS = 5
+_ALIGN = 64
+
+
+class FrameRef(NamedTuple):
+    """Handle to a frame stored in a FrameRing."""
+    slot: int
+    generation: int
+
+
+class FrameRing:
+    """Preallocated ring of frame slots backed by multiprocessing.shared_memory.
+
+    A single writer copies each frame into the next slot and stamps it with a
+    new generation number. Readers pass the FrameRef they were given; if the
+    slot has since been reused the generation no longer matches and the read
+    returns None rather than a different frame.
+    """
+
+    def __init__(self, slots: int = 8, max_shape: Tuple[int, int, int] = (1080, 1920, 3),
+                 name: Optional[str] = None, create: bool = True):
+        self.slots = int(slots)
+        self.max_shape = tuple(int(v) for v in max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.slot_stride = -(-self.slot_bytes // _ALIGN) * _ALIGN
+        header_bytes = -(-(self.slots * _HEADER_COLS * 8) // _ALIGN) * _ALIGN
+        size = header_bytes + self.slots * self.slot_stride
+
+        self.owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+
+        self._header = np.ndarray((self.slots, _HEADER_COLS), dtype=np.int64, buffer=self.shm.buf)
+        self._data = np.ndarray((self.slots, self.slot_stride), dtype=np.uint8,
+                                buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+        self._lock = threading.Lock()
+        self._next_gen = int(self._header[:, _GEN].max()) + 1
+
+    @classmethod
+    def attach(cls, name: str, slots: int, max_shape: Tuple[int, int, int]) -> "FrameRing":
+        """Open an existing ring from another process (e.g. the web server or recorder)."""
+        return cls(slots=slots, max_shape=max_shape, name=name, create=False)
+
+    # Copies frame into the next free slot and returns its FrameRef
+    def write(self, frame: np.ndarray, timestamp_ns: Optional[int] = None) -> FrameRef:
+        if frame.dtype != np.uint8:
+            raise ValueError(f"frame must be uint8, got {frame.dtype}")
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        if h * w * c > self.slot_bytes:
+            raise ValueError(f"frame {frame.shape} larger than slot {self.max_shape}")
+
+        with self._lock:
+            gen = self._next_gen
+            self._next_gen += 1
+        slot = gen % self.slots
+        hdr = self._header[slot]
+
+        # Invalidate the slot first so a concurrent reader can't validate a half-written frame
+        hdr[_GEN] = 0
+        dst = self._data[slot, :h * w * c].reshape(frame.shape)
+        np.copyto(dst, frame)
+        hdr[_H], hdr[_W], hdr[_C] = h, w, c
+        hdr[_TS] = time.time_ns() if timestamp_ns is None else timestamp_ns
+        hdr[_GEN] = gen
+        return FrameRef(slot, gen)
+
+    def is_valid(self, ref: Optional[FrameRef]) -> bool:
+        return ref is not None and int(self._header[ref.slot, _GEN]) == ref.generation
+
+    def timestamp_ns(self, ref: FrameRef) -> Optional[int]:
+        hdr = self._header[ref.slot]
+        return int(hdr[_TS]) if int(hdr[_GEN]) == ref.generation else None
+
+    # Zero-copy view of a slot. Only valid until the writer wraps around to it again,
+    # so callers that hold on to it should check is_valid() afterwards.
+    def view(self, ref: Optional[FrameRef]) -> Optional[np.ndarray]:
+        if not self.is_valid(ref):
+            return None
+        h, w, c = (int(v) for v in self._header[ref.slot, _H:_TS])
+        arr = self._data[ref.slot, :h * w * c]
+        return arr.reshape((h, w, c) if c > 1 else (h, w))
+
+    # Copy of a slot that is guaranteed not to be torn by a concurrent write
+    def copy(self, ref: Optional[FrameRef]) -> Optional[np.ndarray]:
+        arr = self.view(ref)
+        if arr is None:
+            return None
+        out = arr.copy()
+        return out if self.is_valid(ref) else None
+
+    def close(self) -> None:
+        # Drop our numpy views before closing, otherwise the buffer is still exported
+        self._header = None
+        self._data = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,207 @@
+# gauge_ocr.py
+# Batched OCR for gauge scale numerals.
+# All candidate crops from a frame are packed into one tiled image so tesseract
+# is launched once per frame instead of once per contour, and results are cached
+# per gauge by perceptual hash, since the printed numerals never change.
+
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+import pytesseract
+
+TILE_HEIGHT = 40   # every crop is scaled to this height before tiling
+TILE_GAP = 20      # white space between tiles so tesseract sees separate lines
+HASH_SIZE = (32, 16)
+GRID = 8           # numerals are cached by their cell on an 8x8 grid over the gauge crop
+
+
+# Binary mask of red or black text; the black mask is what the scale numerals are read from
+def mask_text(frame: np.ndarray, color: str = 'red') -> np.ndarray:
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+    if color == 'red':
+        # Two hue bands for red
+        lower1 = np.array([0, 90, 80], np.uint8)
+        upper1 = np.array([10, 255, 255], np.uint8)
+        lower2 = np.array([170, 90, 80], np.uint8)
+        upper2 = np.array([180, 255, 255], np.uint8)
+        m1 = cv2.inRange(hsv, lower1, upper1)
+        m2 = cv2.inRange(hsv, lower2, upper2)
+        mask = cv2.bitwise_or(m1, m2)
+    else:
+        # Black/gray: low value & low saturation (exclude colored stuff)
+        # Tweak thresh if needed
+        s, v = hsv[:, :, 1], hsv[:, :, 2]
+        mask = cv2.inRange(s, 0, 60) & cv2.inRange(v, 0, 120)
+
+    # Clean small noise
+    kernel = np.ones((3, 3), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=1)
+    return mask
+
+
+# Returns deskewed binary crops (dark text on white) of each candidate number in the mask
+def extract_candidates(img_bgr: np.ndarray, mask: np.ndarray) -> List[Tuple[np.ndarray, List[int]]]:
+    # The mask already marks the text pixels: render them dark on a light background,
+    # which is what tesseract prefers. (Thresholding the masked colour image left black
+    # text indistinguishable from the blacked-out background.)
+    th = np.where(mask > 0, 0, 255).astype(np.uint8)
+
+    # find candidate regions; a wide dilation joins the digits of one number into one blob
+    joined = cv2.dilate((mask > 0).astype(np.uint8) * 255, np.ones((3, 9), np.uint8))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    H, W = th.shape
+    out = []
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        if w * h < 150 or h < 12:
+            continue
+        pad = 4
+        x0, y0 = max(x - pad, 0), max(y - pad, 0)
+        x1, y1 = min(x + w + pad, W), min(y + h + pad, H)
+        crop = th[y0:y1, x0:x1]
+
+        # quick deskew per region
+        angle = cv2.minAreaRect(cnt)[2]
+        if angle < -45: angle += 90
+        M = cv2.getRotationMatrix2D(((x1 - x0) // 2, (y1 - y0) // 2), angle, 1.0)
+        crop = cv2.warpAffine(crop, M, (x1 - x0, y1 - y0),
+                              flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+        out.append((crop, [int(x0), int(y0), int(x1), int(y1)]))
+    return out
+
+
+# 512-bit difference hash of a crop; small shifts and blur only flip a few bits
+def dhash(crop: np.ndarray) -> int:
+    small = cv2.resize(crop, (HASH_SIZE[0] + 1, HASH_SIZE[1]), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# Stacks crops vertically on a white canvas; returns the image and each tile's y range
+def tile_crops(crops: List[np.ndarray]) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    scaled = []
+    for crop in crops:
+        h, w = crop.shape[:2]
+        nw = max(1, int(round(w * TILE_HEIGHT / h)))
+        scaled.append(cv2.resize(crop, (nw, TILE_HEIGHT), interpolation=cv2.INTER_LINEAR))
+    width = max(c.shape[1] for c in scaled) + 2 * TILE_GAP
+    height = len(scaled) * (TILE_HEIGHT + TILE_GAP) + TILE_GAP
+    canvas = np.full((height, width), 255, np.uint8)
+    rows = []
+    y = TILE_GAP
+    for c in scaled:
+        canvas[y:y + TILE_HEIGHT, TILE_GAP:TILE_GAP + c.shape[1]] = c
+        rows.append((y, y + TILE_HEIGHT))
+        y += TILE_HEIGHT + TILE_GAP
+    return canvas, rows
+
+
+# One tesseract call for all crops; returns the digits found in each crop (may be "")
+def ocr_batch(crops: List[np.ndarray]) -> List[str]:
+    if not crops:
+        return []
+    canvas, rows = tile_crops(crops)
+    # psm 6: a uniform block of text, one tile per line
+    cfg = "--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789"
+    data = pytesseract.image_to_data(canvas, config=cfg, output_type=pytesseract.Output.DICT)
+    texts: List[List[Tuple[int, str]]] = [[] for _ in crops]
+    for txt, left, top, h in zip(data["text"], data["left"], data["top"], data["height"]):
+        digits = "".join(ch for ch in str(txt) if ch.isdigit())
+        if not digits:
+            continue
+        cy = top + h / 2
+        for i, (y0, y1) in enumerate(rows):
+            if y0 - TILE_GAP / 2 <= cy < y1 + TILE_GAP / 2:
+                texts[i].append((left, digits))
+                break
+    return ["".join(d for _, d in sorted(words)) for words in texts]
+
+
+class Prepared(NamedTuple):
+    shape: Tuple[int, int]                             # (H, W) of the gauge crop
+    candidates: List[Tuple[np.ndarray, List[int], int]]  # (binary crop, bbox, dhash)
+
+
+class GaugeOcr:
+    """Batched, cached numeral OCR.
+
+    Results are cached per gauge identity and by where the numeral sits on the
+    gauge face, with a perceptual hash of the crop to confirm it is still the
+    same numeral. A numeral that has been read once is not sent to tesseract
+    again until its crop changes by more than max_distance bits.
+    """
+
+    def __init__(self, max_distance: int = 48, max_gauges: int = 16):
+        self.max_distance = max_distance
+        self.max_gauges = max_gauges
+        self._cache: "OrderedDict[Hashable, Dict[Tuple[int, int], Tuple[int, str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _entries(self, gauge_id: Hashable) -> Dict[Tuple[int, int], Tuple[int, str]]:
+        entries = self._cache.get(gauge_id)
+        if entries is None:
+            entries = self._cache[gauge_id] = {}
+            while len(self._cache) > self.max_gauges:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(gauge_id)
+        return entries
+
+    def _lookup(self, entries, cell: Tuple[int, int], h: int) -> Optional[str]:
+        # Check neighbouring cells too, in case the numeral sits on a cell boundary
+        cx, cy = cell
+        for dx in (0, -1, 1):
+            for dy in (0, -1, 1):
+                hit = entries.get((cx + dx, cy + dy))
+                if hit is not None and (hit[0] ^ h).bit_count() <= self.max_distance:
+                    return hit[1]
+        return None
+
+    @staticmethod
+    def prepare(img_bgr: np.ndarray, mask: np.ndarray) -> "Prepared":
+        """The stateless, CPU-heavy half of read(): candidate crops and their hashes.
+
+        Safe to run in another thread or process; pass the result to resolve().
+        """
+        candidates = extract_candidates(img_bgr, mask)
+        return Prepared(mask.shape[:2], [(crop, bbox, dhash(crop)) for crop, bbox in candidates])
+
+    def read(self, img_bgr: np.ndarray, mask: np.ndarray, gauge_id: Hashable = None) -> List[Tuple[str, List[int]]]:
+        """OCR masked regions; returns list of (numbers, bbox) like ocr_numbers_from_mask."""
+        return self.resolve(self.prepare(img_bgr, mask), gauge_id)
+
+    def resolve(self, prepared: "Prepared", gauge_id: Hashable = None) -> List[Tuple[str, List[int]]]:
+        """Cache lookups for prepared candidates, with one tesseract call for the misses."""
+        candidates = prepared.candidates
+        entries = self._entries(gauge_id)
+        H, W = prepared.shape
+        results: List[Optional[str]] = []
+        todo, todo_idx, todo_keys = [], [], []
+        for i, (crop, (x0, y0, x1, y1), h) in enumerate(candidates):
+            cell = (int((x0 + x1) / 2 * GRID / W), int((y0 + y1) / 2 * GRID / H))
+            cached = self._lookup(entries, cell, h)
+            results.append(cached)
+            if cached is None:
+                todo.append(crop)
+                todo_idx.append(i)
+                todo_keys.append((cell, h))
+        self.hits += len(candidates) - len(todo)
+        self.misses += len(todo)
+
+        # Non-numeral blobs are cached as "" too so they aren't retried every frame
+        for i, (cell, h), digits in zip(todo_idx, todo_keys, ocr_batch(todo)):
+            results[i] = digits
+            entries[cell] = (h, digits)
+
+        return [(digits, bbox) for digits, (_, bbox, _) in zip(results, candidates) if digits]
+
+    def clear(self, gauge_id: Hashable = None) -> None:
+        if gauge_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(gauge_id, None)
@@ -0,0 +1,246 @@
+# inference.py
+# Pluggable object detection backends for CameraTask.
+# All backends return the same list of detection dicts:
+#   {"name": str, "cls_id": int, "conf": float, "bbox": np.ndarray([x1, y1, x2, y2])}
+# in the pixel coordinates of the frame that was passed in.
+
+import ast
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+
+class InferenceBackend:
+    """Base class for detectors. Models are loaded once and reused for every frame."""
+
+    names: Dict[int, str] = {}
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class Letterbox:
+    """Resize-and-pad into a preallocated canvas and input tensor.
+
+    The canvas and the NCHW tensor are allocated once for the model input size,
+    so each frame only costs a resize and one normalising copy.
+    """
+
+    def __init__(self, size: int = 640, dtype=np.float32, fill: int = 114):
+        self.size = size
+        self.fill = fill
+        self.canvas = np.full((size, size, 3), fill, np.uint8)
+        self.tensor = np.zeros((1, 3, size, size), dtype)
+        self.scale = 1.0
+        self.pad = (0, 0)
+        self._last_shape = None
+
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        if (h, w) != self._last_shape:
+            self.scale = min(self.size / h, self.size / w)
+            nw, nh = int(round(w * self.scale)), int(round(h * self.scale))
+            self.pad = ((self.size - nw) // 2, (self.size - nh) // 2)
+            self.canvas[:] = self.fill
+            self._resized = np.empty((nh, nw, 3), np.uint8)
+            self._last_shape = (h, w)
+        left, top = self.pad
+        nh, nw = self._resized.shape[:2]
+        cv2.resize(frame, (nw, nh), dst=self._resized, interpolation=cv2.INTER_LINEAR)
+        self.canvas[top:top + nh, left:left + nw] = self._resized
+        # BGR HWC uint8 -> RGB CHW float in [0, 1], written straight into the tensor
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0,
+                    out=self.tensor[0], casting="unsafe")
+        return self.tensor
+
+    # Maps xyxy boxes from model input space back to the original frame
+    def unmap(self, boxes: np.ndarray) -> np.ndarray:
+        left, top = self.pad
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] -= left
+        boxes[:, [1, 3]] -= top
+        boxes /= self.scale
+        h, w = self._last_shape
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        return boxes
+
+
+def _parse_names(raw) -> Dict[int, str]:
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        raw = ast.literal_eval(raw)
+    if isinstance(raw, (list, tuple)):
+        raw = dict(enumerate(raw))
+    return {int(k): str(v) for k, v in raw.items()}
+
+
+def _detections(boxes: np.ndarray, scores: np.ndarray, cls_ids: np.ndarray,
+                names: Dict[int, str]) -> List[dict]:
+    return [
+        {"name": names.get(int(c), str(int(c))).lower(), "cls_id": int(c),
+         "conf": float(s), "bbox": b.astype(np.float32)}
+        for b, s, c in zip(boxes, scores, cls_ids)
+    ]
+
+
+def _output_layout(rows: int, cols: int, nc: int) -> str:
+    """Which YOLO head produced a (rows, cols) output: "v8", "v8t" (transposed) or "v5"."""
+    if rows < cols:
+        return "v8"  # YOLOv8/11: (4 + nc, N)
+    if not nc:
+        # (N, 5 + nc) and (N, 4 + nc) only differ by the objectness column; the class count decides
+        raise ValueError("the model has no class names, so its YOLOv5 and YOLOv8 outputs look "
+                         "alike; export it with ultralytics (names are stored in its metadata)")
+    if cols == nc + 5:
+        return "v5"  # YOLOv5: (N, 5 + nc) with an objectness column
+    if cols == nc + 4:
+        return "v8t"
+    raise ValueError(f"model output has {cols} columns, expected {nc + 4} or {nc + 5} for {nc} classes")
+
+
+class OnnxBackend(InferenceBackend):
+    """YOLO exported to ONNX, run on CPU with a persistent onnxruntime session.
+
+    fp16 and int8 (QDQ) models are supported: the input tensor dtype follows
+    whatever the model declares. The output layout is worked out once, at
+    load time when the model declares its output shape, else on the first frame.
+    """
+
+    def __init__(self, model_path: str, imgsz: int = 640, conf: float = 0.25,
+                 iou: float = 0.45, threads: int = 2, names: Optional[Dict[int, str]] = None):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=opts,
+                                            providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        dtype = np.float16 if "float16" in inp.type else np.float32
+        shape = inp.shape
+        if isinstance(shape[-1], int):
+            imgsz = shape[-1]
+        self.letterbox = Letterbox(imgsz, dtype=dtype)
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = names or _parse_names(meta.get("names"))
+        self.conf = conf
+        self.iou = iou
+        self.layout = None
+        out_shape = self.session.get_outputs()[0].shape
+        if all(isinstance(d, int) for d in out_shape[-2:]):
+            self.layout = _output_layout(*out_shape[-2:], len(self.names))
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        tensor = self.letterbox(frame)
+        out = self.session.run(None, {self.input_name: tensor})[0][0].astype(np.float32, copy=False)
+
+        if self.layout is None:
+            self.layout = _output_layout(*out.shape, len(self.names))
+        if self.layout == "v8":
+            out = out.T
+        if self.layout == "v5":
+            class_scores = out[:, 5:] * out[:, 4:5]
+        else:
+            class_scores = out[:, 4:]
+        cls_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(cls_ids)), cls_ids]
+        keep = scores >= self.conf
+        if not keep.any():
+            return []
+        xywh, scores, cls_ids = out[keep, :4], scores[keep], cls_ids[keep]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        # Offsetting boxes per class keeps NMS from merging different classes
+        nms_boxes = np.column_stack([boxes[:, :2] + cls_ids[:, None] * 4096.0, xywh[:, 2:]])
+        idx = cv2.dnn.NMSBoxes(nms_boxes.tolist(), scores.tolist(), self.conf, self.iou)
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        return _detections(self.letterbox.unmap(boxes[idx]), scores[idx], cls_ids[idx], self.names)
+
+
+class UltralyticsBackend(InferenceBackend):
+    """Local ultralytics YOLO model (.pt, or any format ultralytics can load, e.g. int8 OpenVINO)."""
+
+    def __init__(self, model_path: str, imgsz: int = 640, conf: float = 0.25,
+                 iou: float = 0.45, half: bool = False):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = _parse_names(self.model.names)
+        self.kwargs = dict(imgsz=imgsz, conf=conf, iou=iou, half=half, verbose=False)
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        result = self.model.predict(frame, **self.kwargs)[0]
+        if not getattr(result, "boxes", None) or len(result.boxes) == 0:
+            return []
+        return _detections(result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                           result.boxes.cls.cpu().numpy(), self.names)
+
+
+class RoboflowBackend(InferenceBackend):
+    """Hosted Roboflow model over HTTP. Slow and needs a link, kept for comparison."""
+
+    def __init__(self, api_url: str, api_key: str, model_id: str):
+        from inference_sdk import InferenceHTTPClient
+
+        self.client = InferenceHTTPClient(api_url=api_url, api_key=api_key)
+        self.model_id = model_id
+        self.names = {}
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        response = self.client.infer(frame, model_id=self.model_id)
+        out = []
+        for p in response.get("predictions", []):
+            cls_id = int(p.get("class_id", -1))
+            self.names.setdefault(cls_id, p["class"])
+            x, y, w, h = p["x"], p["y"], p["width"], p["height"]
+            out.append({"name": p["class"].lower(), "cls_id": cls_id, "conf": float(p["confidence"]),
+                        "bbox": np.array([x - w / 2, y - h / 2, x + w / 2, y + h / 2], np.float32)})
+        return out
+
+
+class MockBackend(InferenceBackend):
+    """Returns a fixed set of detections for every frame; for testing without a model."""
+
+    def __init__(self, detections: Iterable[dict] = (), names: Optional[Dict[int, str]] = None):
+        self.detections = [dict(d, bbox=np.asarray(d["bbox"], np.float32)) for d in detections]
+        self.names = names or {d["cls_id"]: d["name"] for d in self.detections}
+
+    def infer(self, frame: np.ndarray) -> List[dict]:
+        return [dict(d, bbox=d["bbox"].copy()) for d in self.detections]
+
+
+def make_backend(kind: str, **kwargs) -> InferenceBackend:
+    """Builds a backend by name ("onnx", "ultralytics", "roboflow", "mock")."""
+    backends = {
+        "onnx": OnnxBackend,
+        "ultralytics": UltralyticsBackend,
+        "roboflow": RoboflowBackend,
+        "mock": MockBackend,
+    }
+    if kind not in backends:
+        raise ValueError(f"unknown inference backend {kind!r}, expected one of {sorted(backends)}")
+    return backends[kind](**kwargs)
+
+
+# Draws boxes and labels onto a copy of frame (into out, if given, to avoid allocating)
+def draw_detections(frame: np.ndarray, detections: List[dict], out: Optional[np.ndarray] = None) -> np.ndarray:
+    if out is None or out.shape != frame.shape:
+        out = frame.copy()
+    else:
+        np.copyto(out, frame)
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det["bbox"])
+        cv2.rectangle(out, (x1, y1), (x2, y2), (255, 0, 255), 2)
+        label = f"{det['name']} {det['conf']:.2f}"
+        cv2.putText(out, label, (x1, max(y1 - 5, 0)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return out
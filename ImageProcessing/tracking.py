@@ -0,0 +1,213 @@
+# tracking.py
+# Cheap frame-to-frame tracking between full detector passes.
+# The detector runs every N frames (or sooner when confidence drops); in between,
+# boxes are carried forward with sparse optical flow and smoothed with a small
+# constant-velocity Kalman filter, and the gauge needle angle is smoothed too.
+
+import itertools
+import math
+import time
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+class KalmanPoint:
+    """Constant-velocity Kalman filter for a 2D point (state x, y, vx, vy)."""
+
+    def __init__(self, x: float, y: float, accel_std: float = 400.0, measurement_noise: float = 4.0):
+        self.x = np.array([x, y, 0.0, 0.0])
+        self.P = np.diag([measurement_noise, measurement_noise, 1e4, 1e4])
+        self.q = accel_std ** 2  # px/s^2: how hard the drone can jerk the view around
+        self.R = np.eye(2) * measurement_noise
+        self._H = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0]])
+
+    def predict(self, dt: float) -> np.ndarray:
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        # Discrete white-noise acceleration model
+        g = np.array([[dt * dt / 2, 0], [0, dt * dt / 2], [dt, 0], [0, dt]])
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + g @ g.T * self.q
+        return self.x[:2]
+
+    def update(self, zx: float, zy: float, noise: Optional[float] = None) -> np.ndarray:
+        H = self._H
+        y = np.array([zx, zy]) - H @ self.x
+        S = H @ self.P @ H.T + (self.R if noise is None else np.eye(2) * noise)
+        K = self.P @ H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(4) - K @ H) @ self.P
+        return self.x[:2]
+
+
+class AngleSmoother:
+    """Exponential smoothing of an angle in degrees that handles the 359 -> 0 wrap."""
+
+    def __init__(self, alpha: float = 0.4):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, theta: float) -> float:
+        if self.value is None:
+            self.value = theta
+        else:
+            # Shortest signed difference, so 355 -> 5 moves +10 rather than -350
+            diff = (theta - self.value + 180.0) % 360.0 - 180.0
+            self.value = (self.value + self.alpha * diff) % 360.0
+        return self.value
+
+
+def _iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One tracked object: the last detection dict plus its flow points and Kalman state."""
+
+    def __init__(self, track_id: int, det: dict):
+        self.id = track_id
+        self.det = dict(det, track_id=track_id)
+        x1, y1, x2, y2 = (float(v) for v in det["bbox"])
+        self.size = np.array([x2 - x1, y2 - y1])
+        self.kf = KalmanPoint((x1 + x2) / 2, (y1 + y2) / 2)
+        self.points: Optional[np.ndarray] = None  # flow points, in tracking-image coordinates
+
+    def set_center(self, cx: float, cy: float) -> None:
+        w, h = self.size
+        self.det["bbox"] = np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], np.float32)
+
+    @property
+    def center(self) -> np.ndarray:
+        return self.kf.x[:2]
+
+
+class DetectionTracker:
+    """Decides when the detector must run and propagates detections in between."""
+
+    def __init__(self, detect_every: int = 5, low_conf: float = 0.95, conf_decay: float = 0.99,
+                 track_width: int = 320, min_points: int = 4, match_iou: float = 0.3):
+        self.detect_every = detect_every
+        self.low_conf = low_conf
+        self.conf_decay = conf_decay
+        self.track_width = track_width
+        self.min_points = min_points
+        self.match_iou = match_iou
+        self.tracks: List[Track] = []
+        self._ids = itertools.count(1)
+        self._since_detect = detect_every  # force a detection on the first frame
+        self._force = True
+        self._prev_gray: Optional[np.ndarray] = None
+        self._scale = 1.0
+        self._stamp = time.monotonic()
+        self.full_passes = 0
+        self.tracked_frames = 0
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        self._scale = min(1.0, self.track_width / w)
+        small = cv2.resize(frame, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA) \
+            if self._scale < 1.0 else frame
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def _seed_points(self, track: Track, gray: np.ndarray) -> None:
+        x1, y1, x2, y2 = (np.asarray(track.det["bbox"]) * self._scale).astype(int)
+        mask = np.zeros_like(gray)
+        mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 255
+        track.points = cv2.goodFeaturesToTrack(gray, maxCorners=30, qualityLevel=0.01,
+                                               minDistance=3, mask=mask)
+
+    def needs_detection(self) -> bool:
+        return self._force or not self.tracks or self._since_detect >= self.detect_every
+
+    def update(self, frame: np.ndarray, detections: List[dict]) -> List[dict]:
+        """Feeds a full detector result; keeps track ids stable by IoU matching per class."""
+        gray = self._gray(frame)
+        now = time.monotonic()
+        dt = now - self._stamp
+        self._stamp = now
+
+        unmatched = list(self.tracks)
+        tracks = []
+        for det in sorted(detections, key=lambda d: -d["conf"]):
+            best, best_iou = None, self.match_iou
+            for t in unmatched:
+                if t.det["name"] != det["name"]:
+                    continue
+                iou = _iou(t.det["bbox"], det["bbox"])
+                if iou > best_iou:
+                    best, best_iou = t, iou
+            if best is None:
+                track = Track(next(self._ids), det)
+            else:
+                unmatched.remove(best)
+                track = best
+                track.det = dict(det, track_id=track.id)
+                x1, y1, x2, y2 = (float(v) for v in det["bbox"])
+                track.size = np.array([x2 - x1, y2 - y1])
+                track.kf.predict(dt)
+                # The detector is the ground truth; trust it far more than the flow estimate
+                track.kf.update((x1 + x2) / 2, (y1 + y2) / 2, noise=0.25)
+            self._seed_points(track, gray)
+            tracks.append(track)
+
+        self.tracks = tracks
+        self._prev_gray = gray
+        self._since_detect = 0
+        self._force = any(d["conf"] < self.low_conf for d in detections)
+        self.full_passes += 1
+        return [dict(t.det, tracked=False) for t in self.tracks]
+
+    def propagate(self, frame: np.ndarray) -> List[dict]:
+        """Moves every track to the current frame with optical flow; no detector needed."""
+        gray = self._gray(frame)
+        now = time.monotonic()
+        dt = now - self._stamp
+        self._stamp = now
+        self._since_detect += 1
+        self.tracked_frames += 1
+
+        alive = []
+        for t in self.tracks:
+            pred = t.kf.predict(dt)
+            if t.points is not None and len(t.points) >= self.min_points:
+                nxt, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, t.points, None,
+                                                          winSize=(15, 15), maxLevel=2)
+                good = status.reshape(-1) == 1
+                if good.sum() >= self.min_points:
+                    shift = np.median((nxt[good] - t.points[good]).reshape(-1, 2), axis=0) / self._scale
+                    x1, y1, x2, y2 = t.det["bbox"]
+                    t.kf.update((x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1])
+                    t.points = nxt[good].reshape(-1, 1, 2)
+                else:
+                    t.points = None
+            if t.points is None or len(t.points) < self.min_points:
+                # Lost the flow: coast on the Kalman prediction and ask for a detection
+                self._force = True
+                t.set_center(*pred)
+            else:
+                t.set_center(*t.center)
+            t.det["conf"] *= self.conf_decay
+            if t.det["conf"] < self.low_conf:
+                self._force = True
+            alive.append(t)
+
+        self.tracks = alive
+        self._prev_gray = gray
+        return [dict(t.det, tracked=True) for t in self.tracks]
+
+    def track_for(self, name: str) -> Optional[Track]:
+        return next((t for t in self.tracks if t.det["name"] == name), None)
+
+
+# Angle of the needle in degrees (0-360), with the same zero and direction as the original
+# handle_gauge arithmetic but without its jump when the tip is below and right of the centre.
+def needle_angle(center, tip) -> float:
+    dx = tip[0] - center[0]
+    dy = tip[1] - center[1]
+    return (math.degrees(math.atan2(dy, dx)) - 90.0) % 360.0
@@ -1,10 +1,15 @@
 # app.py
-from flask import Flask, render_template, jsonify, send_file
+# Threaded Flask dev server; see server.py for the async server running on the App's own loop
+from flask import Flask, Response, render_template, jsonify, request, send_file
 import asyncio
 from main import App  # your existing App class from main.py
+import config
+import metrics
+from history import History
+from live_updates import LiveState, stream
+from mjpeg import MjpegBroadcaster, mjpeg_stream
 import threading
 import io
-from PIL import Image
 
 app = Flask(__name__)
 
@@ -13,10 +18,23 @@ loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
 stop_event = asyncio.Event()
 my_app = App(stop_event=stop_event)
+# Current dashboard fields, fed from the results bus, for /stream clients
+live = LiveState(history=config.LIVE_HISTORY)
+# Downsampled chart data from the time-series store (None when history is disabled)
+history = History(my_app.store, cache_size=config.HISTORY_CACHE, max_points=config.HISTORY_MAX_POINTS) \
+    if my_app.store is not None else None
+# Shared JPEG encoder for /video_feed: one encode per frame and quality tier, however many viewers
+video = MjpegBroadcaster(my_app.frames, lambda img, quality: my_app.cam._encode_jpeg(img, quality))
 
-# Start the App (camera + sensors)
+async def start_tasks():
+    await my_app.start()
+    my_app.tasks.append(asyncio.create_task(live.run(my_app.bus, camera_id=my_app.cameras.primary)))
+    my_app.tasks.append(asyncio.create_task(video.run(my_app.bus, camera_id=my_app.cameras.primary)))
+
+# Start the App (camera + sensors) and keep its loop running for the tasks
 def start_async_app():
-    loop.run_until_complete(my_app.start())
+    loop.run_until_complete(start_tasks())
+    loop.run_forever()
 threading.Thread(target=start_async_app, daemon=True).start()
 
 
@@ -35,27 +53,72 @@ def get_data():
         if key not in data or data[key] is None:
             data[key] = 0.0
     # Camera info
-    camera_payload = data.get("camera", {})
+    camera_payload = data.get("camera") or {}
     data["target_found"] = bool(camera_payload.get("names"))
     data["target_type"] = ",".join(camera_payload.get("names", [])) if camera_payload.get("names") else "--"
     return jsonify(data)
 
 
+@app.route("/stream")
+def live_stream():
+    """Server-sent events: a snapshot, then only the fields that changed.
+
+    Browsers resend the last event id on reconnect (Last-Event-ID); ?since=<seq> does the same.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+    rate = request.args.get("rate", type=float) or config.LIVE_MAX_RATE
+    body = stream(live, last_id, max_rate=min(rate, config.LIVE_MAX_RATE), heartbeat=config.LIVE_HEARTBEAT)
+    return Response(body, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/history")
+def get_history():
+    """?key=<series>&start=&end=(epoch s, default the whole flight)&points=&method=m4|lttb"""
+    if history is None:
+        return jsonify(error="history disabled (TS_PATH is empty)"), 404
+    key = request.args.get("key", "")
+    try:
+        return jsonify(history.query(key, request.args.get("start", type=float), request.args.get("end", type=float),
+                                     points=request.args.get("points", 500, type=int),
+                                     method=request.args.get("method", "m4")))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+
+@app.route("/video_feed")
+def video_feed():
+    """Live MJPEG stream; quality and resolution adapt to each client's link (?tier=0-3 pins one)"""
+    fps = min(request.args.get("fps", type=float) or config.VIDEO_MAX_FPS, config.VIDEO_MAX_FPS)
+    body = mjpeg_stream(video, max_fps=fps, tier=request.args.get("tier", type=int))
+    return Response(body, mimetype="multipart/x-mixed-replace; boundary=frame",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/camera_feed")
 def camera_feed():
-    """Return latest camera image"""
-    camera_payload = my_app.latest_data.get("camera")
-    if camera_payload and "frame" in camera_payload:
-        # Convert frame (numpy array) to JPEG
-        img = Image.fromarray(camera_payload["frame"])
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG")
-        buf.seek(0)
-        return send_file(buf, mimetype="image/jpeg")
+    """Return latest camera image (?camera=<id> for one other than the primary camera)"""
+    camera_payload = my_app.camera_payload(request.args.get("camera"))
+    # Payload only holds a FrameRef; copy the frame out of the shared ring (None if its slot was reused),
+    # since this runs on a Flask thread and the camera may overwrite the slot mid-encode
+    frame = my_app.frames.copy(camera_payload.get("annotated")) if camera_payload else None
+    jpeg = my_app.cam._encode_jpeg(frame) if frame is not None else None
+    if jpeg:
+        return send_file(io.BytesIO(jpeg), mimetype="image/jpeg")
     else:
         # Return placeholder
         return send_file("static/latest.jpg", mimetype="image/jpeg")
 
 
+
+@app.route("/metrics")
+def get_metrics():
+    """Step/stage latency histograms, queue depth and drop counters for Prometheus"""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
@@ -0,0 +1,156 @@
+# history.py
+# Downsampled sensor history for the dashboard charts.
+#
+# A chart asks for a series over a time range at roughly one point per pixel.
+# The range is read from the coarsest rollup in the time-series store that is
+# still finer than one chart bucket (raw samples only for short ranges), so
+# the rows read stay proportional to the points asked for, not to the flight
+# length. It is then reduced with M4 (first, min, max and last of every
+# bucket, so spikes are never averaged away) or LTTB (a fixed number of
+# visually representative points). Results are cached per series and range;
+# a cached range is reused until new data arrives inside it.
+
+import collections
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+METHODS = ("m4", "lttb")
+
+
+def _buckets(t: np.ndarray, start: float, end: float, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end row of every non-empty bucket of n equal-width buckets over [start, end]."""
+    idx = np.clip(((t - start) * (n / (end - start))).astype(np.int64), 0, n - 1)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(idx)) + 1))
+    ends = np.append(starts[1:], len(t))
+    return starts, ends
+
+
+def _first_in_bucket(mask: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # Row of the first True of mask within each bucket (every bucket has one)
+    rows = np.flatnonzero(mask)
+    return rows[np.searchsorted(rows, starts)]
+
+
+def m4(t: np.ndarray, lo: np.ndarray, hi: np.ndarray, first: np.ndarray, last: np.ndarray,
+       start: float, end: float, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """M4 reduction: the first, lowest, highest and last point of each bucket, in time order.
+
+    For raw samples lo, hi, first and last are all the values; for rollup rows
+    they are the min, max, mean and last columns.
+    """
+    if len(t) == 0:
+        return np.empty(0), np.empty(0)
+    starts, ends = _buckets(t, start, end, buckets)
+    counts = ends - starts
+    mins = np.minimum.reduceat(lo, starts)
+    maxs = np.maximum.reduceat(hi, starts)
+    rmin = _first_in_bucket(lo == np.repeat(mins, counts), starts)
+    rmax = _first_in_bucket(hi == np.repeat(maxs, counts), starts)
+    rfirst, rlast = starts, ends - 1
+    # (row, kind) for every candidate; kind orders points that share a row
+    rows = np.concatenate((rfirst, rmin, rmax, rlast))
+    kinds = np.repeat(np.arange(4), len(starts))
+    values = np.concatenate((first[rfirst], lo[rmin], hi[rmax], last[rlast]))
+    order = np.lexsort((kinds, rows))
+    rows, values = rows[order], values[order]
+    # A raw sample that is, say, both first and min of its bucket is one point
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (values[1:] != values[:-1])
+    return t[rows[keep]], values[keep]
+
+
+def lttb(t: np.ndarray, v: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets: `points` points that keep the visual shape of the line."""
+    n = len(t)
+    if points >= n or points < 3:
+        return t, v
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket (or the last point) is the triangle's third corner
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        ct, cv = (t[nlo:nhi].mean(), v[nlo:nhi].mean()) if nhi > nlo else (t[-1], v[-1])
+        area = np.abs((t[a] - ct) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (cv - v[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return t[keep], v[keep]
+
+
+class History:
+    """Serves downsampled ranges of a TimeSeriesStore with a small LRU cache."""
+
+    def __init__(self, store, cache_size: int = 64, max_points: int = 2000):
+        self.store = store
+        self.max_points = max_points
+        self._cache: "collections.OrderedDict[tuple, Tuple[float, dict]]" = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _level(self, bucket_width: float) -> str:
+        # Coarsest rollup that still puts at least one row in every chart bucket
+        best = "raw"
+        for w in self.store.levels:
+            if w <= bucket_width:
+                best = f"{w}s"
+        return best
+
+    def query(self, name: str, start: Optional[float] = None, end: Optional[float] = None,
+              points: int = 500, method: str = "m4") -> dict:
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+        span = self.store.span(name)
+        result = {"key": name, "method": method, "level": None, "t": [], "v": []}
+        if span is None:
+            return dict(result, start=start, end=end)
+        start = span[0] if start is None else max(start, span[0])
+        end = span[1] if end is None else end
+        points = max(4, min(int(points), self.max_points))
+        buckets = max(1, points // 4) if method == "m4" else points
+        if end <= start:
+            return dict(result, start=start, end=end)
+
+        # Snap the range to whole buckets so a live chart polling "up to now" reuses its entry
+        width = (end - start) / buckets
+        key = (name, method, points, math.floor(start / width), math.ceil(end / width))
+        last_t = span[1]
+        with self._lock:
+            cached = self._cache.get(key)
+            # Still valid if nothing newer has been stored, or the whole range is already in the past
+            if cached is not None and (cached[0] == last_t or end <= cached[0]):
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        self.misses += 1
+
+        level = self._level(width)
+        cols = self.store.query(name, start, end, level)
+        if level == "raw":
+            t, v = cols["t"], cols["v"]
+            ok = ~np.isnan(v)
+            t, lo, hi, first, last = t[ok], v[ok], v[ok], v[ok], v[ok]
+        else:
+            ok = cols["n"] > 0
+            t, lo, hi, first, last = (cols[c][ok] for c in ("t", "min", "max", "mean", "last"))
+        if method == "m4":
+            ts, vs = m4(t, lo, hi, first, last, start, end, buckets)
+        else:
+            ts, vs = lttb(t, first, points)
+        result = dict(result, start=start, end=end, level=level, t=ts.tolist(), v=vs.tolist())
+
+        with self._lock:
+            self._cache[key] = (last_t, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,223 @@
+# live_updates.py
+# Server-sent events for the dashboard: only fields that changed are pushed.
+#
+# LiveState is fed from the results bus and keeps the current value of every
+# dashboard field plus a short history of deltas, each with a sequence number.
+# A client stream sends a snapshot, then waits for newer sequence numbers and
+# sends the merged changes since its last event, at most max_rate times a
+# second. A slow client therefore gets fewer, larger deltas instead of a
+# growing backlog, and a client that reconnects with Last-Event-ID gets just
+# what it missed (or a fresh snapshot if that has left the history).
+#
+# stream() serves one client from a web server thread; astream() is the same
+# thing for an async server running on the app's own event loop.
+
+import asyncio
+import collections
+import json
+import math
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+SENSOR_FIELDS = ("temp", "hum", "light", "press", "red_gas", "ox_gas", "nh3")
+
+_MISSING = object()
+
+
+def _clean(value, digits: int):
+    # Round floats so sensor noise below display precision doesn't count as a change
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, digits)
+    return value
+
+
+def dashboard_fields(topic: str, payload: dict, digits: int = 2) -> dict:
+    """The flat dashboard fields carried by one bus message."""
+    if topic == "air_quality":
+        return {k: _clean(payload.get(k), digits) for k in SENSOR_FIELDS if k in payload}
+    if topic == "camera":
+        names = payload.get("names") or []
+        fields = {
+            "target_found": bool(names),
+            "target_type": ",".join(names) if names else "--",
+            "gauge_psi": payload.get("gauge_psi"),
+            "gauge_theta": payload.get("gauge_theta"),
+            "valve_position": payload.get("Valve_position"),
+            "aruco_ids": payload.get("ArUco_Marker_id"),
+        }
+        # Lets the page reload the camera image only when there is a new frame
+        ref = payload.get("annotated")
+        if ref is not None:
+            fields["frame"] = ref.generation
+        return fields
+    return {}
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class Waiters:
+    """Futures of coroutines waiting for a change; can be woken from any thread."""
+
+    def __init__(self):
+        self._futures: List[asyncio.Future] = []
+
+    def add(self) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._futures.append(fut)
+        return fut
+
+    def wake_all(self) -> None:
+        for fut in self._futures:
+            fut.get_loop().call_soon_threadsafe(_resolve, fut)
+        self._futures.clear()
+
+
+async def wait_future(fut: asyncio.Future, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(fut, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class LiveState:
+    def __init__(self, history: int = 256, digits: int = 2):
+        self.digits = digits
+        self.seq = 0
+        self.values: Dict[str, object] = {}
+        self._history = collections.deque(maxlen=history)  # (seq, changes)
+        self._cond = threading.Condition()
+        self._waiters = Waiters()
+
+    def update(self, fields: dict) -> Optional[int]:
+        """Applies new field values; returns the new sequence number, or None if nothing changed."""
+        with self._cond:
+            changes = {k: v for k, v in fields.items() if self.values.get(k, _MISSING) != v}
+            if not changes:
+                return None
+            self.seq += 1
+            self.values.update(changes)
+            self._history.append((self.seq, changes))
+            self._cond.notify_all()
+            self._waiters.wake_all()
+            return self.seq
+
+    def snapshot(self) -> Tuple[int, dict]:
+        with self._cond:
+            return self.seq, dict(self.values)
+
+    def since(self, seq: int) -> Tuple[int, Optional[dict]]:
+        """Changes after seq merged into one dict; None when seq is too old (or from a previous run)."""
+        with self._cond:
+            if seq > self.seq:
+                return self.seq, None
+            if seq == self.seq:
+                return seq, {}
+            if not self._history or self._history[0][0] > seq + 1:
+                return self.seq, None
+            merged = {}
+            for s, changes in self._history:
+                if s > seq:
+                    merged.update(changes)
+            return self.seq, merged
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        """Blocks until there is something newer than seq; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq != seq, timeout)
+
+    async def wait_async(self, seq: int, timeout: float) -> bool:
+        """wait() for coroutines on the app's loop."""
+        with self._cond:
+            if self.seq != seq:
+                return True
+            fut = self._waiters.add()
+        return await wait_future(fut, timeout)
+
+    async def run(self, bus, camera_id: Optional[str] = None) -> None:
+        """Bus subscriber (on the app's event loop) keeping the state current.
+
+        With several cameras only camera_id's payloads feed the camera fields.
+        """
+        sub = bus.subscribe(["camera", "air_quality"], name="live updates", replay_last=True)
+        try:
+            async for msg in sub:
+                if msg.topic == "camera" and camera_id is not None and msg.payload.get("camera_id") != camera_id:
+                    continue
+                self.update(dashboard_fields(msg.topic, msg.payload, self.digits))
+        finally:
+            sub.close()
+
+
+def sse(event: str, data, event_id: Optional[int] = None) -> str:
+    out = f"event: {event}\n"
+    if event_id is not None:
+        out += f"id: {event_id}\n"
+    return out + "data: " + json.dumps(data, separators=(",", ":")) + "\n\n"
+
+
+def _opening(state: LiveState, last_id: Optional[int]) -> Tuple[int, Optional[str]]:
+    # Resume from last_id when it is still in the history, otherwise start with a snapshot
+    seq, changes = state.since(last_id) if last_id is not None else (state.seq, None)
+    if changes is None:
+        seq, values = state.snapshot()
+        return seq, sse("snapshot", values, seq)
+    return seq, sse("delta", changes, seq) if changes else None
+
+
+def _next_event(state: LiveState, seq: int) -> Tuple[int, Optional[str]]:
+    new_seq, changes = state.since(seq)
+    if changes is None:
+        new_seq, values = state.snapshot()
+        return new_seq, sse("snapshot", values, new_seq)
+    return new_seq, sse("delta", changes, new_seq) if changes else None
+
+
+def stream(state: LiveState, last_id: Optional[int] = None, max_rate: float = 5.0,
+           heartbeat: float = 15.0, retry_ms: int = 2000,
+           stop: Optional[threading.Event] = None) -> Iterator[str]:
+    """SSE text for one client. Runs on the web server's thread for that client."""
+    yield f"retry: {retry_ms}\n\n"
+    seq, event = _opening(state, last_id)
+    if event:
+        yield event
+    min_gap = 1.0 / max_rate if max_rate else 0.0
+    last_sent = time.monotonic()
+    while stop is None or not stop.is_set():
+        if not state.wait(seq, heartbeat):
+            yield ": keep-alive\n\n"
+            continue
+        # Coalesce: anything else arriving before this client's next slot goes in the same event
+        wait = last_sent + min_gap - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        seq, event = _next_event(state, seq)
+        if event:
+            yield event
+        last_sent = time.monotonic()
+
+
+async def astream(state: LiveState, last_id: Optional[int] = None, max_rate: float = 5.0,
+                  heartbeat: float = 15.0, retry_ms: int = 2000) -> AsyncIterator[str]:
+    """stream() for an async server on the same loop as the bus; ends when cancelled."""
+    yield f"retry: {retry_ms}\n\n"
+    seq, event = _opening(state, last_id)
+    if event:
+        yield event
+    min_gap = 1.0 / max_rate if max_rate else 0.0
+    last_sent = time.monotonic()
+    while True:
+        if not await state.wait_async(seq, heartbeat):
+            yield ": keep-alive\n\n"
+            continue
+        wait = last_sent + min_gap - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        seq, event = _next_event(state, seq)
+        if event:
+            yield event
+        last_sent = time.monotonic()
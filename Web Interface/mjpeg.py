@@ -0,0 +1,208 @@
+# mjpeg.py
+# Encode-once MJPEG streaming for the camera feed.
+#
+# The broadcaster follows the camera topic on the results bus and copies each new
+# annotated frame out of the shared ring once. Each frame is JPEG-encoded at most
+# once per quality tier, lazily, the first time any client asks for that tier;
+# every viewer on that tier gets the same bytes. Each client picks its tier from
+# how long its last frames took to send, stepping down on a slow link and back up
+# when it recovers, and always gets the newest frame when it is ready for one, so
+# a slow client skips frames instead of queueing them.
+#
+# mjpeg_stream() serves a client from a web server thread and amjpeg_stream()
+# from an async server on the app's loop, where encoding goes to the default
+# executor so it doesn't stall the loop.
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from live_updates import Waiters, wait_future
+
+
+class Tier(NamedTuple):
+    scale: float    # fraction of the camera resolution
+    quality: int    # JPEG quality
+
+
+# Best first
+DEFAULT_TIERS = (Tier(1.0, 85), Tier(0.75, 70), Tier(0.5, 60), Tier(0.33, 50))
+
+
+class MjpegBroadcaster:
+    def __init__(self, frames, encode: Callable[[np.ndarray, int], Optional[bytes]],
+                 tiers: Tuple[Tier, ...] = DEFAULT_TIERS):
+        self.frames = frames     # FrameRing the camera writes into
+        self.encode = encode     # CameraTask._encode_jpeg
+        self.tiers = tiers
+        self.seq = 0
+        self._frame: Optional[np.ndarray] = None
+        self._cache: Dict[int, Tuple[int, bytes]] = {}  # tier -> (seq, jpeg)
+        self._tier_locks = [threading.Lock() for _ in tiers]
+        self._cond = threading.Condition()
+        self._waiters = Waiters()
+        self.encodes = 0
+        self.clients = 0
+
+    # ---- producer side (event loop) ---- #
+    def offer(self, ref) -> bool:
+        """Takes a new annotated frame from the ring; False if it was already overwritten."""
+        frame = self.frames.copy(ref)
+        if frame is None:
+            return False
+        with self._cond:
+            self._frame = frame
+            self.seq += 1
+            self._cond.notify_all()
+            self._waiters.wake_all()
+        return True
+
+    async def run(self, bus, camera_id: Optional[str] = None) -> None:
+        # Conflating camera topic: if we fall behind only the newest frame (per camera) is waiting
+        sub = bus.subscribe("camera", name="mjpeg", replay_last=True)
+        last_gen = None
+        try:
+            async for msg in sub:
+                if camera_id is not None and msg.payload.get("camera_id") != camera_id:
+                    continue  # another camera's stream
+                ref = msg.payload.get("annotated")
+                if ref is None or ref.generation == last_gen:
+                    continue  # motion-gated repeat of the same image
+                if self.clients and self.offer(ref):
+                    last_gen = ref.generation
+        finally:
+            sub.close()
+
+    # ---- consumer side (web server threads) ---- #
+    def wait(self, seq: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.seq
+
+    async def wait_async(self, seq: int, timeout: float) -> int:
+        with self._cond:
+            if self.seq != seq:
+                return self.seq
+            fut = self._waiters.add()
+        await wait_future(fut, timeout)
+        return self.seq
+
+    def jpeg(self, tier: int) -> Tuple[int, Optional[bytes]]:
+        """(seq, bytes) of the newest frame at the given tier, encoding it if nobody has yet."""
+        with self._cond:
+            seq, frame = self.seq, self._frame
+        if frame is None:
+            return seq, None
+        cached = self._cache.get(tier)
+        if cached is not None and cached[0] == seq:
+            return cached
+        with self._tier_locks[tier]:
+            cached = self._cache.get(tier)
+            if cached is not None and cached[0] >= seq:
+                return cached  # another client encoded it while we waited
+            scale, quality = self.tiers[tier]
+            img = frame if scale >= 1.0 else cv2.resize(frame, None, fx=scale, fy=scale,
+                                                        interpolation=cv2.INTER_AREA)
+            data = self.encode(img, quality)
+            self.encodes += 1
+            if data is not None:
+                self._cache[tier] = (seq, data)
+            return seq, data
+
+
+class ClientPacer:
+    """Chooses a client's tier from how long its recent frames took to send."""
+
+    def __init__(self, tiers: int, budget: float, window: int = 5):
+        self.tier = 0
+        self.tiers = tiers
+        self.budget = budget    # seconds a frame may take to send
+        self.window = window
+        self._times: List[float] = []
+
+    def record(self, send_time: float) -> None:
+        self._times.append(send_time)
+        if len(self._times) < self.window:
+            return
+        avg = sum(self._times) / len(self._times)
+        self._times.clear()
+        if avg > self.budget and self.tier < self.tiers - 1:
+            self.tier += 1
+        elif avg < self.budget * 0.3 and self.tier > 0:
+            self.tier -= 1
+
+
+def _part(data: bytes, boundary: str) -> bytes:
+    return (f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n"
+            .encode() + data + b"\r\n")
+
+
+def mjpeg_stream(broadcaster: MjpegBroadcaster, max_fps: float = 10.0, tier: Optional[int] = None,
+                 boundary: str = "frame", stop: Optional[threading.Event] = None) -> Iterator[bytes]:
+    """multipart/x-mixed-replace body for one client.
+
+    Time spent suspended at a yield is the server writing the previous part to
+    the socket, which is what the pacer uses to judge the link. A fixed tier
+    disables adaptation.
+    """
+    pacer = ClientPacer(len(broadcaster.tiers), budget=1.0 / max_fps)
+    if tier is not None:
+        pacer.tier = max(0, min(tier, len(broadcaster.tiers) - 1))
+    seq = 0
+    broadcaster.clients += 1
+    try:
+        while stop is None or not stop.is_set():
+            new_seq = broadcaster.wait(seq, timeout=5.0)
+            if new_seq == seq:
+                continue
+            frame_seq, data = broadcaster.jpeg(pacer.tier)
+            if data is None:
+                seq = new_seq
+                continue
+            seq = frame_seq
+            t0 = time.monotonic()
+            yield _part(data, boundary)
+            send = time.monotonic() - t0
+            if tier is None:
+                pacer.record(send)
+            # Cap the rate; the frames in between are skipped, not queued
+            rest = 1.0 / max_fps - send
+            if rest > 0:
+                time.sleep(rest)
+    finally:
+        broadcaster.clients -= 1
+
+
+async def amjpeg_stream(broadcaster: MjpegBroadcaster, max_fps: float = 10.0, tier: Optional[int] = None,
+                        boundary: str = "frame") -> AsyncIterator[bytes]:
+    """mjpeg_stream() for an async server on the app's loop; ends when cancelled."""
+    loop = asyncio.get_running_loop()
+    pacer = ClientPacer(len(broadcaster.tiers), budget=1.0 / max_fps)
+    if tier is not None:
+        pacer.tier = max(0, min(tier, len(broadcaster.tiers) - 1))
+    seq = 0
+    broadcaster.clients += 1
+    try:
+        while True:
+            new_seq = await broadcaster.wait_async(seq, timeout=5.0)
+            if new_seq == seq:
+                continue
+            frame_seq, data = await loop.run_in_executor(None, broadcaster.jpeg, pacer.tier)
+            if data is None:
+                seq = new_seq
+                continue
+            seq = frame_seq
+            t0 = time.monotonic()
+            yield _part(data, boundary)
+            send = time.monotonic() - t0
+            if tier is None:
+                pacer.record(send)
+            rest = 1.0 / max_fps - send
+            if rest > 0:
+                await asyncio.sleep(rest)
+    finally:
+        broadcaster.clients -= 1
@@ -0,0 +1,180 @@
+# server.py
+# Async web interface running on the App's own event loop.
+#
+# Same routes as app.py, but served by aiohttp as an App service: it starts
+# and stops with the camera and sensor tasks, handlers read App state
+# directly (everything runs on one loop, so no locks or copies for thread
+# safety), and SIGTERM shuts the whole process down cleanly.
+#
+#   python "Web Interface/server.py" [--hal synthetic] [--replay PATH] ...
+
+import asyncio
+import functools
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Optional, Set
+
+from aiohttp import web
+
+# Run as a script, only this directory is on the path; config, main etc. live in the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+import metrics
+from history import History
+from live_updates import LiveState, SENSOR_FIELDS, astream
+from main import App, amain, parse_args
+from mjpeg import MjpegBroadcaster, amjpeg_stream
+
+HERE = Path(__file__).resolve().parent
+DASHBOARD = HERE / "Templates" / "dashboard.html"
+STATIC = HERE / "static"
+PLACEHOLDER = STATIC / "latest.jpg"
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class WebServer:
+    def __init__(self, app: App, host: str = config.WEB_HOST, port: int = config.WEB_PORT):
+        self.app = app
+        self.host = host
+        self.port = port
+        # Current dashboard fields for /stream clients, and the shared encoder for /video_feed
+        self.live = LiveState(history=config.LIVE_HISTORY)
+        self.video = MjpegBroadcaster(app.frames, self._encode)
+        self.history = History(app.store, cache_size=config.HISTORY_CACHE, max_points=config.HISTORY_MAX_POINTS) \
+            if app.store is not None else None
+        # Open /stream and /video_feed handlers; cancelled on shutdown so they don't hold it up
+        self._streams: Set[asyncio.Task] = set()
+
+    def _encode(self, img, quality: int = 85) -> Optional[bytes]:
+        return self.app.cam._encode_jpeg(img, quality)
+
+    def routes(self) -> web.Application:
+        web_app = web.Application()
+        web_app.add_routes([
+            web.get("/", self.dashboard),
+            web.get("/data", self.get_data),
+            web.get("/stream", self.live_stream),
+            web.get("/history", self.get_history),
+            web.get("/video_feed", self.video_feed),
+            web.get("/camera_feed", self.camera_feed),
+            web.get("/metrics", self.get_metrics),
+        ])
+        if STATIC.is_dir():
+            web_app.router.add_static("/static", STATIC)
+        return web_app
+
+    # ===================== DASHBOARD ROUTES ===================== #
+    async def dashboard(self, request: web.Request) -> web.StreamResponse:
+        return web.FileResponse(DASHBOARD)
+
+    async def get_data(self, request: web.Request) -> web.Response:
+        """Return latest sensor and camera data as JSON"""
+        data = dict(self.app.latest_data)
+        for key in SENSOR_FIELDS:
+            if data.get(key) is None:
+                data[key] = 0.0
+        camera_payload = data.get("camera") or {}
+        names = camera_payload.get("names")
+        data["target_found"] = bool(names)
+        data["target_type"] = ",".join(names) if names else "--"
+        return web.json_response(data, dumps=functools.partial(json.dumps, default=str))
+
+    async def live_stream(self, request: web.Request) -> web.StreamResponse:
+        """Server-sent events: a snapshot, then only the fields that changed (resumes from Last-Event-ID or ?since)"""
+        last_id = request.headers.get("Last-Event-ID") or request.query.get("since")
+        try:
+            last_id = int(last_id) if last_id is not None else None
+        except ValueError:
+            last_id = None
+        rate = min(_query_float(request, "rate") or config.LIVE_MAX_RATE, config.LIVE_MAX_RATE)
+        body = astream(self.live, last_id, max_rate=rate, heartbeat=config.LIVE_HEARTBEAT)
+        return await self._stream(request, body, "text/event-stream", str.encode)
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        """?key=<series>&start=&end=(epoch s, default the whole flight)&points=&method=m4|lttb"""
+        if self.history is None:
+            return web.json_response({"error": "history disabled (TS_PATH is empty)"}, status=404)
+        try:
+            points = int(request.query.get("points", 500))
+            result = self.history.query(request.query.get("key", ""), _query_float(request, "start"),
+                                        _query_float(request, "end"), points=points,
+                                        method=request.query.get("method", "m4"))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(result)
+
+    async def video_feed(self, request: web.Request) -> web.StreamResponse:
+        """Live MJPEG stream; quality and resolution adapt to each client's link (?tier=0-3 pins one)"""
+        fps = min(_query_float(request, "fps") or config.VIDEO_MAX_FPS, config.VIDEO_MAX_FPS)
+        tier = request.query.get("tier")
+        body = amjpeg_stream(self.video, max_fps=fps, tier=int(tier) if tier and tier.isdigit() else None)
+        return await self._stream(request, body, "multipart/x-mixed-replace; boundary=frame")
+
+    async def camera_feed(self, request: web.Request) -> web.StreamResponse:
+        """Return latest camera image (?camera=<id> for one other than the primary camera)"""
+        camera_payload = self.app.camera_payload(request.query.get("camera"))
+        frame = self.app.frames.copy(camera_payload.get("annotated")) if camera_payload else None
+        if frame is not None:
+            # Encode off the loop; the copy above already detached it from the ring
+            jpeg = await asyncio.get_running_loop().run_in_executor(None, self._encode, frame)
+            if jpeg:
+                return web.Response(body=jpeg, content_type="image/jpeg")
+        return web.FileResponse(PLACEHOLDER)
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        """Step/stage latency histograms, queue depth and drop counters for Prometheus"""
+        return web.Response(body=metrics.REGISTRY.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4"})
+
+    async def _stream(self, request, body, content_type: str, encode=None) -> web.StreamResponse:
+        response = web.StreamResponse(headers=dict(STREAM_HEADERS, **{"Content-Type": content_type}))
+        await response.prepare(request)
+        task = asyncio.current_task()
+        self._streams.add(task)
+        try:
+            async for chunk in body:
+                await response.write(encode(chunk) if encode else chunk)
+        except ConnectionResetError:
+            pass  # client went away
+        finally:
+            self._streams.discard(task)
+            await body.aclose()
+        return response
+
+    # ===================== Service ===================== #
+    async def run(self) -> None:
+        runner = web.AppRunner(self.routes())
+        await runner.setup()
+        primary = self.app.cameras.primary
+        feeders = [asyncio.create_task(self.live.run(self.app.bus, camera_id=primary)),
+                   asyncio.create_task(self.video.run(self.app.bus, camera_id=primary))]
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+            logging.info(f"web interface on http://{self.host}:{self.port}")
+            await asyncio.Event().wait()  # until App.stop() cancels us
+        finally:
+            for task in feeders + list(self._streams):
+                task.cancel()
+            await asyncio.gather(*feeders, return_exceptions=True)
+            await runner.cleanup()
+            logging.info("web interface stopped")
+
+
+def _query_float(request: web.Request, name: str) -> Optional[float]:
+    try:
+        return float(request.query[name])
+    except (KeyError, ValueError):
+        return None
+
+
+async def serve(app: App) -> None:
+    """App service: the web interface on config.WEB_HOST:WEB_PORT."""
+    await WebServer(app).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(amain(parse_args(), services=[serve]))
@@ -0,0 +1,120 @@
+# harness.py
+# Timing loop, summary statistics and baseline comparison for the benchmark suite.
+
+import gc
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Skip(Exception):
+    """Raised by a stage's setup when it can't run here (missing binary, model, library)."""
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarise(samples: np.ndarray) -> dict:
+    """Latency percentiles (ms) and throughput of one stage's per-call timings (s)."""
+    ms = samples * 1000.0
+    total = float(samples.sum())
+    return {
+        "n": int(samples.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "fps": samples.size / total if total > 0 else None,
+    }
+
+
+def run_stage(fn: Callable[[], object], iterations: int = 200, warmup: int = 10,
+              before: Optional[Callable[[], None]] = None, max_seconds: float = 30.0) -> dict:
+    """Times fn() once per iteration. before(), if given, runs untimed ahead of every call.
+
+    Stops early after max_seconds so a slow stage (tesseract, a real model) can't
+    stall the whole suite; the report says how many calls were actually made.
+    """
+    for _ in range(warmup):
+        if before:
+            before()
+        fn()
+    gc.collect()
+    rss_before = peak_rss_mb()
+    samples = np.empty(iterations)
+    deadline = time.perf_counter() + max_seconds
+    n = 0
+    for n in range(1, iterations + 1):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        samples[n - 1] = time.perf_counter() - t0
+        if time.perf_counter() > deadline:
+            break
+    result = summarise(samples[:n])
+    result["peak_rss_mb"] = peak_rss_mb()
+    if rss_before is not None:
+        result["peak_rss_growth_mb"] = result["peak_rss_mb"] - rss_before
+    return result
+
+
+def environment() -> dict:
+    import cv2
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def save(path: str, report: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+# Metrics where bigger is worse, compared relative to the baseline
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.15, min_delta_ms: float = 0.1) -> Dict[str, dict]:
+    """Per-stage ratios current/baseline; a stage regresses if any compared metric grew past tolerance.
+
+    p99 is noisy over a couple of hundred calls, so it gets twice the tolerance,
+    and slowdowns smaller than min_delta_ms are ignored (scheduler noise on
+    sub-millisecond stages).
+    """
+    out = {}
+    for name, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or "p50_ms" not in cur or "p50_ms" not in base:
+            continue
+        ratios = {m: cur[m] / base[m] for m in COMPARED if base.get(m)}
+        limits = {m: 1.0 + (2 * tolerance if m == "p99_ms" else tolerance) for m in ratios}
+        worse = [m for m, r in ratios.items() if r > limits[m] and cur[m] - base[m] > min_delta_ms]
+        out[name] = {"ratios": ratios, "regressed": worse}
+    return out
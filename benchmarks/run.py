@@ -0,0 +1,90 @@
+# run.py
+# Pipeline benchmark suite. Run from the repository root:
+#   python3 -m benchmarks.run --out bench.json
+#   python3 -m benchmarks.run --baseline bench.json     # exits 1 if a stage regressed
+# Uses the bundled test images, the synthetic camera and synthetic Enviro+ readings,
+# and the mock detector unless --backend says otherwise, so it runs on any laptop.
+
+import argparse
+import fnmatch
+import sys
+
+import config
+from benchmarks import harness
+from benchmarks.stages import STAGES, Fixtures
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the camera and air quality hot paths")
+    parser.add_argument("--out", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against an earlier --out file")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown vs the baseline, as a fraction (default 0.15)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="time cap per stage")
+    parser.add_argument("--backend", default="mock", help="inference backend for the inference stage")
+    parser.add_argument("--only", metavar="GLOB", action="append",
+                        help="run only matching stages (repeatable), e.g. --only 'aruco*'")
+    return parser.parse_args(argv)
+
+
+def print_table(stages: dict, comparison: dict) -> None:
+    print(f"{'stage':30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fps':>9} {'rss MB':>8}  vs baseline")
+    for name, r in stages.items():
+        if "skipped" in r:
+            print(f"{name:30} skipped: {r['skipped']}")
+            continue
+        if "error" in r:
+            print(f"{name:30} ERROR: {r['error']}")
+            continue
+        cmp = comparison.get(name)
+        note = ""
+        if cmp:
+            note = f"p50 x{cmp['ratios'].get('p50_ms', 0):.2f}"
+            if cmp["regressed"]:
+                note += "  REGRESSED (" + ", ".join(cmp["regressed"]) + ")"
+        rss = r["peak_rss_mb"]
+        print(f"{name:30} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+              f"{r['fps'] or 0:9.1f} {rss if rss is not None else float('nan'):8.1f}  {note}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config.SHOW_WINDOW = False
+    config.ARUCO_STATE_PATH = ""  # don't persist a dictionary lock learnt from the test images
+    fx = Fixtures(backend=args.backend)
+    stages = {}
+    try:
+        for name, factory in STAGES.items():
+            if args.only and not any(fnmatch.fnmatch(name, pat) for pat in args.only):
+                continue
+            try:
+                fn, before = factory(fx)
+                stages[name] = harness.run_stage(fn, args.iterations, args.warmup, before, args.max_seconds)
+            except harness.Skip as e:
+                stages[name] = {"skipped": str(e)}
+            except Exception as e:
+                stages[name] = {"error": f"{e.__class__.__name__}: {e}"}
+    finally:
+        fx.close()
+
+    report = {"environment": harness.environment(), "backend": args.backend,
+              "iterations": args.iterations, "stages": stages}
+    comparison = {}
+    if args.baseline:
+        comparison = harness.compare(report, harness.load(args.baseline), args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "stages": comparison}
+    print_table(stages, comparison)
+    if args.out:
+        harness.save(args.out, report)
+
+    failed = [n for n, r in stages.items() if "error" in r]
+    regressed = [n for n, c in comparison.items() if c["regressed"]]
+    if regressed:
+        print("regressed: " + ", ".join(regressed), file=sys.stderr)
+    return 1 if failed or regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# stages.py
+# The hot paths being benchmarked. Each stage's factory does its (untimed) setup
+# and returns the function to time, plus an optional untimed per-call preparation.
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+from benchmarks.harness import Skip
+from Hardware.camera import SyntheticCamera
+from Hardware.enviro import SyntheticEnviro
+from ImageProcessing.capture import detection_size
+from ImageProcessing.inference import MockBackend
+
+MARKER_IMAGE = "ImageProcessing/singlemarkersoriginal.jpg"
+GAUGE_IMAGE = "YOLOV5 testing/guage.jpg"
+
+StageFn = Tuple[Callable[[], object], Optional[Callable[[], None]]]
+STAGES: "OrderedDict[str, Callable[[Fixtures], StageFn]]" = OrderedDict()
+
+
+def stage(name: str):
+    def register(factory):
+        STAGES[name] = factory
+        return factory
+    return register
+
+
+def _read(path: str) -> np.ndarray:
+    img = cv2.imread(path)
+    if img is None:
+        raise Skip(f"can't read {path}")
+    return img
+
+
+# Detections a gauge frame would produce, in the coordinates of a 720p synthetic frame
+def gauge_detections(frame: np.ndarray) -> list:
+    h, w = frame.shape[:2]
+    cx, cy, r = w // 3, h // 2, min(w, h) // 5
+    return [
+        {"name": "gauge", "cls_id": 0, "conf": 0.97, "bbox": [cx - r, cy - r, cx + r, cy + r]},
+        {"name": "gauge_centre", "cls_id": 1, "conf": 0.96, "bbox": [cx - 10, cy - 10, cx + 10, cy + 10]},
+        {"name": "needle_tip", "cls_id": 2, "conf": 0.95, "bbox": [cx + r // 2 - 8, cy - 8, cx + r // 2 + 8, cy + 8]},
+        {"name": "marker", "cls_id": 3, "conf": 0.95,
+         "bbox": [2 * w // 3 - 10, h // 2 - r // 2 - 10, 2 * w // 3 + r + 10, h // 2 + r // 2 + 10]},
+    ]
+
+
+class Fixtures:
+    """Inputs shared between stages, built on first use."""
+
+    def __init__(self, backend: str = "mock"):
+        self.backend = backend
+        self._cam = None
+        self._frame = None
+
+    @property
+    def frame(self) -> np.ndarray:
+        # One 720p frame from the synthetic camera: gauge plus ArUco marker
+        if self._frame is None:
+            ok, self._frame = SyntheticCamera(fps=0).read()
+        return self._frame
+
+    @property
+    def marker_image(self) -> np.ndarray:
+        return _read(MARKER_IMAGE)
+
+    @property
+    def gauge_image(self) -> np.ndarray:
+        return _read(GAUGE_IMAGE)
+
+    @property
+    def cam(self):
+        if self._cam is None:
+            from ImageProcessing.cameraTask import CameraTask
+            self._cam = CameraTask(loop=None, stop_event=asyncio.Event(),
+                                   backend=MockBackend(gauge_detections(self.frame)))
+        return self._cam
+
+    def close(self) -> None:
+        if self._cam is not None:
+            self._cam.shutdown()
+
+
+def _require_tesseract() -> None:
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        raise Skip(f"tesseract not available ({e.__class__.__name__})")
+
+
+@stage("crop_roi")
+def crop_roi(fx: Fixtures) -> StageFn:
+    frame, cam = fx.frame, fx.cam
+    box = gauge_detections(frame)[0]["bbox"]
+    return (lambda: cam._crop_roi(frame, box)), None
+
+
+@stage("encode_jpeg")
+def encode_jpeg(fx: Fixtures) -> StageFn:
+    frame, cam = fx.frame, fx.cam
+    return (lambda: cam._encode_jpeg(frame)), None
+
+
+@stage("mask_text_red")
+def mask_text_red(fx: Fixtures) -> StageFn:
+    img, cam = fx.gauge_image, fx.cam
+    return (lambda: cam.mask_text(img, "red")), None
+
+
+@stage("mask_text_black")
+def mask_text_black(fx: Fixtures) -> StageFn:
+    img, cam = fx.gauge_image, fx.cam
+    return (lambda: cam.mask_text(img, "black")), None
+
+
+@stage("ocr_numbers_from_mask")
+def ocr_numbers(fx: Fixtures) -> StageFn:
+    _require_tesseract()
+    img, cam = fx.gauge_image, fx.cam
+    mask = cam.mask_text(img, "black")
+    return (lambda: cam.ocr_numbers_from_mask(img, mask)), None
+
+
+@stage("gauge_ocr_cached")
+def gauge_ocr_cached(fx: Fixtures) -> StageFn:
+    _require_tesseract()
+    img, cam = fx.gauge_image, fx.cam
+    mask = cam.mask_text(img, "black")
+    cam.gauge_ocr.read(img, mask, gauge_id=1)  # prime the cache
+    return (lambda: cam.gauge_ocr.read(img, mask, gauge_id=1)), None
+
+
+@stage("aruco_full_frame")
+def aruco_full_frame(fx: Fixtures) -> StageFn:
+    img, cam = fx.marker_image, fx.cam
+    return (lambda: cam.aruco.detect(img, None)), None
+
+
+@stage("aruco_roi")
+def aruco_roi(fx: Fixtures) -> StageFn:
+    frame, cam = fx.frame, fx.cam
+    boxes = [d["bbox"] for d in gauge_detections(frame) if d["name"] == "marker"]
+    return (lambda: cam.aruco.detect(frame, boxes)), None
+
+
+@stage("handle_gauge")
+def handle_gauge(fx: Fixtures) -> StageFn:
+    # Tracked frames: no OCR, just the needle geometry and payload (the steady state)
+    frame, cam = fx.frame, fx.cam
+    dets = [dict(d, bbox=np.asarray(d["bbox"], np.float32), roi=cam._crop_roi(frame, d["bbox"]),
+                 track_id=1, tracked=True)
+            for d in gauge_detections(frame) if d["name"] != "marker"]
+    return (lambda: cam.handle_gauge(frame, dets, dets)), None
+
+
+@stage("inference")
+def inference(fx: Fixtures) -> StageFn:
+    frame = fx.frame
+    if fx.backend == "mock":
+        backend = MockBackend(gauge_detections(frame))
+    else:
+        if fx.backend in ("onnx", "ultralytics") and not os.path.exists(config.MODEL_PATH):
+            raise Skip(f"no model at {config.MODEL_PATH}")
+        old, config.INFERENCE_BACKEND = config.INFERENCE_BACKEND, fx.backend
+        try:
+            backend = fx.cam._make_backend()
+        except ImportError as e:
+            raise Skip(str(e))
+        finally:
+            config.INFERENCE_BACKEND = old
+    return (lambda: backend.infer(frame)), None
+
+
+@stage("camera_step")
+def camera_step(fx: Fixtures) -> StageFn:
+    # Whole CameraTask.step on synthetic frames: grab, gate, detect/track, draw, handlers, ring writes
+    from ImageProcessing.cameraTask import CameraTask
+    _require_tesseract()  # handle_gauge reads the scale on full detector passes
+    frame = fx.frame
+    # The detector sees the detection-resolution copy, so the mock boxes are in its coordinates
+    small = cv2.resize(frame, detection_size(frame.shape, config.DETECT_WIDTH))
+    cam = CameraTask(loop=None, stop_event=asyncio.Event(), backend=MockBackend(gauge_detections(small)),
+                     camera=SyntheticCamera(fps=0), lossless=True)
+    cam.gate = None  # every synthetic frame moves a little; measure the full path
+    fx_close = fx.close
+
+    def close():
+        cam.shutdown()
+        fx_close()
+    fx.close = close
+    return cam.step, None
+
+
+@stage("air_quality_get_sensor_data")
+def air_quality(fx: Fixtures) -> StageFn:
+    try:
+        from Air_Quality.air_quality import AirQualityTask
+    except ImportError as e:
+        raise Skip(str(e))
+    aq = AirQualityTask(loop=None, stop_event=asyncio.Event(), devices=SyntheticEnviro())
+    aq.sampler.stop()  # fed by hand below so every call aggregates the same number of samples
+    per_publish = int(config.AQ_SAMPLE_HZ * 2)
+    for _ in range(int(config.AQ_SAMPLE_HZ * config.AQ_BUFFER_SECONDS)):
+        aq.sampler.sample_once()
+
+    def fill():
+        for _ in range(per_publish):
+            aq.sampler.sample_once()
+    return aq.get_sensor_data, fill
@@ -0,0 +1,152 @@
+# config.py
+# Runtime settings for the drone payload.
+# Every value can be overridden with an environment variable of the same name
+# prefixed with EGH455_, e.g. EGH455_INFERENCE_BACKEND=mock python3 main.py
+
+import os
+
+
+def _env(name: str, default, cast=None):
+    raw = os.environ.get("EGH455_" + name)
+    if raw is None:
+        return default
+    cast = cast or type(default)
+    if cast is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if cast is tuple:
+        return tuple(int(v) for v in raw.split(","))
+    return cast(raw)
+
+
+# ===================== Hardware ===================== #
+HAL_MODE = _env("HAL_MODE", "real")                    # "real", "synthetic" or "replay" (see Hardware/hal.py)
+HAL_RECORD_PATH = _env("HAL_RECORD_PATH", "")          # when set, record camera frames and sensor readings here
+HAL_REPLAY_PATH = _env("HAL_REPLAY_PATH", "")          # recording to play back in replay mode
+HAL_REPLAY_SPEED = _env("HAL_REPLAY_SPEED", 1.0)       # 1.0 = recorded speed, 0 = as fast as possible
+HAL_SYNTHETIC_FPS = _env("HAL_SYNTHETIC_FPS", 30.0)    # frame rate of the synthetic camera
+HAL_SYNTHETIC_CAMERAS = _env("HAL_SYNTHETIC_CAMERAS", 1)  # synthetic cameras to run side by side
+CAMERA_INDEX = _env("CAMERA_INDEX", 23)                # on bottom USB3 port, 23-26, 31-34 were identifiable
+CAMERA_INDICES = _env("CAMERA_INDICES", (CAMERA_INDEX,))  # capture devices to open, e.g. 23,31; each gets its own pipeline
+CAMERA_DISCOVER = _env("CAMERA_DISCOVER", False)       # probe CAMERA_CANDIDATES instead and open those that deliver frames
+CAMERA_CANDIDATES = _env("CAMERA_CANDIDATES", (23, 24, 25, 26, 31, 32, 33, 34))
+CAMERA_MAX = _env("CAMERA_MAX", 2)                     # stop discovering after this many cameras
+CAMERA_NAMES = {23: "forward", 31: "down"}             # camera_id in payloads; other devices are "cam<index>"
+CAMERA_WIDTH = _env("CAMERA_WIDTH", 1280)              # capture resolution asked of the driver (0 = its default)
+CAMERA_HEIGHT = _env("CAMERA_HEIGHT", 720)
+CAMERA_FOURCC = _env("CAMERA_FOURCC", "MJPG")          # compressed capture; raw YUYV caps USB cameras at low fps
+CAMERA_FPS = _env("CAMERA_FPS", 0.0)                   # 0 = driver default
+SHOW_WINDOW = _env("SHOW_WINDOW", True)                # OpenCV preview window; disable for headless runs
+
+# ===================== Scheduling ===================== #
+CAMERA_INTERVAL = _env("CAMERA_INTERVAL", 0.2)         # camera step deadline period (5 Hz)
+CAMERA_OVERRUN_POLICY = _env("CAMERA_OVERRUN_POLICY", "coalesce")  # "skip", "catch_up" or "coalesce" (scheduler.py)
+AQ_INTERVAL = _env("AQ_INTERVAL", 2.0)                 # air quality publish period (0.5 Hz)
+AQ_OVERRUN_POLICY = _env("AQ_OVERRUN_POLICY", "skip")
+AQ_MAX_INTERVAL = _env("AQ_MAX_INTERVAL", 6.0)         # slowest the sensors are throttled to while the camera is saturated
+SCHED_ADAPT_INTERVAL = _env("SCHED_ADAPT_INTERVAL", 5.0)  # how often rates are re-balanced; 0 disables adaptation
+SCHED_HIGH_LOAD = _env("SCHED_HIGH_LOAD", 0.9)         # step time / interval above which a task counts as saturated
+SCHED_LOW_LOAD = _env("SCHED_LOW_LOAD", 0.6)           # ... and below which throttled tasks are sped back up
+
+# ===================== Results bus ===================== #
+# Delivery policy per topic (results_bus.py): "conflate" keeps only the newest message,
+# "fifo" a bounded queue dropping the oldest, "lossless" never drops
+BUS_TOPICS = {
+    "camera": {"policy": "conflate", "key": "camera_id"},   # newest payload per camera
+    "air_quality": {"policy": "fifo", "maxsize": 32},
+    "events": {"policy": "lossless"},
+}
+
+# ===================== Frame buffer ===================== #
+FRAME_RING_SLOTS = _env("FRAME_RING_SLOTS", 16)               # ~1.6 s of history at 5 fps (two refs per camera step)
+FRAME_MAX_SHAPE = _env("FRAME_MAX_SHAPE", (CAMERA_HEIGHT or 720, CAMERA_WIDTH or 1280, 3))  # largest frame the camera may hand us
+
+# ===================== Inference ===================== #
+# Backend: "onnx" (onnxruntime, CPU), "ultralytics", "roboflow" (HTTP) or "mock"
+INFERENCE_BACKEND = _env("INFERENCE_BACKEND", "onnx")
+MODEL_PATH = _env("MODEL_PATH", "models/gauge-video-frames.onnx")
+MODEL_IMGSZ = _env("MODEL_IMGSZ", 640)
+DETECT_WIDTH = _env("DETECT_WIDTH", MODEL_IMGSZ)  # detector/tracker/gate run on a copy this wide; crops stay full-res (0 = off)
+MODEL_HALF = _env("MODEL_HALF", False)          # fp16 inference where the backend supports it
+INFERENCE_THREADS = _env("INFERENCE_THREADS", 2)
+INFERENCE_SLOTS = _env("INFERENCE_SLOTS", 1)    # cameras that may run the shared detector at once
+CONF_THRESHOLD = _env("CONF_THRESHOLD", 0.9)
+IOU_THRESHOLD = _env("IOU_THRESHOLD", 0.45)
+
+ROBOFLOW_API_URL = _env("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
+ROBOFLOW_API_KEY = _env("ROBOFLOW_API_KEY", "tD2CNvbXmeLSQZ5QGdup")
+ROBOFLOW_MODEL_ID = _env("ROBOFLOW_MODEL_ID", "gauge-video-frames-mocuo/2")
+
+# ===================== Vision executor ===================== #
+# Where the heavy per-detection stages run (ImageProcessing/executor.py): "inline" on the
+# camera thread, "thread" on a thread pool or "process" on a pool of worker processes that
+# read frames straight from the shared frame ring
+VISION_STAGES = {
+    "gauge_prepare": "process",   # black-text mask, numeral candidates and hashes for the OCR
+    "aruco_search": "process",    # ArUco detection inside the marker boxes
+}
+VISION_WORKERS = _env("VISION_WORKERS", 2)                 # pool size; the detector already uses INFERENCE_THREADS cores
+VISION_START_METHOD = _env("VISION_START_METHOD", "forkserver")
+VISION_MAX_PENDING = _env("VISION_MAX_PENDING", 2)         # frames whose stages may still be running during the next step
+
+# ===================== ArUco ===================== #
+ARUCO_LOCK_AFTER = _env("ARUCO_LOCK_AFTER", 5)         # consistent hits before a dictionary is locked in
+ARUCO_STATE_PATH = _env("ARUCO_STATE_PATH", "ImageProcessing/aruco_state.json")
+ARUCO_ROI_PAD = _env("ARUCO_ROI_PAD", 0.25)            # padding around the YOLO box, as a fraction of its size
+ARUCO_MIN_ROI = _env("ARUCO_MIN_ROI", 120)             # crops smaller than this (px) are upscaled
+
+# ===================== Tracking ===================== #
+TRACK_DETECT_EVERY = _env("TRACK_DETECT_EVERY", 5)     # full detector pass every N frames
+TRACK_LOW_CONF = _env("TRACK_LOW_CONF", 0.92)          # re-detect early when a box's confidence falls below this
+NEEDLE_SMOOTHING = _env("NEEDLE_SMOOTHING", 0.4)       # EMA weight of the newest needle angle
+
+# ===================== Motion gate ===================== #
+MOTION_GATE = _env("MOTION_GATE", True)                # skip inference on frames that haven't changed
+MOTION_GATE_METHOD = _env("MOTION_GATE_METHOD", "diff")  # "diff" (mean abs difference) or "ssim"
+MOTION_GATE_THRESHOLD = _env("MOTION_GATE_THRESHOLD", 3.0)  # grey levels for "diff", similarity (e.g. 0.97) for "ssim"
+MOTION_GATE_MAX_SKIP = _env("MOTION_GATE_MAX_SKIP", 25)  # always infer after this many skipped frames
+
+# ===================== Events ===================== #
+EVENT_CONFIRM = _env("EVENT_CONFIRM", 3)        # frames a new valve position / trigger state must hold before it's reported
+EVENT_PSI_BAND = _env("EVENT_PSI_BAND", 50.0)   # gauge reading is reported again once it moves this many psi
+EVENT_HISTORY = _env("EVENT_HISTORY", 100)      # recent events the app keeps in memory
+EVENT_KEYFRAME_QUALITY = _env("EVENT_KEYFRAME_QUALITY", 95)  # JPEG quality of the frame attached to each event
+
+# ===================== Air quality ===================== #
+AQ_SAMPLE_HZ = _env("AQ_SAMPLE_HZ", 10.0)              # sensor read rate; results are still published every 2 s
+AQ_BUFFER_SECONDS = _env("AQ_BUFFER_SECONDS", 60.0)    # history kept in each channel's ring buffer
+AQ_CPU_TEMP_WINDOW_S = _env("AQ_CPU_TEMP_WINDOW_S", 10.0)  # rolling CPU temperature window for compensation
+AQ_CALIBRATION_PATH = _env("AQ_CALIBRATION_PATH", "Air_Quality/calibration.json")  # per-board R0 and gas curves
+AQ_GAS_ALARM_PPM = {"red_gas": 50.0, "ox_gas": 5.0, "nh3": 25.0}  # LCD alarm thresholds
+
+# ===================== LCD ===================== #
+LCD_MAX_FPS = _env("LCD_MAX_FPS", 2.0)                 # cap on full-frame SPI pushes to the ST7735
+LCD_LOCK_PATH = _env("LCD_LOCK_PATH", "/tmp/egh455-lcd.lock")  # held by whichever process drives the LCD
+
+# ===================== History ===================== #
+TS_PATH = _env("TS_PATH", "data/timeseries")           # time-series store directory; empty disables it
+TS_SEGMENT_RECORDS = _env("TS_SEGMENT_RECORDS", 65536)  # rows per segment file (1 MiB per column)
+TS_FLUSH_INTERVAL = _env("TS_FLUSH_INTERVAL", 5.0)     # seconds between msyncs; the only disk waits
+
+# ===================== Flight recorder ===================== #
+RECORD_DIR = _env("RECORD_DIR", "data/flight")          # segmented video, snapshots and indexes; empty disables it
+RECORD_FPS = _env("RECORD_FPS", 5.0)                     # recorded frame rate per camera
+RECORD_QUALITY = _env("RECORD_QUALITY", 80)              # JPEG quality of video frames
+RECORD_SEGMENT_SECONDS = _env("RECORD_SEGMENT_SECONDS", 60.0)  # length of one .mjpeg segment
+RECORD_QUEUE = _env("RECORD_QUEUE", 4)                   # frames waiting for the writer; keep well inside the ring's lifetime
+RECORD_DROP_POLICY = _env("RECORD_DROP_POLICY", "oldest")  # frame dropped when the queue is full: "oldest" or "newest"
+RECORD_MAX_BYTES = _env("RECORD_MAX_BYTES", 2 << 30)     # oldest files are deleted beyond this...
+RECORD_MIN_FREE = _env("RECORD_MIN_FREE", 256 << 20)     # ...or when the disk has less free than this
+RECORD_SPACE_CHECK_SECONDS = _env("RECORD_SPACE_CHECK_SECONDS", 10.0)  # how often both are checked while recording
+
+# ===================== Web interface ===================== #
+WEB_HOST = _env("WEB_HOST", "0.0.0.0")                 # async server (Web Interface/server.py) bind address
+WEB_PORT = _env("WEB_PORT", 5000)
+LIVE_MAX_RATE = _env("LIVE_MAX_RATE", 5.0)             # max /stream events per second per client; updates in between are merged
+LIVE_HEARTBEAT = _env("LIVE_HEARTBEAT", 15.0)          # keep-alive comment interval for idle /stream clients
+LIVE_HISTORY = _env("LIVE_HISTORY", 256)               # deltas kept for clients resuming after a reconnect
+VIDEO_MAX_FPS = _env("VIDEO_MAX_FPS", 10.0)            # /video_feed frame rate cap per client
+HISTORY_MAX_POINTS = _env("HISTORY_MAX_POINTS", 2000)  # cap on points per /history response
+HISTORY_CACHE = _env("HISTORY_CACHE", 64)              # downsampled ranges kept for repeat /history requests
+
+# ===================== Metrics ===================== #
+METRICS_LOG_INTERVAL = _env("METRICS_LOG_INTERVAL", 60.0)  # seconds between metric summaries in the log; 0 disables
@@ -0,0 +1,413 @@
+# flight_recorder.py
+# Flight video and event snapshots, written behind the camera pipeline.
+#
+# The recorder's bus subscriber only queues FrameRefs, so nothing it does can
+# hold up capture. A background writer thread copies each frame out of the
+# shared ring (a frame whose slot was reused meanwhile is dropped, never
+# written torn), encodes it and appends it to the camera's current segment:
+# a plain concatenated-JPEG .mjpeg file (ffplay/VLC play it as is) covering
+# segment_seconds. Next to every segment, <segment>.idx.jsonl has one line per
+# frame with its time, byte offset, size and detections, so FlightLog finds
+# any moment with two binary searches and reads it with one seek. While the
+# motion gate holds the picture, the camera republishes the same frame; those
+# repeats aren't encoded again but get an index line ("repeat": true) with the
+# offset of the frame they repeat, so the index stays at the recording rate
+# even though the .mjpeg itself only holds distinct frames. Change
+# events get a line in events.jsonl and their keyframe, which the camera
+# encoded when the event happened, saved as a JPEG snapshot.
+#
+# The write-behind queue is bounded. When the SD card falls behind, frames are
+# dropped (the oldest queued one, or the new one, per drop_policy); snapshots
+# never are. Every space_check_seconds, at each segment rollover and after a
+# failed write, the oldest files are deleted while the recording is over
+# max_bytes or the disk's free space is below min_free.
+
+import bisect
+import collections
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+import cv2
+
+import metrics
+from ImageProcessing.frame_buffer import FrameRef, FrameRing
+
+DROP_POLICIES = ("oldest", "newest")
+EVENTS_FILE = "events.jsonl"
+# Payload fields copied into the frame index
+INDEX_FIELDS = ("names", "gauge_psi", "gauge_theta", "Valve_position", "ArUco_Marker_id")
+
+RECORDER_FRAMES = metrics.REGISTRY.counter("recorder_frames_total", "Recorder frames by outcome")
+RECORDER_WRITE_SECONDS = metrics.REGISTRY.histogram(
+    "recorder_write_seconds", "Copy, encode and write time of one recorded frame or snapshot")
+
+
+class Job(NamedTuple):
+    kind: str            # "frame", "repeat" or "snapshot"
+    t: float             # unix seconds
+    camera_id: str
+    ref: Optional[FrameRef]
+    meta: Dict[str, Any]
+    jpeg: Optional[bytes] = None  # a snapshot's keyframe, already encoded by the camera
+
+
+class WriteBehind:
+    """Bounded hand-off from the event loop to the writer thread; put() never blocks.
+
+    maxsize bounds the queued frames. Snapshots are always accepted and are
+    written first, so an event is never lost to a backlog of video. Only
+    frames are read from the ring, and those can find their slot reused by
+    the time they're written (counted as stale); snapshots carry their bytes.
+    """
+
+    def __init__(self, maxsize: int = 16, drop_policy: str = "oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"unknown drop policy {drop_policy!r}, expected one of {DROP_POLICIES}")
+        self.maxsize = max(1, maxsize)
+        self.drop_policy = drop_policy
+        self._frames: Deque[Job] = collections.deque()
+        self._snapshots: Deque[Job] = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._frames) + len(self._snapshots)
+
+    def put(self, job: Job) -> bool:
+        with self._cond:
+            if self.closed:
+                return False
+            if job.kind == "snapshot":
+                self._snapshots.append(job)
+            else:
+                if len(self._frames) >= self.maxsize:
+                    self.dropped += 1
+                    RECORDER_FRAMES.labels(outcome="dropped").inc()
+                    if self.drop_policy == "newest":
+                        return False
+                    self._frames.popleft()
+                self._frames.append(job)
+            self._cond.notify()
+            return True
+
+    def get(self) -> Optional[Job]:
+        """Next job; None once closed and drained."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frames or self._snapshots or self.closed)
+            if self._snapshots:
+                return self._snapshots.popleft()
+            if self._frames:
+                return self._frames.popleft()
+            return None
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def discard_frames(self) -> int:
+        """Empties the frame queue (snapshots carry their own bytes and stay); returns how many went."""
+        with self._cond:
+            count = len(self._frames)
+            self._frames.clear()
+        RECORDER_FRAMES.labels(outcome="discarded").inc(count)
+        return count
+
+
+class Segment:
+    """One camera's .mjpeg file being written, with its frame index."""
+
+    def __init__(self, root: str, camera_id: str, start: float):
+        self.start = start
+        self.path = os.path.join(root, f"{camera_id}_{int(start * 1000)}.mjpeg")
+        self._video = open(self.path, "wb")
+        self._index = open(self.path + ".idx.jsonl", "w")
+        self.bytes = 0
+        self.frames = 0
+        self.last: Optional[tuple] = None  # (offset, size) of the last frame written
+
+    def _entry(self, t: float, meta: Dict[str, Any], offset: int, size: int, **extra) -> None:
+        self._index.write(json.dumps(dict(meta, t=round(t, 3), offset=offset, size=size, **extra),
+                                     separators=(",", ":"), default=str) + "\n")
+        self._index.flush()
+
+    def append(self, t: float, jpeg: bytes, meta: Dict[str, Any]) -> int:
+        offset = self.bytes
+        self._video.write(jpeg)
+        # Video before index, so FlightLog never finds an entry for bytes not in the file yet
+        self._video.flush()
+        self._entry(t, meta, offset, len(jpeg))
+        self.bytes += len(jpeg)
+        self.frames += 1
+        self.last = (offset, len(jpeg))
+        return offset
+
+    def repeat(self, t: float, meta: Dict[str, Any]) -> None:
+        """Indexes the last frame again at time t, without writing it."""
+        self._entry(t, meta, *self.last, repeat=True)
+
+    def close(self) -> None:
+        self._video.close()
+        self._index.close()
+
+
+class FlightRecorder:
+    """Records camera frames and event snapshots from the results bus into `root`."""
+
+    def __init__(self, frames: FrameRing, root: str, fps: float = 5.0, quality: int = 80,
+                 segment_seconds: float = 60.0, queue_size: int = 16,
+                 drop_policy: str = "oldest", max_bytes: int = 2 << 30, min_free: int = 256 << 20,
+                 space_check_seconds: float = 10.0):
+        self.frames = frames
+        self.root = root
+        self.interval = 1.0 / fps if fps else 0.0
+        self.quality = quality
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes
+        self.min_free = min_free
+        self.space_check_seconds = space_check_seconds
+        os.makedirs(root, exist_ok=True)
+        self.queue = WriteBehind(queue_size, drop_policy)
+        metrics.REGISTRY.gauge_fn("recorder_queue_depth", lambda: len(self.queue),
+                                  "Frames and snapshots waiting for the recorder's writer")
+        # Loop side: last queued time and generation per camera
+        self._last: Dict[str, tuple] = {}
+        # Writer side
+        self._segments: Dict[str, Segment] = {}
+        self._events = open(os.path.join(root, EVENTS_FILE), "a")
+        self._last_jpeg: Dict[str, tuple] = {}  # (generation, jpeg) of the last frame written
+        self.written = 0
+        self.repeated = 0
+        self.stale = 0
+        self.snapshots = 0
+        self.missing = 0
+        self.deleted = 0
+        self._thread = threading.Thread(target=self._run, name="flight-recorder", daemon=True)
+        self._thread.start()
+
+    # ---- producer side (event loop) ---- #
+    def offer_frame(self, camera_id: str, t: float, payload: Dict[str, Any]) -> bool:
+        ref = payload.get("frame")
+        if ref is None:
+            return False
+        last_t, last_gen = self._last.get(camera_id, (0.0, None))
+        if t - last_t < self.interval:
+            return False  # above the recording frame rate
+        self._last[camera_id] = (t, ref.generation)
+        meta = {k: payload[k] for k in INDEX_FIELDS if payload.get(k) is not None}
+        if ref.generation == last_gen:
+            # Motion-gated repeat: the writer indexes the frame it already has
+            return self.queue.put(Job("repeat", t, camera_id, ref, meta))
+        return self.queue.put(Job("frame", t, camera_id, ref, meta))
+
+    def offer_event(self, t: float, event: Dict[str, Any]) -> bool:
+        meta = {k: v for k, v in event.items() if k != "keyframe"}
+        return self.queue.put(Job("snapshot", t, event.get("camera_id") or "camera", None, meta,
+                                  event.get("keyframe")))
+
+    async def run(self, bus) -> None:
+        sub = bus.subscribe(["camera", "events"], name="flight recorder")
+        try:
+            async for msg in sub:
+                if msg.topic == "events":
+                    self.offer_event(msg.time, msg.payload)
+                else:
+                    self.offer_frame(msg.payload.get("camera_id") or "camera", msg.time, msg.payload)
+        finally:
+            sub.close()
+
+    # ---- writer thread ---- #
+    def _encode(self, ref: Optional[FrameRef], quality: int) -> Optional[bytes]:
+        # copy() checks the generation before and after, so a reused slot gives None, not a torn frame
+        img = self.frames.copy(ref)
+        if img is None:
+            return None
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return buf.tobytes() if ok else None
+
+    def _segment(self, camera_id: str, t: float) -> Segment:
+        seg = self._segments.get(camera_id)
+        if seg is not None and t - seg.start < self.segment_seconds:
+            return seg
+        if seg is not None:
+            seg.close()
+            self._rotate()
+        seg = self._segments[camera_id] = Segment(self.root, camera_id, t)
+        return seg
+
+    def _write_frame(self, job: Job) -> None:
+        jpeg = self._encode(job.ref, self.quality)
+        if jpeg is None:
+            self.stale += 1
+            RECORDER_FRAMES.labels(outcome="stale").inc()
+            return
+        self._segment(job.camera_id, job.t).append(job.t, jpeg, job.meta)
+        self._last_jpeg[job.camera_id] = (job.ref.generation, jpeg)
+        self.written += 1
+        RECORDER_FRAMES.labels(outcome="written").inc()
+
+    def _write_repeat(self, job: Job) -> None:
+        generation, jpeg = self._last_jpeg.get(job.camera_id, (None, None))
+        if generation != job.ref.generation:
+            # The frame it repeats was dropped or went stale; the ring may still have it
+            self._write_frame(job)
+            return
+        seg = self._segment(job.camera_id, job.t)
+        if seg.last is None:
+            seg.append(job.t, jpeg, job.meta)  # a new segment starts with the picture, not a reference
+        else:
+            seg.repeat(job.t, job.meta)
+        self.repeated += 1
+        RECORDER_FRAMES.labels(outcome="repeated").inc()
+
+    def _write_snapshot(self, job: Job) -> None:
+        entry = dict(job.meta, t=round(job.t, 3))
+        jpeg = job.jpeg
+        if jpeg is not None:
+            name = f"snap_{job.camera_id}_{int(job.t * 1000)}_{job.meta.get('kind', 'event')}.jpg"
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(jpeg)
+            entry["snapshot"] = name
+            self.snapshots += 1
+            RECORDER_FRAMES.labels(outcome="snapshot").inc()
+        else:
+            self.missing += 1  # the camera couldn't encode the keyframe; the event is still logged
+            RECORDER_FRAMES.labels(outcome="no_keyframe").inc()
+        # Where the video was at the time, for jumping from an event to the footage
+        seg = self._segments.get(job.camera_id)
+        if seg is not None:
+            entry["segment"] = os.path.basename(seg.path)
+        self._events.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._events.flush()
+
+    def _run(self) -> None:
+        # Other writers (the time-series store, logs) fill the card between rollovers too
+        checked = time.monotonic()
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                if job.kind == "frame":
+                    self._write_frame(job)
+                elif job.kind == "repeat":
+                    self._write_repeat(job)
+                else:
+                    self._write_snapshot(job)
+            except OSError as e:
+                logging.error(f"flight recorder: {job.kind} not written: {e}")
+                self._rotate()
+            except Exception as e:
+                # One bad job (e.g. a frame read as the ring was closing) must not stop the recording
+                logging.error(f"flight recorder: {job.kind} failed: {e!r}")
+            RECORDER_WRITE_SECONDS.labels(kind=job.kind).observe(time.perf_counter() - t0)
+            if time.monotonic() - checked >= self.space_check_seconds:
+                checked = time.monotonic()
+                try:
+                    self._rotate()
+                except OSError as e:
+                    logging.error(f"flight recorder: space check failed: {e}")
+        for seg in self._segments.values():
+            seg.close()
+        self._segments = {}
+        self._events.close()
+
+    def _rotate(self) -> None:
+        """Deletes the oldest closed files until under max_bytes and min_free is available."""
+        live = {seg.path for seg in self._segments.values()}
+        # A segment goes together with its index; snapshots go on their own
+        groups = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name == EVENTS_FILE or name.endswith(".idx.jsonl") or not os.path.isfile(path):
+                continue
+            paths = [path, path + ".idx.jsonl"] if name.endswith(".mjpeg") else [path]
+            size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            total += size
+            if path not in live:
+                groups.append((os.path.getmtime(path), paths, size))
+        free = shutil.disk_usage(self.root).free
+        for _, paths, size in sorted(groups):
+            if total <= self.max_bytes and free >= self.min_free:
+                break
+            for p in reversed(paths):  # index first, so a segment is never left without one
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            free += size
+            self.deleted += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Writes out what is queued, then closes the files.
+
+        Call before the frame ring is closed. If the writer hasn't caught up
+        within `timeout`, the frames still queued are discarded so it stops
+        reading the ring; queued snapshots are still written.
+        """
+        self.queue.close()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            count = self.queue.discard_frames()
+            logging.warning(f"flight recorder: writer still busy after {timeout:g} s, "
+                            f"{count} queued frames discarded")
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "repeated": self.repeated, "dropped": self.queue.dropped,
+                "stale": self.stale, "snapshots": self.snapshots, "missing": self.missing,
+                "deleted": self.deleted, "queued": len(self.queue)}
+
+
+class FlightLog:
+    """Reads a recording directory: finds the frame nearest any time without scanning the video."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def segments(self, camera_id: str) -> List[str]:
+        """Segment paths of one camera, oldest first."""
+        prefix = camera_id + "_"
+        names = [n for n in os.listdir(self.root) if n.startswith(prefix) and n.endswith(".mjpeg")]
+        return [os.path.join(self.root, n) for n in sorted(names, key=lambda n: int(n[len(prefix):-6]))]
+
+    def _index(self, path: str) -> List[dict]:
+        with open(path + ".idx.jsonl") as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]  # skip a line cut short
+
+    def seek(self, camera_id: str, t: float) -> Optional[dict]:
+        """Index entry of the last frame at or before t (plus its "path"), or None."""
+        paths = self.segments(camera_id)
+        starts = [int(os.path.basename(p)[len(camera_id) + 1:-6]) / 1000 for p in paths]
+        i = bisect.bisect_right(starts, t) - 1
+        while i >= 0:
+            entries = self._index(paths[i])
+            j = bisect.bisect_right([e["t"] for e in entries], t) - 1
+            if j >= 0:
+                return dict(entries[j], path=paths[i])
+            i -= 1  # t falls before this segment's first frame
+        return None
+
+    def frame(self, camera_id: str, t: float) -> Optional[bytes]:
+        """JPEG bytes of the frame shown at time t."""
+        entry = self.seek(camera_id, t)
+        if entry is None:
+            return None
+        with open(entry["path"], "rb") as f:
+            f.seek(entry["offset"])
+            return f.read(entry["size"])
+
+    def events(self) -> List[dict]:
+        path = os.path.join(self.root, EVENTS_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
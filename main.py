@@ -4,14 +4,26 @@
 # Last Update: 08/10/2025 by Lily Stacey
 
 from __future__ import annotations
+import argparse
 import asyncio
+import collections
 import logging
 import signal
 from typing import Awaitable, Callable, Iterable
 
+import config
+import metrics
+from flight_recorder import FlightRecorder
+
 # ===================== Importing Drone tasks ===================== #
 from Air_Quality.air_quality import AirQualityTask
+from Hardware.hal import MODES as HAL_MODES, Hal, open_hal
+from ImageProcessing.camera_manager import CameraManager
 from ImageProcessing.cameraTask import CameraTask
+from ImageProcessing.frame_buffer import FrameRef, FrameRing
+from results_bus import ResultsBus
+from scheduler import Scheduler
+from timeseries import TimeSeriesRecorder, TimeSeriesStore
 # from Web_interface_task import webInterfaceTask
 
 
@@ -26,86 +38,153 @@ def setup_logging(level: int = logging.INFO) -> None:
 # ===================== Task helpers ===================== #
 AsyncTask = Callable[[], Awaitable[None]]
 
-#A utility function to repeatedly run a function (async or sync) at fixed time intervals,
-async def periodic(name: str, interval: float, step: Callable[[], Awaitable[None]] | Callable[[], None]):
-    logging.info(f"{name} started")
-    try:
-        while True:
-            try:
-                if asyncio.iscoroutinefunction(step):
-                    await step()  # type: ignore[arg-type]
-                else:
-                    # Run blocking/sync work in a thread to avoid blocking the loop
-                    await asyncio.to_thread(step)  # type: ignore[arg-type]
-            except Exception as e:
-                logging.exception(f"{name} error: {e}")
-            await asyncio.sleep(interval)
-    except asyncio.CancelledError:
-        logging.info(f"{name} cancelled")
-        raise
-
 # ===================== Shutdown handling ===================== #
 
 class App:
-    def __init__(self, stop_event: asyncio.Event) -> None:
+    def __init__(self, stop_event: asyncio.Event, hal: Hal | None = None,
+                 services: Iterable[Callable[["App"], Awaitable[None]]] = ()) -> None:
         self.tasks: list[asyncio.Task[None]] = []
+        # Extra long-running coroutines (e.g. the web server), started and cancelled with the tasks
+        self.services = list(services)
         self.stopping = asyncio.Event()
         self.stop_event = stop_event
+        # Camera and sensor backends: real hardware, a recording or synthetic input
+        self.hal = hal
+        # One CameraTask per camera; self.cam is the primary camera's
+        self.cameras: CameraManager | None = None
         self.cam: CameraTask | None = None
         self.aq: AirQualityTask | None = None
-        self._results_q: asyncio.Queue = asyncio.Queue(maxsize=2)
+        self.scheduler = Scheduler(
+            adapt_interval=config.SCHED_ADAPT_INTERVAL,
+            high_load=config.SCHED_HIGH_LOAD,
+            low_load=config.SCHED_LOW_LOAD,
+        )
+        # Per-topic delivery: newest camera payload only, a short FIFO of readings, lossless events
+        self.bus = ResultsBus(config.BUS_TOPICS)
+        # Sensor and detection history on disk (memory-mapped segments with 1 s/10 s/60 s rollups)
+        self.store = TimeSeriesStore(config.TS_PATH, segment_records=config.TS_SEGMENT_RECORDS) \
+            if config.TS_PATH else None
+        # Shared-memory frame slots; camera payloads only carry FrameRefs into this
+        self.frames = FrameRing(slots=config.FRAME_RING_SLOTS, max_shape=config.FRAME_MAX_SHAPE)
+        # Video segments and event snapshots, written by a background thread
+        self.recorder = FlightRecorder(
+            self.frames, config.RECORD_DIR,
+            fps=config.RECORD_FPS,
+            quality=config.RECORD_QUALITY,
+            segment_seconds=config.RECORD_SEGMENT_SECONDS,
+            queue_size=config.RECORD_QUEUE,
+            drop_policy=config.RECORD_DROP_POLICY,
+            max_bytes=config.RECORD_MAX_BYTES,
+            min_free=config.RECORD_MIN_FREE,
+            space_check_seconds=config.RECORD_SPACE_CHECK_SECONDS,
+        ) if config.RECORD_DIR else None
+        self.latest_data = {
+            "camera": None,  # primary camera
+            "cameras": {},  # camera_id -> latest payload, every camera
+            "temp": None,
+            "hum": None,
+            "light": None,
+            "press": None,
+            "red_gas": None,
+            "ox_gas": None,
+            "nh3": None,
+        }
+        # Recent valve/marker/gauge change events, oldest first
+        self.events: collections.deque[dict] = collections.deque(maxlen=config.EVENT_HISTORY)
 
     async def start(self) -> None:
         # Example of register the air quality taks 
         loop = asyncio.get_running_loop()
-        self.cam = CameraTask(
+        self.bus.loop = loop
+        if self.hal is None:
+            self.hal = open_hal()
+        # Replaying as fast as possible: process every frame and don't wait between steps
+        fast = self.hal.fast
+        self.cameras = CameraManager(
             loop=loop,
             stop_event=self.stop_event,
-            results_q=self._results_q,
+            cameras=self.hal.cameras,
+            bus=self.bus,
+            frames=self.frames,
+            lossless=fast,
         )
+        self.cam = self.cameras.primary_task
         self.aq = AirQualityTask(
             loop = loop,
             stop_event=self.stop_event,
-            results_q=self._results_q,
+            bus=self.bus,
+            devices=self.hal.enviro,
         )
-        self.tasks.append(asyncio.create_task(periodic("camera capturing", 0.2, self.cam.step)))
-        self.tasks.append(asyncio.create_task(periodic("air quality reading", 2.0, self.aq.step)))
+        # Fixed-rate deadlines; the camera comes first and the sensors give way when it saturates
+        for camera_id, cam in self.cameras.items():
+            name = "camera capturing" if len(self.cameras) == 1 else f"camera capturing {camera_id}"
+            self.scheduler.add(name, 0 if fast else config.CAMERA_INTERVAL, cam.step,
+                               policy=config.CAMERA_OVERRUN_POLICY, priority=0)
+        self.scheduler.add("air quality reading", config.AQ_INTERVAL, self.aq.step,
+                           policy=config.AQ_OVERRUN_POLICY, priority=1, max_interval=config.AQ_MAX_INTERVAL,
+                           on_interval=self.aq.set_interval)
+        if self.store is not None:
+            self.scheduler.add("timeseries flush", config.TS_FLUSH_INTERVAL, self.store.flush,
+                               policy="skip", priority=2)
+        if config.METRICS_LOG_INTERVAL:
+            self.scheduler.add("metrics summary", config.METRICS_LOG_INTERVAL, self.log_metrics,
+                               policy="skip", priority=2)
+        self.tasks.extend(self.scheduler.start())
         logging.info("tasks started")
 
-   # Inside App class, after starting cam and aq tasks
-self.latest_data = {
-    "camera": None,  
-    "temp": None,
-    "hum": None,
-    "light": None,
-    "press": None,
-    "red_gas": None,
-    "ox_gas": None,
-    "nh3": None,
-}
-
-async def detection_consumer():
-    while not self.stopping.is_set():
-        try:
-            # Wait for new payload from CameraTask or AirQualityTask
-            payload = await asyncio.wait_for(self._results_q.get(), timeout=0.5)
-        except asyncio.TimeoutError:
-            continue
+        # Create and start consumer task
+        self.tasks.append(asyncio.create_task(self.detection_consumer()))
+        logging.info("detection consumer started")
+        if self.store is not None:
+            recorder = TimeSeriesRecorder(self.store, self.bus, primary_camera=self.cameras.primary)
+            self.tasks.append(asyncio.create_task(recorder.run()))
+        if self.recorder is not None:
+            self.tasks.append(asyncio.create_task(self.recorder.run(self.bus)))
+        for service in self.services:
+            self.tasks.append(asyncio.create_task(service(self)))
+
+    async def detection_consumer(self) -> None:
+        sub = self.bus.subscribe(["camera", "air_quality", "events"], name="detection consumer")
         try:
-            # === Camera data ===
-            if "names" in payload:
-                self.latest_data["camera"] = payload  # store latest camera payload
-                logging.info(f"Detected: {payload['names']} (count={payload['count']})")
-            # === Air quality data ===
-            for key in ["temp","hum","light","press","red_gas","ox_gas","nh3"]:
-                if key in payload:
-                    self.latest_data[key] = payload[key]
+            while not self.stopping.is_set():
+                # Wait for new payload from CameraTask or AirQualityTask
+                msg = await sub.get(timeout=0.5)
+                if msg is None:
+                    continue
+                payload = msg.payload
+                # === Camera data ===
+                if msg.topic == "camera":
+                    camera_id = payload.get("camera_id")
+                    self.latest_data["cameras"][camera_id] = payload
+                    if camera_id == self.cameras.primary:
+                        self.latest_data["camera"] = payload  # store latest camera payload
+                # === Scene changes; logged here instead of every frame's detections ===
+                elif msg.topic == "events":
+                    self.events.append(payload)
+                    logging.info(f"Event ({payload.get('camera_id')}): " + ", ".join(
+                        f"{k}={v}" for k, v in payload.items()
+                        if k not in ("camera_id", "timestamp", "keyframe")))
+                # === Air quality data ===
+                else:
+                    for key in ["temp","hum","light","press","red_gas","ox_gas","nh3"]:
+                        if key in payload:
+                            self.latest_data[key] = payload[key]
         finally:
-            self._results_q.task_done()
+            sub.close()
+
+    # Rolling summary of the step/stage latencies and drop counters
+    async def log_metrics(self) -> None:
+        logging.info("metrics:\n" + metrics.REGISTRY.summary())
+
+    # Latest payload from a camera (the primary camera by default), or None before its first frame
+    def camera_payload(self, camera_id: str | None = None) -> dict | None:
+        if camera_id is None:
+            return self.latest_data["camera"]
+        return self.latest_data["cameras"].get(camera_id)
 
-# Create and start consumer task
-self.tasks.append(asyncio.create_task(detection_consumer()))
-logging.info("detection consumer started")
+    # Zero-copy view of a frame published by the camera, or None if its slot was reused
+    def frame(self, ref: FrameRef | None):
+        return self.frames.view(ref)
 
     async def stop(self) -> None:
         if self.stopping.is_set():
@@ -118,18 +197,53 @@ logging.info("detection consumer started")
         # Gather with return_exceptions to ensure all are awaited
         await asyncio.gather(*self.tasks, return_exceptions=True)
         
-             
+        if self.cameras:
+            self.cameras.shutdown()
+        if self.aq:
+            self.aq.shutdown()
+        if self.hal:
+            self.hal.close()
+        if self.store is not None:
+            self.store.flush()
+            self.store.close()
+        if self.recorder is not None:
+            self.recorder.close()  # finishes what is queued; needs the ring, so before it closes
+            logging.info(f"flight recorder: {self.recorder.stats()}")
+        self.frames.close()
         logging.info("all tasks stopped")
 
 # ===================== Main ===================== #
 
-async def amain() -> None:
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="EGH455 drone payload")
+    parser.add_argument("--hal", choices=HAL_MODES, default=None,
+                        help="camera/sensor backends (default: config.HAL_MODE)")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="record camera frames and sensor readings to PATH")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="play back a recording instead of using the hardware (implies --hal replay)")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="replay speed, 1.0 = as recorded (default: config.HAL_REPLAY_SPEED)")
+    parser.add_argument("--fast", action="store_true",
+                        help="replay as fast as possible, processing every frame")
+    parser.add_argument("--headless", action="store_true", help="no OpenCV preview window")
+    return parser.parse_args(argv)
+
+
+async def amain(args: argparse.Namespace | None = None,
+                services: Iterable[Callable[[App], Awaitable[None]]] = ()) -> None:
     setup_logging()
     logging.info("app starting...")
+    args = args or parse_args([])
+    if args.headless:
+        config.SHOW_WINDOW = False
 
     stop_called = asyncio.Event()
 
-    app = App(stop_event=stop_called)
+    mode = "replay" if args.replay else args.hal
+    hal = open_hal(mode, record_path=args.record, replay_path=args.replay,
+                   speed=0.0 if args.fast else args.speed)
+    app = App(stop_event=stop_called, hal=hal, services=services)
     await app.start()
 
     loop = asyncio.get_running_loop()
@@ -151,4 +265,4 @@ async def amain() -> None:
     logging.info("bye")
 
 if __name__ == "__main__":
-    asyncio.run(amain())
+    asyncio.run(amain(parse_args()))
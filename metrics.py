@@ -0,0 +1,228 @@
+# metrics.py
+# Low-overhead runtime metrics: counters, gauges and latency histograms.
+# Recording is a couple of list updates under the GIL, so it is safe to call from
+# the camera/sampler threads on every frame. REGISTRY.render() produces the
+# Prometheus text format served at /metrics; summary() is the rolling log line.
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Seconds; covers 0.5 ms tesseract-cache hits up to multi-second model stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """A value that is set, or read from fn() at scrape time."""
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self.fn = fn
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+
+class Histogram:
+    """Cumulative bucket counts for Prometheus plus a ring of recent samples for percentiles."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS, window: int = 512):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = np.zeros(window)
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.recent[self.count % self.recent.size] = value
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentiles(self, qs=(50, 95, 99)) -> Optional[Dict[int, float]]:
+        n = min(self.count, self.recent.size)
+        if n == 0:
+            return None
+        values = np.percentile(self.recent[:n], qs)
+        return dict(zip(qs, values.tolist()))
+
+    def time(self) -> "Timer":
+        return Timer(self)
+
+
+class Timer:
+    """Context manager that observes the elapsed wall time of its block."""
+
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+class Stopwatch:
+    """Times consecutive stages of one pass with a single clock read per stage.
+
+        sw = Stopwatch(family)
+        ... grab ...
+        sw.lap("grab")
+        ... infer ...
+        sw.lap("infer")
+    """
+
+    __slots__ = ("family", "last")
+
+    def __init__(self, family: "Family"):
+        self.family = family
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.family.labels(stage=stage).observe(now - self.last)
+        self.last = now
+
+
+class Family:
+    """All children of one metric name, keyed by their label values."""
+
+    def __init__(self, name: str, kind: str, help: str, factory: Callable[[], object]):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.factory = factory
+        self.children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = _labels(labels)
+        child = self.children.get(key)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    def remove(self, **labels) -> None:
+        """Forgets one child, e.g. the depth gauge of a subscriber that went away."""
+        with self._lock:
+            self.children.pop(_labels(labels), None)
+
+
+class Registry:
+    def __init__(self):
+        self.families: Dict[str, Family] = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, kind: str, help: str, factory) -> Family:
+        with self._lock:
+            fam = self.families.get(name)
+            if fam is None:
+                fam = self.families[name] = Family(name, kind, help, factory)
+            elif fam.kind != kind:
+                raise ValueError(f"metric {name} already registered as a {fam.kind}")
+            return fam
+
+    def counter(self, name: str, help: str = "") -> Family:
+        return self._family(name, "counter", help, Counter)
+
+    def gauge(self, name: str, help: str = "") -> Family:
+        return self._family(name, "gauge", help, Gauge)
+
+    def gauge_fn(self, name: str, fn: Callable[[], float], help: str = "", **labels) -> Gauge:
+        """A gauge read from fn() whenever metrics are rendered (e.g. a queue's qsize)."""
+        fam = self.gauge(name, help)
+        g = fam.labels(**labels)
+        g.fn = fn
+        return g
+
+    def histogram(self, name: str, help: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS) -> Family:
+        buckets = tuple(buckets)
+        return self._family(name, "histogram", help, lambda: Histogram(buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for fam in list(self.families.values()):
+            if fam.help:
+                lines.append(f"# HELP {fam.name} {fam.help}")
+            lines.append(f"# TYPE {fam.name} {fam.kind}")
+            for labels, child in list(fam.children.items()):
+                if fam.kind == "histogram":
+                    cumulative = 0
+                    for bound, n in zip(child.buckets + (float("inf"),), child.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{fam.name}_bucket{_fmt_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{fam.name}_sum{_fmt_labels(labels)} {child.sum}")
+                    lines.append(f"{fam.name}_count{_fmt_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{fam.name}{_fmt_labels(labels)} {child.value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """One line per histogram child (recent p50/p95/max in ms) plus non-zero counters."""
+        parts = []
+        for fam in list(self.families.values()):
+            for labels, child in list(fam.children.items()):
+                tag = fam.name + ("[" + ",".join(v for _, v in labels) + "]" if labels else "")
+                if fam.kind == "histogram":
+                    p = child.percentiles((50, 95))
+                    if p:
+                        parts.append(f"{tag} p50={p[50] * 1000:.1f}ms p95={p[95] * 1000:.1f}ms "
+                                     f"max={child.max * 1000:.1f}ms n={child.count}")
+                elif fam.kind == "counter" and child.value:
+                    parts.append(f"{tag}={child.value:g}")
+                elif fam.kind == "gauge":
+                    parts.append(f"{tag}={child.value:g}")
+        return "\n".join(parts)
+
+
+REGISTRY = Registry()
+
+# ===================== Shared metric families ===================== #
+TASK_STEP_SECONDS = REGISTRY.histogram("task_step_seconds", "Duration of one periodic task step")
+TASK_OVERRUNS = REGISTRY.counter("task_overruns_total", "Steps that took longer than the task interval")
+TASK_ERRORS = REGISTRY.counter("task_errors_total", "Steps that raised an exception")
+CAMERA_STAGE_SECONDS = REGISTRY.histogram("camera_stage_seconds", "Time spent in each stage of CameraTask.step")
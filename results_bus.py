@@ -0,0 +1,253 @@
+# results_bus.py
+# In-process publish/subscribe bus for task results, replacing the single shared
+# asyncio.Queue. Every topic has its own delivery policy, applied separately to
+# each subscriber so a slow consumer only ever loses its own messages:
+#   conflate  keep only the newest message (camera frames: stale ones are useless);
+#             with a key, the newest message per payload[key] (one per camera)
+#   fifo      bounded queue that drops the oldest message when full
+#   lossless  unbounded queue; nothing is dropped (events)
+# All methods except publish_threadsafe() must be called on the event loop thread.
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+import time
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional
+
+import metrics
+
+POLICIES = ("conflate", "fifo", "lossless")
+
+BUS_PUBLISHED = metrics.REGISTRY.counter("bus_published_total", "Messages published per topic")
+BUS_DELIVERED = metrics.REGISTRY.counter("bus_delivered_total", "Messages handed to a subscriber")
+BUS_DROPPED = metrics.REGISTRY.counter("bus_dropped_total", "Messages a subscriber lost to conflation or a full queue")
+BUS_DEPTH = metrics.REGISTRY.gauge("bus_depth", "Messages waiting for a subscriber")
+BUS_LAG = metrics.REGISTRY.histogram("bus_lag_seconds", "Time from publish to delivery")
+
+
+class Message(NamedTuple):
+    topic: str
+    seq: int          # per-topic sequence number, starting at 1
+    time: float       # time.time() at publish
+    payload: Any
+
+
+class Topic:
+    def __init__(self, name: str, policy: str = "fifo", maxsize: int = 32, key: Optional[str] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown topic policy {policy!r}, expected one of {POLICIES}")
+        if key is not None and policy != "conflate":
+            raise ValueError(f"topic {name!r}: a key only applies to the conflate policy")
+        self.name = name
+        self.policy = policy
+        self.key = key
+        # A keyed topic is bounded by its number of keys instead
+        self.maxsize = 0 if policy == "lossless" or key is not None else (1 if policy == "conflate" else maxsize)
+        self.seq = 0
+        self.last: Optional[Message] = None  # newest message, for late joiners
+        self.last_by_key: Dict[Any, Message] = {}
+        self.subscriptions: List["Subscription"] = []
+        self.published = BUS_PUBLISHED.labels(topic=name)
+
+    def key_of(self, msg: Message) -> Any:
+        return msg.payload.get(self.key) if isinstance(msg.payload, dict) else None
+
+    def newest(self) -> List[Message]:
+        """What a late joiner is given: the last message, or the last one for every key."""
+        if self.key is not None:
+            return sorted(self.last_by_key.values(), key=lambda m: m.seq)
+        return [self.last] if self.last is not None else []
+
+
+class _Channel:
+    """One subscriber's pending messages for one topic."""
+
+    def __init__(self, topic: Topic, subscriber: str):
+        self.topic = topic
+        self.subscriber = subscriber
+        self.pending: Deque[Message] = collections.deque()
+        self.delivered = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.max_lag = 0.0
+        self.delivered_counter = BUS_DELIVERED.labels(topic=topic.name, subscriber=subscriber)
+        self.dropped_counter = BUS_DROPPED.labels(topic=topic.name, subscriber=subscriber)
+        self.lag = BUS_LAG.labels(topic=topic.name, subscriber=subscriber)
+        metrics.REGISTRY.gauge_fn("bus_depth", lambda: len(self.pending), topic=topic.name, subscriber=subscriber)
+
+    def offer(self, msg: Message) -> None:
+        maxsize = self.topic.maxsize
+        if self.topic.key is not None:
+            # Replaces the pending message with the same key, if any
+            key = self.topic.key_of(msg)
+            for i, old in enumerate(self.pending):
+                if self.topic.key_of(old) == key:
+                    del self.pending[i]
+                    self.dropped += 1
+                    self.dropped_counter.inc()
+                    break
+        elif maxsize and len(self.pending) >= maxsize:
+            self.pending.popleft()  # conflate / fifo: the oldest message goes
+            self.dropped += 1
+            self.dropped_counter.inc()
+        self.pending.append(msg)
+        if len(self.pending) > self.max_depth:
+            self.max_depth = len(self.pending)
+
+    def take(self) -> Message:
+        msg = self.pending.popleft()
+        lag = time.time() - msg.time
+        self.lag.observe(lag)
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.delivered += 1
+        self.delivered_counter.inc()
+        return msg
+
+    def close(self) -> None:
+        for family in (BUS_DELIVERED, BUS_DROPPED, BUS_LAG, BUS_DEPTH):
+            family.remove(topic=self.topic.name, subscriber=self.subscriber)
+
+    def stats(self) -> dict:
+        return {"delivered": self.delivered, "dropped": self.dropped, "depth": len(self.pending),
+                "max_depth": self.max_depth, "max_lag": round(self.max_lag, 4)}
+
+
+class Subscription:
+    """A subscriber's view of one or more topics; get() returns messages oldest first across topics."""
+
+    def __init__(self, bus: "ResultsBus", name: str, topics: Iterable[Topic]):
+        self.bus = bus
+        self.name = name
+        self.channels: Dict[str, _Channel] = {t.name: _Channel(t, name) for t in topics}
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def _notify(self) -> None:
+        self._ready.set()
+
+    def get_nowait(self) -> Optional[Message]:
+        best = None
+        for ch in self.channels.values():
+            if ch.pending and (best is None or ch.pending[0].time < best.pending[0].time):
+                best = ch
+        return best.take() if best is not None else None
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Message]:
+        """Next message, or None on timeout or once the subscription is closed."""
+        while not self.closed:
+            msg = self.get_nowait()
+            if msg is not None:
+                return msg
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Message:
+        msg = await self.get()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+    def stats(self) -> Dict[str, dict]:
+        return {topic: ch.stats() for topic, ch in self.channels.items()}
+
+
+class ResultsBus:
+    def __init__(self, topics: Optional[Dict[str, dict]] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.topics: Dict[str, Topic] = {}
+        self.subscriptions: List[Subscription] = []
+        self._anon = itertools.count(1)
+        for name, opts in (topics or {}).items():
+            self.add_topic(name, **opts)
+
+    def add_topic(self, name: str, policy: str = "fifo", maxsize: int = 32, key: Optional[str] = None) -> Topic:
+        topic = self.topics[name] = Topic(name, policy, maxsize, key)
+        return topic
+
+    def _topic(self, name: str) -> Topic:
+        topic = self.topics.get(name)
+        if topic is None:
+            raise KeyError(f"no topic {name!r} on the results bus")
+        return topic
+
+    def subscribe(self, topics: Iterable[str] | str, name: Optional[str] = None,
+                  replay_last: bool = False) -> Subscription:
+        """Subscribes to one or more topics. replay_last delivers each topic's newest message straight away.
+
+        A name already in use by a live subscription gets a numeric suffix (sub.name has the one used).
+        """
+        if isinstance(topics, str):
+            topics = [topics]
+        sub = Subscription(self, self._unique_name(name), [self._topic(t) for t in topics])
+        for ch in sub.channels.values():
+            ch.topic.subscriptions.append(sub)
+            if replay_last and ch.topic.last is not None:
+                for msg in ch.topic.newest():
+                    ch.offer(msg)
+                sub._notify()
+        self.subscriptions.append(sub)
+        return sub
+
+    def _unique_name(self, name: Optional[str]) -> str:
+        # Names label the per-subscriber metrics, so two live subscribers never share one
+        if name is None:
+            return f"subscriber-{next(self._anon)}"
+        taken = {sub.name for sub in self.subscriptions}
+        if name not in taken:
+            return name
+        return next(f"{name}-{n}" for n in itertools.count(2) if f"{name}-{n}" not in taken)
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.closed = True
+        sub._notify()
+        for ch in sub.channels.values():
+            ch.close()
+            if sub in ch.topic.subscriptions:
+                ch.topic.subscriptions.remove(sub)
+        if sub in self.subscriptions:
+            self.subscriptions.remove(sub)
+
+    def publish(self, topic: str, payload: Any) -> Message:
+        t = self._topic(topic)
+        t.seq += 1
+        msg = Message(topic, t.seq, time.time(), payload)
+        t.last = msg
+        if t.key is not None:
+            t.last_by_key[t.key_of(msg)] = msg
+        t.published.inc()
+        for sub in t.subscriptions:
+            sub.channels[topic].offer(msg)
+            sub._notify()
+        return msg
+
+    def publish_threadsafe(self, topic: str, payload: Any) -> None:
+        """publish() from a worker thread; needs the loop the bus lives on (ResultsBus(loop=...) or .loop)."""
+        if self.loop is None:
+            raise RuntimeError("results bus has no event loop to publish onto")
+        self.loop.call_soon_threadsafe(self.publish, topic, payload)
+
+    def latest(self, topic: str, key: Any = None) -> Optional[Message]:
+        """Newest message on a topic; for a keyed topic, optionally the newest with that key."""
+        t = self._topic(topic)
+        return t.last_by_key.get(key) if key is not None else t.last
+
+    def stats(self) -> dict:
+        return {
+            "topics": {name: {"policy": t.policy, "published": t.seq, "subscribers": len(t.subscriptions)}
+                       for name, t in self.topics.items()},
+            "subscribers": {sub.name: sub.stats() for sub in self.subscriptions},
+        }
@@ -0,0 +1,181 @@
+# scheduler.py
+# Fixed-rate task scheduler for App. Each task runs on deadlines
+# start + k * interval rather than sleeping `interval` after every step, so
+# the camera's 5 Hz and the sensors' 0.5 Hz hold regardless of step time.
+#
+# Overrun policies, for a step that finishes after its next deadline:
+#   skip      drop the missed deadlines and stay on the original grid
+#   catch_up  run the missed steps back to back (up to max_backlog), then resume
+#   coalesce  run once immediately and restart the grid from there
+#
+# Lower priority numbers are more important. While a task is saturated (its
+# steps take most of its interval), tasks of lower priority that have a
+# max_interval are slowed down towards it, and sped back up once it recovers.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import metrics
+
+POLICIES = ("skip", "catch_up", "coalesce")
+
+Step = Callable[[], Awaitable[None]] | Callable[[], None]
+
+TASK_LATENESS = metrics.REGISTRY.histogram("task_lateness_seconds", "How late each step started after its deadline")
+TASK_JITTER = metrics.REGISTRY.histogram(
+    "task_jitter_seconds", "Deviation of the time between step starts from the interval")
+TASK_MISSED = metrics.REGISTRY.counter("task_missed_deadlines_total", "Deadlines skipped or coalesced after an overrun")
+TASK_INTERVAL = metrics.REGISTRY.gauge("task_interval_seconds", "Current (possibly adapted) task interval")
+
+
+class ScheduledTask:
+    def __init__(self, name: str, interval: float, step: Step, policy: str = "skip", priority: int = 0,
+                 max_interval: Optional[float] = None, max_backlog: int = 5,
+                 on_interval: Optional[Callable[[float], None]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown overrun policy {policy!r}, expected one of {POLICIES}")
+        self.name = name
+        self.base_interval = interval
+        self.interval = interval
+        self.step = step
+        self.policy = policy
+        self.priority = priority
+        self.max_interval = max_interval
+        self.max_backlog = max_backlog
+        self.on_interval = on_interval  # told the new interval whenever it is adapted
+        self.is_async = asyncio.iscoroutinefunction(step)
+        self.load = 0.0  # EMA of step time / interval
+        self.runs = 0
+        self.missed = 0
+        self._last_start: Optional[float] = None
+        self.step_seconds = metrics.TASK_STEP_SECONDS.labels(task=name)
+        self.overruns = metrics.TASK_OVERRUNS.labels(task=name)
+        self.errors = metrics.TASK_ERRORS.labels(task=name)
+        self.lateness = TASK_LATENESS.labels(task=name)
+        self.jitter = TASK_JITTER.labels(task=name)
+        self.missed_counter = TASK_MISSED.labels(task=name)
+        TASK_INTERVAL.labels(task=name).set(interval)
+
+    def set_interval(self, interval: float) -> None:
+        if interval == self.interval:
+            return
+        logging.info(f"{self.name}: interval {self.interval:.3g}s -> {interval:.3g}s")
+        self.interval = interval
+        TASK_INTERVAL.labels(task=self.name).set(interval)
+        if self.on_interval:
+            self.on_interval(interval)
+
+    async def _call(self) -> None:
+        if self.is_async:
+            await self.step()  # type: ignore[misc]
+        else:
+            # Run blocking/sync work in a thread to avoid blocking the loop
+            await asyncio.to_thread(self.step)  # type: ignore[arg-type]
+
+    # Next deadline after a step that started at `deadline` and finished at `now`
+    def _next_deadline(self, deadline: float, now: float) -> float:
+        if self.interval <= 0:
+            return now  # as fast as possible
+        nxt = deadline + self.interval
+        if now <= nxt:
+            return nxt
+        self.overruns.inc()
+        behind = math.ceil((now - nxt) / self.interval)  # deadlines already in the past
+        if self.policy == "catch_up" and behind <= self.max_backlog:
+            return nxt  # run straight away, and again until back on the grid
+        if self.policy == "coalesce":
+            # The missed deadlines collapse into one step now, then a fresh grid from here
+            missed, nxt = behind - 1, now
+        else:
+            # skip (or a catch_up backlog too deep to be worth replaying): stay on the grid
+            missed, nxt = behind, nxt + behind * self.interval
+        if missed:
+            self.missed += missed
+            self.missed_counter.inc(missed)
+        return nxt
+
+    async def run(self) -> None:
+        logging.info(f"{self.name} started")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        try:
+            while True:
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)  # always yield, even when behind
+
+                start = loop.time()
+                self.lateness.observe(max(0.0, start - deadline))
+                if self._last_start is not None and self.interval > 0:
+                    self.jitter.observe(abs((start - self._last_start) - self.interval))
+                self._last_start = start
+
+                t0 = time.perf_counter()
+                try:
+                    await self._call()
+                except Exception as e:
+                    self.errors.inc()
+                    logging.exception(f"{self.name} error: {e}")
+                elapsed = time.perf_counter() - t0
+                self.step_seconds.observe(elapsed)
+                self.runs += 1
+                if self.interval > 0:
+                    self.load += 0.2 * (elapsed / self.interval - self.load)
+
+                deadline = self._next_deadline(deadline, loop.time())
+        except asyncio.CancelledError:
+            logging.info(f"{self.name} cancelled")
+            raise
+
+
+class Scheduler:
+    def __init__(self, adapt_interval: float = 5.0, high_load: float = 0.9, low_load: float = 0.6,
+                 slow_factor: float = 1.5):
+        self.tasks: Dict[str, ScheduledTask] = {}
+        self.adapt_interval = adapt_interval
+        self.high_load = high_load
+        self.low_load = low_load
+        self.slow_factor = slow_factor
+        self._running: List[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, step: Step, **kwargs) -> ScheduledTask:
+        task = ScheduledTask(name, interval, step, **kwargs)
+        self.tasks[name] = task
+        return task
+
+    def start(self) -> List[asyncio.Task]:
+        """Starts every task, most important first; returns the asyncio tasks to cancel on shutdown."""
+        for t in sorted(self.tasks.values(), key=lambda t: t.priority):
+            self._running.append(asyncio.create_task(t.run(), name=t.name))
+        if self.adapt_interval and any(t.max_interval for t in self.tasks.values()):
+            self._running.append(asyncio.create_task(self._adapt_loop(), name="scheduler adapt"))
+        return self._running
+
+    def adapt(self) -> None:
+        """Slows adaptable tasks while a more important task is saturated, relaxes them after."""
+        for t in self.tasks.values():
+            if not t.max_interval:
+                continue
+            above = [o for o in self.tasks.values() if o.priority < t.priority and o.interval > 0]
+            if any(o.load > self.high_load for o in above):
+                t.set_interval(min(t.max_interval, t.interval * self.slow_factor))
+            elif all(o.load < self.low_load for o in above):
+                t.set_interval(max(t.base_interval, t.interval / self.slow_factor))
+
+    async def _adapt_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.adapt_interval)
+            self.adapt()
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"interval": t.interval, "load": round(t.load, 3), "runs": t.runs, "missed": t.missed}
+            for name, t in self.tasks.items()
+        }
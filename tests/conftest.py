@@ -0,0 +1,19 @@
+# Shared fixtures; the suite runs from the repository root: python -m pytest -q
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "Web Interface"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from ImageProcessing.frame_buffer import FrameRing  # noqa: E402
+
+
+@pytest.fixture
+def ring():
+    frames = FrameRing(slots=4, max_shape=(16, 16, 3))
+    yield frames
+    frames.close()
@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+from ImageProcessing.aruco import ArucoDetectorPool
+
+
+def sheet(marker_id, dictionary=cv2.aruco.DICT_4X4_250):
+    marker = cv2.aruco.generateImageMarker(cv2.aruco.getPredefinedDictionary(dictionary), marker_id, 120)
+    frame = np.full((200, 200), 255, dtype=np.uint8)
+    frame[40:160, 40:160] = marker
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def test_low_ids_lock_the_largest_dictionary_of_the_family(tmp_path):
+    pool = ArucoDetectorPool(lock_after=3, state_path=str(tmp_path / "aruco.json"))
+    for _ in range(3):
+        _, ids, _ = pool.detect(sheet(7))
+        assert ids.flatten().tolist() == [7]
+    assert pool.locked == "DICT_4X4_250"
+    # A marker beyond DICT_4X4_50's range is still found after the lock
+    _, ids, used = pool.detect(sheet(180))
+    assert ids.flatten().tolist() == [180] and used == "DICT_4X4_250"
+
+
+def test_restored_state_is_widened(tmp_path):
+    state = tmp_path / "aruco.json"
+    state.write_text('{"dictionary": "DICT_4X4_50"}')
+    assert ArucoDetectorPool(state_path=str(state)).locked == "DICT_4X4_250"
+
+
+def test_locks_only_after_consistent_hits():
+    pool = ArucoDetectorPool(lock_after=3)
+    pool.detect(sheet(7))
+    pool.detect(sheet(7, cv2.aruco.DICT_5X5_100))
+    pool.detect(sheet(7))
+    assert pool.locked is None
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+
+from Air_Quality.calibration import DEFAULT_CURVES, GasCalibration
+
+
+def test_ppm_at_r0_is_the_curve_intercept():
+    cal = GasCalibration()
+    ppm = cal.to_ppm(DEFAULT_CURVES["oxidising"]["r0"], DEFAULT_CURVES["reducing"]["r0"],
+                     DEFAULT_CURVES["nh3"]["r0"])
+    for ch, value in ppm.items():
+        assert float(value) == pytest.approx(10 ** DEFAULT_CURVES[ch]["intercept"])
+
+
+def test_arrays_match_scalars_and_bad_reads_are_handled():
+    cal = GasCalibration()
+    r = np.array([50000.0, 150000.0, 0.0, -1.0, np.nan])
+    ppm = cal.channel_to_ppm("reducing", r)
+    assert ppm[:2] == pytest.approx([float(cal.channel_to_ppm("reducing", v)) for v in r[:2]])
+    assert ppm[2] == ppm[3] == 0.0
+    assert np.isnan(ppm[4])
+
+
+def test_temperature_correction_divides_resistance():
+    cal = GasCalibration(correction={"nh3": {"temp_coeff": 0.01, "ref_temp": 20.0}})
+    assert float(cal.corrected("nh3", 1100.0, temp=30.0)) == pytest.approx(1000.0)
+    assert float(cal.corrected("nh3", 1100.0)) == 1100.0
+
+
+def test_load_picks_the_board_then_default_and_save_round_trips(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({
+        "default": {"curves": {"nh3": {"r0": 1.0}}},
+        "boards": {"pi-1": {"curves": {"nh3": {"r0": 2.0}}}},
+    }))
+    assert GasCalibration.load(str(path), board="pi-1").r0("nh3") == 2.0
+    other = GasCalibration.load(str(path), board="pi-2")
+    assert other.r0("nh3") == 1.0 and other.r0("reducing") == DEFAULT_CURVES["reducing"]["r0"]
+    other.curves["nh3"]["r0"] = 3.0
+    other.save()
+    assert GasCalibration.load(str(path), board="pi-2").r0("nh3") == 3.0
+    assert GasCalibration.load(str(path), board="pi-1").r0("nh3") == 2.0
+    assert GasCalibration.load(str(tmp_path / "missing.json"), board="x").r0("nh3") == DEFAULT_CURVES["nh3"]["r0"]
+
+
+def test_baseline_moves_r0_towards_clean_air():
+    cal = GasCalibration(baseline={"enabled": True, "alpha": 0.5, "min_samples": 10})
+    r0 = cal.r0("reducing")
+    assert cal.learn_baseline("reducing", np.full(5, 2 * r0)) is None  # too few samples
+    assert cal.learn_baseline("reducing", np.full(20, 2 * r0)) == pytest.approx(1.5 * r0)
@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+from ImageProcessing.capture import LatestFrame, detection_size
+
+
+def grab(holder, value, shape=(4, 6, 3)):
+    idx, _ = holder.write_buffer()
+    frame = np.full(shape, value, dtype=np.uint8)
+    holder.shrink(idx, frame)
+    holder.publish(idx, frame)
+
+
+def test_take_returns_the_newest_and_counts_drops():
+    holder = LatestFrame()
+    for i in range(3):
+        grab(holder, i)
+    frame, seq, _ = holder.take(timeout=0)
+    assert (frame == 2).all() and seq == 3
+    assert holder.stats()["dropped"] == 2
+
+
+def test_take_times_out_without_a_new_frame():
+    holder = LatestFrame()
+    grab(holder, 1)
+    holder.take(timeout=0)
+    assert holder.take(timeout=0.01)[0] is None
+
+
+def test_grabber_never_writes_the_frame_being_read():
+    holder = LatestFrame()
+    grab(holder, 1)
+    frame, _, _ = holder.take(timeout=0)
+    for i in range(5):
+        grab(holder, 10 + i)
+    assert (frame == 1).all()
+
+
+def test_lossless_waits_for_the_consumer():
+    holder = LatestFrame(lossless=True)
+    grab(holder, 1)
+    second = threading.Thread(target=grab, args=(holder, 2))
+    second.start()
+    second.join(0.05)
+    assert second.is_alive()  # blocked until the first frame is taken
+    assert (holder.take(timeout=1)[0] == 1).all()
+    second.join(1)
+    assert (holder.take(timeout=1)[0] == 2).all()
+    assert holder.stats()["dropped"] == 0
+
+
+def test_detection_copy_and_scale():
+    holder = LatestFrame(detect_width=160)
+    grab(holder, 7, shape=(480, 640, 3))
+    holder.take(timeout=0)
+    small, scale = holder.detection_frame()
+    assert small.shape == (120, 160, 3) and scale == 4.0
+    assert detection_size((480, 640), 0) == (640, 480)
+    assert detection_size((480, 640), 1280) == (640, 480)
+
+
+def test_close_wakes_a_waiting_consumer():
+    holder = LatestFrame()
+    threading.Timer(0.05, holder.close).start()
+    assert holder.take(timeout=2)[0] is None and holder.closed
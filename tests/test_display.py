@@ -0,0 +1,21 @@
+from Air_Quality.display import DisplayLock, LcdCompositor, default_layout
+from Hardware.enviro import NullDisplay
+
+
+def test_display_lock_excludes_a_second_holder(tmp_path):
+    path = str(tmp_path / "lcd.lock")
+    app, screen = DisplayLock(path), DisplayLock(path)
+    assert app.acquire()
+    assert not screen.acquire(blocking=False)
+    app.release()
+    assert screen.acquire(blocking=False)
+    screen.release()
+
+
+def test_default_layout_draws_with_the_built_in_font():
+    disp = NullDisplay()
+    lcd = LcdCompositor(disp)
+    default_layout(lcd, None)  # no fonts package on this board
+    lcd.set("ip", "10.0.0.2")
+    assert lcd.render(force=True)
+    assert disp.image.size == (160, 80) and disp.image.getpixel((0, 45)) == (255, 0, 0)
@@ -0,0 +1,37 @@
+from ImageProcessing.events import Debounced, EventDetector, Hysteresis
+
+
+def test_debounced_needs_confirm_consecutive_frames():
+    d = Debounced(confirm=3)
+    assert [d.update("open") for _ in range(3)] == [False, False, True]
+    assert d.state == "open"
+
+
+def test_debounced_ignores_flicker():
+    d = Debounced(confirm=2)
+    d.update("open"), d.update("open")
+    # One frame of "closed" between "open"s never confirms
+    assert [d.update(v) for v in ("closed", "open", "closed", "open")] == [False] * 4
+    assert d.state == "open"
+
+
+def test_hysteresis_reports_moves_beyond_the_band():
+    h = Hysteresis(band=50.0)
+    assert h.update(100.0)
+    assert not h.update(149.0)
+    assert h.update(151.0)
+    assert not h.update(110.0)
+    assert h.value == 151.0
+
+
+def test_detector_reports_changes_only():
+    det = EventDetector("front", confirm=2, psi_band=10.0)
+    payloads = [{"timestamp": i, "Valve_position": "open", "ArUco_Marker_id": [3], "gauge_psi": 100.0,
+                 "frame": object(), "annotated": object()}
+                for i in range(4)]
+    events = [e for p in payloads for e in det.update(p)]
+    assert [e["kind"] for e in events] == ["marker", "gauge", "valve"]
+    assert all(e["camera_id"] == "front" for e in events)
+    assert not any("frame" in e or "annotated" in e for e in events)  # no ring refs; they expire
+    assert det.update(dict(payloads[0], gauge_psi=120.0, reused=True)) == []
+    assert [e["kind"] for e in det.update(dict(payloads[0], gauge_psi=120.0))] == ["gauge"]
@@ -0,0 +1,58 @@
+from concurrent.futures import Future
+
+import numpy as np
+
+from ImageProcessing.executor import OrderedPipeline, StageExecutor, StaleFrame
+
+
+def future(result=None, exc=None, done=True):
+    fut = Future()
+    if done:
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+    return fut
+
+
+def test_finishes_in_add_order_once_ready():
+    pipeline, finished = OrderedPipeline(), []
+    first = future(done=False)
+    pipeline.add(lambda r: finished.append(("a", r)), {"stage": first})
+    pipeline.add(lambda r: finished.append(("b", r)), {"stage": future(2)})
+    # The second frame is ready, but may not overtake the first
+    assert pipeline.drain() == 0 and finished == []
+    first.set_result(1)
+    assert pipeline.drain() == 2
+    assert finished == [("a", {"stage": 1}), ("b", {"stage": 2})]
+    assert len(pipeline) == 0
+
+
+def test_failed_stage_hands_its_exception_to_finish():
+    pipeline, finished = OrderedPipeline(), []
+    error = ValueError("boom")
+    pipeline.add(finished.append, {"ok": future(1), "bad": future(exc=error)})
+    pipeline.drain()
+    assert finished == [{"ok": 1, "bad": error}]
+
+
+def test_drain_keep_leaves_the_newest():
+    pipeline, finished = OrderedPipeline(), []
+    for i in range(3):
+        pipeline.add(lambda r, i=i: finished.append(i))
+    assert pipeline.drain(block=True, keep=1) == 2
+    assert finished == [0, 1] and len(pipeline) == 1
+
+
+def test_stage_on_a_reused_slot_is_stale(ring):
+    executor = StageExecutor(ring, {"aruco_search": "inline"})
+    try:
+        ref = ring.write(np.zeros((16, 16, 3), dtype=np.uint8))
+        for _ in range(ring.slots):
+            ring.write(np.zeros((16, 16, 3), dtype=np.uint8))
+        pipeline, finished = OrderedPipeline(), []
+        pipeline.add(finished.append, {"aruco_search": executor.submit("aruco_search", ref, [], [])})
+        pipeline.drain()
+        assert isinstance(finished[0]["aruco_search"], StaleFrame)
+    finally:
+        executor.close()
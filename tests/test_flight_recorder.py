@@ -0,0 +1,116 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from flight_recorder import FlightLog, FlightRecorder, Job, WriteBehind
+
+
+@pytest.fixture
+def recorder(ring, tmp_path):
+    rec = FlightRecorder(ring, str(tmp_path), fps=0, segment_seconds=10.0)
+    yield rec
+    rec.close()
+
+
+def wait_written(rec, count):
+    deadline = time.monotonic() + 5
+    while rec.written < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def shade(jpeg):
+    return int(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).mean())
+
+
+def test_seek_finds_the_last_frame_at_or_before_a_time(recorder, ring, tmp_path):
+    for t, value in ((100.0, 10), (101.0, 120), (102.0, 240)):
+        recorder.offer_frame("cam", t, {"frame": ring.write(np.full((16, 16, 3), value, np.uint8)),
+                                        "gauge_psi": value})
+    recorder.close()
+    log = FlightLog(str(tmp_path))
+    assert log.seek("cam", 99.0) is None
+    entry = log.seek("cam", 101.5)
+    assert entry["t"] == 101.0 and entry["gauge_psi"] == 120
+    assert abs(shade(log.frame("cam", 101.5)) - 120) < 5
+    assert abs(shade(log.frame("cam", 500.0)) - 240) < 5
+
+
+def test_index_offsets_point_into_the_video(recorder, ring, tmp_path):
+    for i in range(3):
+        recorder.offer_frame("cam", 100.0 + i, {"frame": ring.write(np.full((16, 16, 3), 50, np.uint8))})
+    recorder.close()
+    log = FlightLog(str(tmp_path))
+    [path] = log.segments("cam")
+    entries = log._index(path)
+    assert [e["offset"] for e in entries] == [0, entries[0]["size"], entries[0]["size"] + entries[1]["size"]]
+    assert os.path.getsize(path) == sum(e["size"] for e in entries)
+
+
+def test_seek_falls_back_to_the_previous_segment(recorder, ring, tmp_path):
+    recorder.offer_frame("cam", 100.0, {"frame": ring.write(np.full((16, 16, 3), 30, np.uint8))})
+    recorder.offer_frame("cam", 115.0, {"frame": ring.write(np.full((16, 16, 3), 200, np.uint8))})
+    recorder.close()
+    log = FlightLog(str(tmp_path))
+    assert len(log.segments("cam")) == 2
+    assert log.seek("cam", 112.0)["t"] == 100.0
+    assert log.seek("cam", 115.0)["t"] == 115.0
+
+
+def test_a_stale_frame_is_not_written(recorder, ring, tmp_path):
+    recorder.queue.put(Job("frame", 100.0, "cam", ring.write(np.zeros((16, 16, 3), np.uint8))._replace(generation=-1), {}))
+    recorder.close()
+    assert recorder.stats()["stale"] == 1 and recorder.written == 0
+
+
+def test_events_keep_their_keyframe_and_segment(recorder, ring, tmp_path):
+    recorder.offer_frame("cam", 100.0, {"frame": ring.write(np.zeros((16, 16, 3), np.uint8))})
+    wait_written(recorder, 1)  # snapshots jump the queue; the event should find the segment open
+    ok, buf = cv2.imencode(".jpg", np.full((16, 16, 3), 90, np.uint8))
+    recorder.offer_event(100.5, {"camera_id": "cam", "kind": "valve", "keyframe": buf.tobytes()})
+    recorder.offer_event(101.0, {"camera_id": "cam", "kind": "gauge"})
+    recorder.close()
+    first, second = FlightLog(str(tmp_path)).events()
+    assert "keyframe" not in first and first["segment"].startswith("cam_")
+    assert (tmp_path / first["snapshot"]).read_bytes() == buf.tobytes()
+    assert "snapshot" not in second
+    assert recorder.stats()["snapshots"] == 1 and recorder.stats()["missing"] == 1
+
+
+def test_write_behind_drops_frames_but_never_snapshots():
+    queue = WriteBehind(maxsize=2, drop_policy="oldest")
+    for t in range(3):
+        queue.put(Job("frame", float(t), "cam", None, {}))
+    queue.put(Job("snapshot", 9.0, "cam", None, {}))
+    assert queue.dropped == 1
+    assert [queue.get().t for _ in range(3)] == [9.0, 1.0, 2.0]
+    with pytest.raises(ValueError):
+        WriteBehind(drop_policy="random")
+
+
+def test_motion_gated_repeats_point_at_the_frame_they_repeat(recorder, ring, tmp_path):
+    ref = ring.write(np.full((16, 16, 3), 70, np.uint8))
+    for i in range(3):
+        assert recorder.offer_frame("cam", 100.0 + i, {"frame": ref, "gauge_psi": i})
+    recorder.offer_frame("cam", 112.0, {"frame": ref})  # the repeat opens a new segment
+    recorder.close()
+    log = FlightLog(str(tmp_path))
+    first, second = [log._index(p) for p in log.segments("cam")]
+    assert [e.get("repeat", False) for e in first] == [False, True, True]
+    assert {e["offset"] for e in first} == {0} and os.path.getsize(log.segments("cam")[0]) == first[0]["size"]
+    assert log.seek("cam", 101.5)["gauge_psi"] == 1
+    assert "repeat" not in second[0] and second[0]["offset"] == 0
+    assert recorder.stats()["written"] == 1 and recorder.stats()["repeated"] == 3
+    assert log.frame("cam", 112.0) == log.frame("cam", 100.0)
+
+
+def test_space_is_checked_between_rollovers(ring, tmp_path):
+    (tmp_path / "cam_1000.mjpeg").write_bytes(b"\xff" * 4096)
+    (tmp_path / "cam_1000.mjpeg.idx.jsonl").write_text("")
+    rec = FlightRecorder(ring, str(tmp_path), fps=0, max_bytes=1024, space_check_seconds=0.0)
+    rec.offer_frame("cam", 100.0, {"frame": ring.write(np.zeros((16, 16, 3), np.uint8))})
+    rec.close()
+    assert not (tmp_path / "cam_1000.mjpeg").exists() and rec.stats()["deleted"] == 1
+    assert len(FlightLog(str(tmp_path)).segments("cam")) == 1  # the live segment is kept
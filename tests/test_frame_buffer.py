@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+
+def frame(value, shape=(16, 16, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_write_then_read(ring):
+    ref = ring.write(frame(7))
+    assert ring.is_valid(ref)
+    assert (ring.view(ref) == 7).all()
+    assert (ring.copy(ref) == 7).all()
+
+
+def test_smaller_and_grey_frames_keep_their_shape(ring):
+    ref = ring.write(frame(3, (8, 10)))
+    assert ring.view(ref).shape == (8, 10)
+
+
+def test_reused_slot_invalidates_old_ref(ring):
+    old = ring.write(frame(1))
+    for i in range(ring.slots):
+        new = ring.write(frame(2 + i))
+    assert new.slot == old.slot and new.generation != old.generation
+    assert not ring.is_valid(old)
+    assert ring.view(old) is None
+    assert ring.copy(old) is None
+    assert (ring.view(new) == 1 + ring.slots).all()
+
+
+def test_copy_is_detached_from_the_slot(ring):
+    ref = ring.write(frame(5))
+    out = ring.copy(ref)
+    for i in range(ring.slots):
+        ring.write(frame(9))
+    assert (out == 5).all()
+
+
+def test_none_ref_is_invalid(ring):
+    assert not ring.is_valid(None)
+    assert ring.view(None) is None
+
+
+def test_rejects_oversized_and_non_uint8_frames(ring):
+    with pytest.raises(ValueError):
+        ring.write(frame(0, (32, 32, 3)))
+    with pytest.raises(ValueError):
+        ring.write(np.zeros((4, 4, 3), dtype=np.float32))
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+import ImageProcessing.gauge_ocr as gauge_ocr
+from ImageProcessing.gauge_ocr import GaugeOcr, Prepared, dhash
+
+
+def numeral(text):
+    crop = np.full((40, 60), 255, dtype=np.uint8)
+    cv2.putText(crop, text, (5, 32), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return crop
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    calls = []
+
+    def fake_batch(crops):
+        if crops:
+            calls.append(len(crops))
+        return [f"n{i}" for i in range(len(crops))]
+    monkeypatch.setattr(gauge_ocr, "ocr_batch", fake_batch)
+    return calls
+
+
+def prepared(*crops):
+    # One candidate per crop, spread over different cells of a 400x400 gauge
+    return Prepared((400, 400), [(c, [i * 100, 10, i * 100 + 60, 50], dhash(c)) for i, c in enumerate(crops)])
+
+
+def test_dhash_tolerates_blur_but_not_a_different_numeral():
+    crop = numeral("40")
+    blurred = cv2.GaussianBlur(crop, (3, 3), 0)
+    assert (dhash(crop) ^ dhash(blurred)).bit_count() <= 48
+    assert (dhash(crop) ^ dhash(numeral("100"))).bit_count() > 48
+
+
+def test_read_numerals_are_not_sent_to_tesseract_again(ocr_calls):
+    ocr = GaugeOcr()
+    first = ocr.resolve(prepared(numeral("20"), numeral("40")), gauge_id=1)
+    second = ocr.resolve(prepared(numeral("20"), numeral("40")), gauge_id=1)
+    assert first == second
+    assert ocr_calls == [2]  # one batched call, for the first frame only
+    assert (ocr.hits, ocr.misses) == (2, 2)
+
+
+def test_changed_crop_is_read_again(ocr_calls):
+    ocr = GaugeOcr()
+    ocr.resolve(prepared(numeral("20")), gauge_id=1)
+    ocr.resolve(prepared(numeral("100")), gauge_id=1)
+    assert ocr_calls == [1, 1]
+
+
+def test_cache_is_per_gauge_and_bounded(ocr_calls):
+    ocr = GaugeOcr(max_gauges=2)
+    for gauge in (1, 2, 3):
+        ocr.resolve(prepared(numeral("20")), gauge_id=gauge)
+    ocr.resolve(prepared(numeral("20")), gauge_id=1)  # evicted as least recently used
+    assert ocr_calls == [1, 1, 1, 1]
+    ocr.resolve(prepared(numeral("20")), gauge_id=3)
+    assert len(ocr_calls) == 4
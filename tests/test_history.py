@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from history import lttb, m4
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    t = np.arange(10_000, dtype=np.float64)
+    v = np.cumsum(rng.normal(size=len(t)))
+    v[1234] = 500.0  # a spike averaging would hide
+    return t, v
+
+
+def test_m4_output_bounds(series):
+    t, v = series
+    ts, vs = m4(t, v, v, v, v, t[0], t[-1], buckets=100)
+    assert len(ts) <= 4 * 100
+    assert np.all(np.diff(ts) >= 0)
+    assert ts[0] == t[0] and ts[-1] == t[-1]
+    # Every bucket's extremes survive, so the global ones do too
+    assert vs.max() == v.max() == 500.0 and vs.min() == v.min()
+
+
+def test_m4_empty():
+    ts, vs = m4(*(np.empty(0),) * 5, 0.0, 1.0, 10)
+    assert len(ts) == len(vs) == 0
+
+
+def test_lttb_output_bounds(series):
+    t, v = series
+    ts, vs = lttb(t, v, 200)
+    assert len(ts) == len(vs) == 200
+    assert ts[0] == t[0] and ts[-1] == t[-1]
+    assert np.all(np.diff(ts) > 0)
+    assert 500.0 in vs
+
+
+def test_lttb_passes_short_series_through(series):
+    t, v = series
+    ts, _ = lttb(t[:50], v[:50], 200)
+    assert len(ts) == 50
@@ -0,0 +1,17 @@
+import pytest
+
+from ImageProcessing.inference import _output_layout
+
+
+def test_output_layout_follows_the_shape_and_class_count():
+    assert _output_layout(6, 8400, 2) == "v8"
+    assert _output_layout(8400, 6, 2) == "v8t"
+    assert _output_layout(25200, 7, 2) == "v5"
+
+
+def test_a_transposed_output_without_class_names_is_refused():
+    assert _output_layout(5, 8400, 0) == "v8"
+    with pytest.raises(ValueError, match="class names"):
+        _output_layout(25200, 6, 0)  # one class with objectness, or two without
+    with pytest.raises(ValueError, match="columns"):
+        _output_layout(25200, 9, 2)
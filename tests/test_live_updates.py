@@ -0,0 +1,63 @@
+import json
+import threading
+
+from live_updates import LiveState, dashboard_fields, stream
+
+
+def events(text):
+    """(event, id, data) of SSE chunks."""
+    fields = dict(line.split(": ", 1) for line in text.strip().splitlines())
+    return fields.get("event"), int(fields["id"]) if "id" in fields else None, json.loads(fields.get("data", "null"))
+
+
+def test_update_only_counts_changes():
+    state = LiveState()
+    assert state.update({"temp": 20.0, "hum": 40.0}) == 1
+    assert state.update({"temp": 20.0}) is None
+    assert state.update({"temp": 21.0, "hum": 40.0}) == 2
+    assert state.snapshot() == (2, {"temp": 21.0, "hum": 40.0})
+
+
+def test_since_merges_the_missed_changes():
+    state = LiveState()
+    for temp in (20.0, 21.0, 22.0):
+        state.update({"temp": temp})
+    state.update({"hum": 50.0})
+    assert state.since(1) == (4, {"temp": 22.0, "hum": 50.0})
+    assert state.since(4) == (4, {})
+
+
+def test_since_asks_for_a_snapshot_when_history_is_gone():
+    state = LiveState(history=2)
+    for temp in range(5):
+        state.update({"temp": float(temp)})
+    assert state.since(1) == (5, None)  # seq 2 has left the history
+    assert state.since(3) == (5, {"temp": 4.0})
+    assert state.since(99) == (5, None)  # from a previous run of the app
+
+
+def test_stream_resumes_from_last_event_id():
+    state = LiveState()
+    for temp in (20.0, 21.0):
+        state.update({"temp": temp})
+    stop = threading.Event()
+    client = stream(state, last_id=1, stop=stop)
+    assert next(client).startswith("retry:")
+    assert events(next(client)) == ("delta", 2, {"temp": 21.0})
+    state.update({"hum": 40.0})
+    assert events(next(client)) == ("delta", 3, {"hum": 40.0})
+    stop.set()
+
+
+def test_stream_without_an_id_starts_with_a_snapshot():
+    state = LiveState()
+    state.update({"temp": 20.0})
+    client = stream(state)
+    next(client)
+    assert events(next(client)) == ("snapshot", 1, {"temp": 20.0})
+
+
+def test_dashboard_fields_round_sensor_noise():
+    fields = dashboard_fields("air_quality", {"temp": 20.0012, "hum": float("nan"), "samples": 9})
+    assert fields == {"temp": 20.0, "hum": None}
+    assert dashboard_fields("camera", {"names": []})["target_type"] == "--"
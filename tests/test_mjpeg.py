@@ -0,0 +1,72 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from mjpeg import ClientPacer, MjpegBroadcaster, Tier, mjpeg_stream
+
+
+@pytest.fixture
+def broadcaster(ring):
+    encoded = []
+
+    def encode(img, quality):
+        encoded.append((img.shape[:2], quality))
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return buf.tobytes()
+    b = MjpegBroadcaster(ring, encode, tiers=(Tier(1.0, 85), Tier(0.5, 50)))
+    b.encoded = encoded
+    return b
+
+
+def offer(broadcaster, ring, value):
+    assert broadcaster.offer(ring.write(np.full((16, 16, 3), value, dtype=np.uint8)))
+
+
+def test_each_frame_is_encoded_once_per_tier(broadcaster, ring):
+    offer(broadcaster, ring, 10)
+    first = broadcaster.jpeg(0)
+    assert broadcaster.jpeg(0) == first  # a second viewer gets the cached bytes
+    broadcaster.jpeg(1)
+    assert broadcaster.encoded == [((16, 16), 85), ((8, 8), 50)]
+    offer(broadcaster, ring, 20)
+    seq, _ = broadcaster.jpeg(0)
+    assert seq == 2 and broadcaster.encodes == 3
+
+
+def test_nothing_to_send_before_the_first_frame(broadcaster):
+    assert broadcaster.jpeg(0) == (0, None)
+
+
+def test_overwritten_frame_is_not_offered(broadcaster, ring):
+    ref = ring.write(np.zeros((16, 16, 3), dtype=np.uint8))
+    for _ in range(ring.slots):
+        ring.write(np.zeros((16, 16, 3), dtype=np.uint8))
+    assert not broadcaster.offer(ref)
+    assert broadcaster.seq == 0
+
+
+def test_pacer_steps_down_on_a_slow_link_and_back_up():
+    pacer = ClientPacer(tiers=3, budget=0.1, window=2)
+    for _ in range(4):
+        pacer.record(0.5)
+    assert pacer.tier == 2
+    for _ in range(2):
+        pacer.record(0.5)
+    assert pacer.tier == 2  # already the lowest tier
+    for _ in range(2):
+        pacer.record(0.01)
+    assert pacer.tier == 1
+
+
+def test_stream_sends_the_newest_frame_as_a_multipart_part(broadcaster, ring):
+    offer(broadcaster, ring, 10)
+    stop = threading.Event()
+    client = mjpeg_stream(broadcaster, max_fps=1000, tier=1, stop=stop)
+    part = next(client)
+    assert part.startswith(b"--frame\r\nContent-Type: image/jpeg\r\n")
+    assert broadcaster.clients == 1
+    stop.set()
+    client.close()
+    assert broadcaster.clients == 0
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from ImageProcessing.motion_gate import MotionGate
+
+
+def frame(value=100, square=None):
+    img = np.full((240, 320, 3), value, dtype=np.uint8)
+    if square is not None:
+        x = square
+        img[60:180, x:x + 120] = 255
+    return img
+
+
+@pytest.mark.parametrize("method, threshold", [("diff", 3.0), ("ssim", 0.97)])
+def test_still_scene_is_skipped_and_motion_passes(method, threshold):
+    gate = MotionGate(method=method, threshold=threshold)
+    assert gate.changed(frame(square=40))  # first frame always goes through
+    assert not gate.changed(frame(square=40))
+    assert gate.changed(frame(square=160))
+    assert gate.stats() == {"skipped": 1, "passed": 2}
+
+
+def test_slow_drift_is_measured_against_the_last_inferred_frame():
+    gate = MotionGate(threshold=3.0)
+    gate.changed(frame(100))
+    # Each step is below the threshold, but they add up against the reference
+    results = [gate.changed(frame(100 + 2 * i)) for i in range(1, 4)]
+    assert results == [False, True, False]
+
+
+def test_max_skip_lets_a_frame_through():
+    gate = MotionGate(max_skip=3)
+    results = [gate.changed(frame()) for _ in range(6)]
+    assert results == [True, False, False, False, True, False]
+
+
+def test_reset_and_bad_method():
+    gate = MotionGate()
+    gate.changed(frame())
+    gate.reset()
+    assert gate.changed(frame())
+    with pytest.raises(ValueError):
+        MotionGate(method="optical")
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from results_bus import ResultsBus
+
+
+def drain(sub):
+    out = []
+    while (msg := sub.get_nowait()) is not None:
+        out.append(msg.payload)
+    return out
+
+
+def test_conflate_keeps_only_the_newest():
+    bus = ResultsBus({"camera": {"policy": "conflate"}})
+    sub = bus.subscribe("camera")
+    for i in range(3):
+        bus.publish("camera", {"n": i})
+    assert drain(sub) == [{"n": 2}]
+    assert sub.stats()["camera"]["dropped"] == 2
+
+
+def test_keyed_conflate_keeps_the_newest_per_key():
+    bus = ResultsBus({"camera": {"policy": "conflate", "key": "camera_id"}})
+    sub = bus.subscribe("camera")
+    for cam, n in [("a", 1), ("b", 1), ("a", 2)]:
+        bus.publish("camera", {"camera_id": cam, "n": n})
+    assert drain(sub) == [{"camera_id": "b", "n": 1}, {"camera_id": "a", "n": 2}]
+    assert bus.latest("camera", key="b").payload["n"] == 1
+
+
+def test_fifo_drops_the_oldest_when_full():
+    bus = ResultsBus({"air": {"policy": "fifo", "maxsize": 2}})
+    sub = bus.subscribe("air")
+    for i in range(4):
+        bus.publish("air", i)
+    assert drain(sub) == [2, 3]
+
+
+def test_lossless_drops_nothing():
+    bus = ResultsBus({"events": {"policy": "lossless"}})
+    sub = bus.subscribe("events")
+    for i in range(100):
+        bus.publish("events", i)
+    assert drain(sub) == list(range(100))
+
+
+def test_slow_subscriber_only_loses_its_own_messages():
+    bus = ResultsBus({"air": {"policy": "fifo", "maxsize": 1}})
+    fast, slow = bus.subscribe("air"), bus.subscribe("air")
+    bus.publish("air", 1)
+    assert drain(fast) == [1]
+    bus.publish("air", 2)
+    assert drain(fast) == [2] and drain(slow) == [2]
+    assert slow.stats()["air"]["dropped"] == 1 and fast.stats()["air"]["dropped"] == 0
+
+
+def test_replay_last_and_unique_names():
+    bus = ResultsBus({"camera": {"policy": "conflate"}})
+    bus.publish("camera", "old")
+    a = bus.subscribe("camera", name="viewer", replay_last=True)
+    b = bus.subscribe("camera", name="viewer")
+    assert drain(a) == ["old"] and drain(b) == []
+    assert (a.name, b.name) == ("viewer", "viewer-2")
+
+
+def test_policy_and_topic_validation():
+    bus = ResultsBus()
+    with pytest.raises(ValueError):
+        bus.add_topic("x", policy="newest")
+    with pytest.raises(ValueError):
+        bus.add_topic("x", policy="fifo", key="id")
+    with pytest.raises(KeyError):
+        bus.publish("missing", 1)
+
+
+def test_get_wakes_on_publish_and_ends_on_close():
+    async def scenario():
+        bus = ResultsBus({"events": {"policy": "lossless"}})
+        sub = bus.subscribe("events")
+        asyncio.get_running_loop().call_soon(bus.publish, "events", "hello")
+        msg = await sub.get(timeout=1.0)
+        sub.close()
+        return msg.payload, await sub.get(timeout=1.0)
+    assert asyncio.run(scenario()) == ("hello", None)
@@ -0,0 +1,62 @@
+import logging
+
+import numpy as np
+import pytest
+
+from Air_Quality.sampler import RingBuffer, SensorSampler, summarise
+
+
+def test_ring_buffer_returns_the_last_samples_in_order():
+    buf = RingBuffer(4)
+    for i in range(6):
+        buf.append(float(i), t=100.0 + i)
+    assert buf.last(3).tolist() == [3.0, 4.0, 5.0]
+    assert buf.last(10).tolist() == [2.0, 3.0, 4.0, 5.0]  # capped at capacity
+    assert buf.last_times(2).tolist() == [104.0, 105.0]
+    assert buf.last(0).size == 0
+
+
+def test_ring_buffer_copies_out():
+    buf = RingBuffer(2)
+    buf.append(1.0, 0.0)
+    out = buf.last(1)
+    buf.append(2.0, 0.0)
+    buf.append(3.0, 0.0)
+    assert out.tolist() == [1.0]
+
+
+def test_summarise_ignores_missing_samples():
+    assert summarise(np.array([np.nan, 2.0, 4.0, np.nan])) == \
+        {"mean": 3.0, "min": 2.0, "max": 4.0, "last": 4.0, "n": 2}
+    assert summarise(np.array([np.nan])) is None
+
+
+def test_drain_returns_each_sample_once():
+    values = iter(range(100))
+    sampler = SensorSampler(lambda: {"temp": float(next(values)), "hum": None}, ["temp", "hum"])
+    for _ in range(3):
+        sampler.sample_once()
+    first = sampler.drain(with_times=True)
+    assert first["temp"].tolist() == [0.0, 1.0, 2.0] and len(first["t"]) == 3
+    assert np.isnan(first["hum"]).all()
+    sampler.sample_once()
+    assert sampler.aggregate()["temp"]["n"] == 1
+
+
+def test_failing_reads_are_counted_and_logged_once(caplog):
+    def broken():
+        raise OSError("i2c bus gone")
+    sampler = SensorSampler(broken, ["temp"])
+    with caplog.at_level(logging.ERROR):
+        for _ in range(5):
+            sampler.sample_once()
+    assert sampler.errors == 5 and sampler.count == 0
+    assert len(caplog.records) == 1
+
+
+def test_window_in_seconds():
+    sampler = SensorSampler(lambda: {"temp": 1.0}, ["temp"], rate_hz=10.0, seconds=5.0)
+    for _ in range(30):
+        sampler.sample_once()
+    assert len(sampler.window("temp", 1.0)) == 10
+    assert sampler.mean("temp", 1.0) == pytest.approx(1.0)
@@ -0,0 +1,58 @@
+import pytest
+
+from scheduler import Scheduler, ScheduledTask
+
+
+def task(policy, **kwargs):
+    return ScheduledTask(f"test-{policy}", 1.0, lambda: None, policy=policy, **kwargs)
+
+
+def test_on_time_step_keeps_the_grid():
+    for policy in ("skip", "catch_up", "coalesce"):
+        t = task(policy)
+        assert t._next_deadline(10.0, 10.5) == 11.0
+        assert t.missed == 0
+
+
+def test_skip_stays_on_the_grid():
+    t = task("skip")
+    # Started at 10, finished at 12.5: deadlines 11 and 12 were missed
+    assert t._next_deadline(10.0, 12.5) == 13.0
+    assert t.missed == 2
+
+
+def test_catch_up_runs_missed_steps_straight_away():
+    t = task("catch_up", max_backlog=5)
+    assert t._next_deadline(10.0, 12.5) == 11.0
+    assert t.missed == 0
+
+
+def test_catch_up_gives_up_on_a_deep_backlog():
+    t = task("catch_up", max_backlog=1)
+    assert t._next_deadline(10.0, 13.5) == 14.0
+    assert t.missed == 3
+
+
+def test_coalesce_runs_once_now_and_restarts_the_grid():
+    t = task("coalesce")
+    assert t._next_deadline(10.0, 12.5) == 12.5
+    assert t.missed == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        task("drop")
+
+
+def test_adapt_slows_lower_priority_tasks_while_saturated():
+    sched = Scheduler(slow_factor=2.0)
+    camera = sched.add("camera-adapt", 0.2, lambda: None, priority=0)
+    sensors = sched.add("sensors-adapt", 2.0, lambda: None, priority=1, max_interval=5.0)
+    camera.load = 1.0
+    sched.adapt()
+    sched.adapt()
+    assert sensors.interval == 5.0
+    camera.load = 0.1
+    for _ in range(3):
+        sched.adapt()
+    assert sensors.interval == 2.0
@@ -0,0 +1,84 @@
+import struct
+
+import numpy as np
+import pytest
+
+from timeseries import HEADER_SIZE, RAW_COLUMNS, Segment, TimeSeriesStore
+
+T0 = 1_700_000_000.0
+
+
+def store(path, **kwargs):
+    return TimeSeriesStore(str(path), segment_records=kwargs.pop("segment_records", 1024), **kwargs)
+
+
+def test_append_and_query_across_segments(tmp_path):
+    ts = store(tmp_path, segment_records=1024)
+    t = T0 + np.arange(3000) * 0.1
+    ts.append_many("temp", t, np.arange(3000.0))
+    out = ts.query("temp", T0 + 10, T0 + 20)
+    assert out["t"][0] == pytest.approx(T0 + 10) and len(out["v"]) == 101
+    assert ts.span("temp") == (T0, t[-1])
+    ts.close()
+
+
+def test_out_of_order_samples_are_dropped(tmp_path):
+    ts = store(tmp_path)
+    ts.append("temp", T0 + 2, 1.0)
+    ts.append("temp", T0 + 1, 2.0)
+    assert ts.query("temp")["v"].tolist() == [1.0]
+    ts.close()
+
+
+def test_rollups_summarise_each_bucket(tmp_path):
+    ts = store(tmp_path, levels=(10,))
+    ts.append_many("temp", T0 + np.arange(25.0), np.arange(25.0))
+    out = ts.query("temp", level="10s")
+    assert out["n"].tolist() == [10, 10, 5]  # the last bucket is still open
+    assert out["mean"].tolist() == [4.5, 14.5, 22.0]
+    assert out["min"].tolist() == [0, 10, 20] and out["max"].tolist() == [9, 19, 24]
+    ts.close()
+
+
+def test_unflushed_records_are_trimmed_on_open(tmp_path):
+    path = str(tmp_path / "000000.seg")
+    seg = Segment(path, RAW_COLUMNS, 16)
+    for i in range(3):
+        seg.append((T0 + i, float(i)))
+    seg.close()
+    # The header reached the card but the last two rows didn't (zeros), as after a power cut
+    with open(path, "r+b") as f:
+        f.seek(16)
+        f.write(struct.pack("<Q", 5))
+    seg = Segment(path, RAW_COLUMNS, 16)
+    assert seg.count == 3
+    seg.close()
+
+
+def test_records_going_back_in_time_are_trimmed(tmp_path):
+    path = str(tmp_path / "000000.seg")
+    seg = Segment(path, RAW_COLUMNS, 16)
+    for i in range(4):
+        seg.append((T0 + i, float(i)))
+    seg.close()
+    # Row 2's timestamp page is stale: older than row 1
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + 2 * 8)
+        f.write(struct.pack("<d", T0 - 100))
+    seg = Segment(path, RAW_COLUMNS, 16)
+    assert seg.count == 2
+    seg.close()
+
+
+def test_open_rollup_buckets_are_rebuilt_after_a_restart(tmp_path):
+    ts = store(tmp_path, levels=(10,))
+    ts.append_many("temp", T0 + np.arange(15.0), np.arange(15.0))
+    ts.flush()
+    ts.close()  # the open 10-19 s bucket only lived in memory
+
+    ts = store(tmp_path, levels=(10,))
+    ts.append_many("temp", T0 + np.arange(15.0, 25.0), np.arange(15.0, 25.0))
+    out = ts.query("temp", level="10s")
+    assert out["n"].tolist() == [10, 10, 5]
+    assert out["mean"].tolist() == [4.5, 14.5, 22.0]
+    ts.close()
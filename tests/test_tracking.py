@@ -0,0 +1,70 @@
+import itertools
+import types
+
+import numpy as np
+import pytest
+
+import ImageProcessing.tracking as tracking
+from ImageProcessing.tracking import AngleSmoother, DetectionTracker, needle_angle
+
+
+def scene(dx=0):
+    # A textured square on a flat background, shifted right by dx pixels
+    rng = np.random.default_rng(0)
+    frame = np.full((240, 320, 3), 40, dtype=np.uint8)
+    frame[80:160, 100 + dx:180 + dx] = rng.integers(0, 255, (80, 80, 3), dtype=np.uint8)
+    return frame
+
+
+def det(name="gauge", bbox=(100, 80, 180, 160), conf=0.99):
+    return {"name": name, "conf": conf, "bbox": np.array(bbox, np.float32)}
+
+
+def test_detection_schedule():
+    tracker = DetectionTracker(detect_every=3)
+    assert tracker.needs_detection()
+    tracker.update(scene(), [det()])
+    for _ in range(3):
+        assert not tracker.needs_detection()
+        tracker.propagate(scene())
+    assert tracker.needs_detection()
+
+
+def test_low_confidence_forces_the_detector():
+    tracker = DetectionTracker(low_conf=0.95)
+    tracker.update(scene(), [det(conf=0.9)])
+    assert tracker.needs_detection()
+
+
+def test_track_ids_are_stable_per_class():
+    tracker = DetectionTracker()
+    first = tracker.update(scene(), [det(), det("marker", (10, 10, 40, 40))])
+    again = tracker.update(scene(), [det(bbox=(104, 80, 184, 160)), det("valve_open", (10, 10, 40, 40))])
+    ids = {d["name"]: d["track_id"] for d in first}
+    assert again[0]["track_id"] == ids["gauge"]
+    assert again[1]["track_id"] not in ids.values()
+
+
+def test_propagate_follows_the_object(monkeypatch):
+    # Frames 0.2 s apart, as at the camera's 5 Hz
+    clock = itertools.count(0.0, 0.2)
+    monkeypatch.setattr(tracking, "time", types.SimpleNamespace(monotonic=lambda: next(clock)))
+    tracker = DetectionTracker(track_width=320)
+    tracker.update(scene(), [det()])
+    for step in range(1, 4):
+        out = tracker.propagate(scene(dx=4 * step))
+    x1 = float(out[0]["bbox"][0])
+    assert out[0]["tracked"] and x1 == pytest.approx(112, abs=3)
+
+
+def test_angle_smoother_takes_the_short_way_round():
+    smoother = AngleSmoother(alpha=0.5)
+    smoother.update(355.0)
+    assert smoother.update(15.0) == pytest.approx(5.0)
+
+
+def test_needle_angle_is_continuous_below_right():
+    centre = (0, 0)
+    assert needle_angle(centre, (0, 1)) == pytest.approx(0.0)
+    assert needle_angle(centre, (1, 1)) == pytest.approx(315.0)
+    assert needle_angle(centre, (1, 0)) == pytest.approx(270.0)
@@ -0,0 +1,444 @@
+# timeseries.py
+# Embedded time-series store for sensor and detection history.
+#
+# Each series is a directory of fixed-size, memory-mapped segment files holding
+# float64 columns (raw samples: t, v). Writes only ever append: values are
+# written into the mapped pages first and the record count in the header is
+# bumped afterwards, and the kernel writes pages back on its own schedule (plus
+# an msync from flush() every few seconds) so sampling never waits on an fsync.
+# Rollups at 1 s, 10 s and 60 s (n, mean, min, max, last per bucket) are kept
+# incrementally as further series, so whole-flight queries read a few thousand
+# rows instead of every sample.
+#
+# Crash safety: pages may reach the SD card in any order, so on open each
+# segment's count is checked against the data (timestamps must be positive and
+# non-decreasing) and trimmed to the last valid record, and the rollup buckets
+# that were still open are rebuilt from the raw tail.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAGIC = b"EGHTS001"
+HEADER_SIZE = 64          # magic, ncols (u32), capacity (u32), count (u64), padding
+_COUNT_OFFSET = 16
+RAW_COLUMNS = ("t", "v")
+ROLLUP_COLUMNS = ("t", "n", "mean", "min", "max", "last")
+DEFAULT_LEVELS = (1, 10, 60)  # rollup bucket widths in seconds
+
+_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def level_name(width: int) -> str:
+    return f"{width}s"
+
+
+class Segment:
+    """One memory-mapped file of `capacity` rows of float64 columns."""
+
+    def __init__(self, path: str, columns: Sequence[str], capacity: int):
+        self.path = path
+        self.columns = tuple(columns)
+        new = not os.path.exists(path)
+        size = HEADER_SIZE + len(columns) * capacity * 8
+        self._f = open(path, "w+b" if new else "r+b")
+        if new:
+            self._f.write(MAGIC + struct.pack("<II", len(columns), capacity) + bytes(HEADER_SIZE - 16))
+            self._f.truncate(size)  # sparse; pages are only allocated as they are written
+            self._f.flush()
+        else:
+            magic, ncols, cap = struct.unpack("<8sII", self._f.read(16))
+            if magic != MAGIC or ncols != len(columns):
+                raise ValueError(f"{path} is not a {len(columns)}-column time-series segment")
+            capacity = cap
+            size = HEADER_SIZE + ncols * cap * 8
+        self.capacity = capacity
+        self._mm = mmap.mmap(self._f.fileno(), size)
+        self._count = np.ndarray((1,), np.uint64, buffer=self._mm, offset=_COUNT_OFFSET)
+        self.cols = {
+            name: np.ndarray((capacity,), np.float64, buffer=self._mm, offset=HEADER_SIZE + i * capacity * 8)
+            for i, name in enumerate(self.columns)
+        }
+        if not new:
+            self._recover()
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def _recover(self) -> None:
+        n = min(self.count, self.capacity)
+        t = self.cols["t"][:n]
+        bad = np.flatnonzero(~(t > 0) | (np.diff(t, prepend=0.0) < 0))
+        if bad.size:
+            logging.warning(f"{self.path}: trimming {n - bad[0]} unflushed records after a crash")
+            n = int(bad[0])
+        self._count[0] = n
+
+    @property
+    def first_t(self) -> float:
+        return float(self.cols["t"][0]) if self.count else math.inf
+
+    @property
+    def last_t(self) -> float:
+        return float(self.cols["t"][self.count - 1]) if self.count else -math.inf
+
+    def append(self, row: Sequence[float]) -> None:
+        i = self.count
+        for col, value in zip(self.cols.values(), row):
+            col[i] = value
+        self._count[0] = i + 1  # commit after the data
+
+    def append_many(self, columns: Sequence[np.ndarray]) -> int:
+        """Appends as many rows as fit; returns how many were written."""
+        i = self.count
+        n = min(len(columns[0]), self.capacity - i)
+        for col, values in zip(self.cols.values(), columns):
+            col[i:i + n] = values[:n]
+        self._count[0] = i + n
+        return n
+
+    def range(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        n = self.count
+        t = self.cols["t"][:n]
+        lo = int(np.searchsorted(t, start, "left"))
+        hi = int(np.searchsorted(t, end, "right"))
+        return {name: col[lo:hi] for name, col in self.cols.items()}
+
+    def flush(self) -> None:
+        self._mm.flush()
+
+    def close(self) -> None:
+        self.cols = {}
+        self._count = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # a caller still holds a view; the map is released when it is collected
+        self._f.close()
+
+
+class Column:
+    """An append-only table (raw series or one rollup level) spread over numbered segments."""
+
+    def __init__(self, path: str, columns: Sequence[str], segment_records: int):
+        self.path = path
+        self.columns = tuple(columns)
+        self.segment_records = segment_records
+        os.makedirs(path, exist_ok=True)
+        names = sorted(f for f in os.listdir(path) if f.endswith(".seg"))
+        self.segments: List[Segment] = [Segment(os.path.join(path, f), columns, segment_records) for f in names]
+        self._dirty_from: Optional[int] = None  # first segment written since the last flush()
+
+    def _tail(self) -> Segment:
+        if not self.segments or self.segments[-1].full:
+            name = os.path.join(self.path, f"{len(self.segments):06d}.seg")
+            self.segments.append(Segment(name, self.columns, self.segment_records))
+        return self.segments[-1]
+
+    @property
+    def last_t(self) -> float:
+        return self.segments[-1].last_t if self.segments else -math.inf
+
+    def _mark_dirty(self) -> None:
+        if self._dirty_from is None:
+            self._dirty_from = len(self.segments) - 1
+
+    def append(self, row: Sequence[float]) -> None:
+        self._tail().append(row)
+        self._mark_dirty()
+
+    def append_many(self, columns: Sequence[np.ndarray]) -> None:
+        done, total = 0, len(columns[0])
+        while done < total:
+            done += self._tail().append_many([c[done:] for c in columns])
+            self._mark_dirty()
+
+    def query(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        parts = [s.range(start, end) for s in self.segments if s.count and s.last_t >= start and s.first_t <= end]
+        if not parts:
+            return {name: np.empty(0) for name in self.columns}
+        if len(parts) == 1:
+            return {name: col.copy() for name, col in parts[0].items()}
+        return {name: np.concatenate([p[name] for p in parts]) for name in self.columns}
+
+    def flush(self) -> None:
+        if self._dirty_from is not None:
+            for s in self.segments[self._dirty_from:]:
+                s.flush()
+            self._dirty_from = None
+
+    def close(self) -> None:
+        for s in self.segments:
+            s.close()
+
+
+class _Bucket:
+    """Rollup accumulator for the bucket currently being filled."""
+
+    __slots__ = ("t", "n", "sum", "min", "max", "last")
+
+    def __init__(self, t: float):
+        self.t = t
+        self.n = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last = math.nan
+
+    def row(self) -> Tuple[float, ...]:
+        return (self.t, self.n, self.sum / self.n, self.min, self.max, self.last)
+
+
+class Rollup:
+    def __init__(self, column: Column, width: int):
+        self.column = column
+        self.width = width
+        self.bucket: Optional[_Bucket] = None
+
+    def _emit(self) -> None:
+        if self.bucket is not None and self.bucket.n:
+            self.column.append(self.bucket.row())
+
+    def add(self, t: float, v: float) -> None:
+        if v != v:  # NaN: a missing reading, not a value
+            return
+        start = math.floor(t / self.width) * self.width
+        b = self.bucket
+        if b is None or start != b.t:
+            self._emit()
+            b = self.bucket = _Bucket(start)
+        b.n += 1
+        b.sum += v
+        if v < b.min:
+            b.min = v
+        if v > b.max:
+            b.max = v
+        b.last = v
+
+    def add_many(self, t: np.ndarray, v: np.ndarray) -> None:
+        ok = ~np.isnan(v)
+        t, v = t[ok], v[ok]
+        if not t.size:
+            return
+        starts = np.floor(t / self.width) * self.width
+        idx = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        ends = np.r_[idx[1:], t.size]
+        sums = np.add.reduceat(v, idx)
+        mins = np.minimum.reduceat(v, idx)
+        maxs = np.maximum.reduceat(v, idx)
+        # One Python iteration per bucket spanned, not per sample
+        for k, i in enumerate(idx):
+            start = starts[i]
+            b = self.bucket
+            if b is None or start != b.t:
+                self._emit()
+                b = self.bucket = _Bucket(float(start))
+            b.n += int(ends[k] - i)
+            b.sum += float(sums[k])
+            b.min = min(b.min, float(mins[k]))
+            b.max = max(b.max, float(maxs[k]))
+            b.last = float(v[ends[k] - 1])
+
+    def open_bucket(self) -> Optional[Tuple[float, ...]]:
+        """The bucket still being filled, so queries can include the current second/minute."""
+        return self.bucket.row() if self.bucket is not None and self.bucket.n else None
+
+
+class Series:
+    def __init__(self, root: str, name: str, segment_records: int, levels: Iterable[int]):
+        self.name = name
+        path = os.path.join(root, name)
+        self.raw = Column(os.path.join(path, "raw"), RAW_COLUMNS, segment_records)
+        self.rollups: Dict[str, Rollup] = {
+            level_name(w): Rollup(Column(os.path.join(path, level_name(w)), ROLLUP_COLUMNS,
+                                         max(1024, segment_records // w)), w)
+            for w in levels
+        }
+        self._rebuild_open_buckets()
+
+    def _rebuild_open_buckets(self) -> None:
+        # Raw samples after the last completed bucket of each level were still in memory
+        for r in self.rollups.values():
+            after = r.column.last_t + r.width if r.column.last_t > -math.inf else -math.inf
+            tail = self.raw.query(after, math.inf)
+            if tail["t"].size:
+                r.add_many(tail["t"], tail["v"])
+
+    @property
+    def last_t(self) -> float:
+        return self.raw.last_t
+
+    def append(self, t: float, v: float) -> None:
+        if t < self.raw.last_t:
+            return  # append-only: out-of-order samples are dropped
+        self.raw.append((t, v))
+        for r in self.rollups.values():
+            r.add(t, v)
+
+    def append_many(self, t: np.ndarray, v: np.ndarray) -> None:
+        t = np.asarray(t, np.float64)
+        v = np.asarray(v, np.float64)
+        keep = t >= max(self.raw.last_t, 0.0)
+        if not keep.all():
+            t, v = t[keep], v[keep]
+        if not t.size:
+            return
+        if np.any(np.diff(t) < 0):
+            order = np.argsort(t, kind="stable")
+            t, v = t[order], v[order]
+        self.raw.append_many((t, v))
+        for r in self.rollups.values():
+            r.add_many(t, v)
+
+    def query(self, start: float, end: float, level: str = "raw") -> Dict[str, np.ndarray]:
+        if level == "raw":
+            return self.raw.query(start, end)
+        r = self.rollups[level]
+        out = r.column.query(start, end)
+        open_row = r.open_bucket()
+        if open_row is not None and start <= open_row[0] <= end:
+            out = {name: np.append(out[name], open_row[i]) for i, name in enumerate(ROLLUP_COLUMNS)}
+        return out
+
+    def flush(self) -> None:
+        self.raw.flush()
+        for r in self.rollups.values():
+            r.column.flush()
+
+    def close(self) -> None:
+        self.raw.close()
+        for r in self.rollups.values():
+            r.column.close()
+
+
+class TimeSeriesStore:
+    """Named series of (time, value) samples under one directory.
+
+    Only one writer (the recorder on the event loop) should append; queries
+    from other threads only ever see committed records.
+    """
+
+    def __init__(self, root: str, segment_records: int = 65536, levels: Iterable[int] = DEFAULT_LEVELS):
+        self.root = root
+        self.segment_records = segment_records
+        self.levels = tuple(levels)
+        os.makedirs(root, exist_ok=True)
+        self._series: Dict[str, Series] = {}
+        for name in sorted(os.listdir(root)):
+            if os.path.isdir(os.path.join(root, name)) and _NAME.match(name):
+                self._series[name] = Series(root, name, segment_records, self.levels)
+
+    @property
+    def level_names(self) -> List[str]:
+        return ["raw"] + [level_name(w) for w in self.levels]
+
+    def series(self) -> List[str]:
+        return sorted(self._series)
+
+    def _get(self, name: str, create: bool = False) -> Optional[Series]:
+        s = self._series.get(name)
+        if s is None and create:
+            if not _NAME.match(name):
+                raise ValueError(f"bad series name {name!r}")
+            s = self._series[name] = Series(self.root, name, self.segment_records, self.levels)
+        return s
+
+    def append(self, name: str, t: float, value: Optional[float]) -> None:
+        self._get(name, create=True).append(float(t), math.nan if value is None else float(value))
+
+    def append_many(self, name: str, t, values) -> None:
+        self._get(name, create=True).append_many(t, values)
+
+    def query(self, name: str, start: Optional[float] = None, end: Optional[float] = None,
+              level: str = "raw") -> Dict[str, np.ndarray]:
+        """Columns of `name` with start <= t <= end: t, v for raw; t, n, mean, min, max, last for rollups."""
+        if level not in self.level_names:
+            raise ValueError(f"unknown level {level!r}, expected one of {self.level_names}")
+        s = self._get(name)
+        if s is None:
+            cols = RAW_COLUMNS if level == "raw" else ROLLUP_COLUMNS
+            return {c: np.empty(0) for c in cols}
+        return s.query(-math.inf if start is None else start, math.inf if end is None else end, level)
+
+    def span(self, name: str) -> Optional[Tuple[float, float]]:
+        s = self._get(name)
+        if s is None or not s.raw.segments or not s.raw.segments[0].count:
+            return None
+        return s.raw.segments[0].first_t, s.last_t
+
+    def flush(self) -> None:
+        for s in list(self._series.values()):
+            s.flush()
+
+    def close(self) -> None:
+        for s in self._series.values():
+            s.close()
+        self._series = {}
+
+
+# Payload keys that become series, per bus topic
+AIR_QUALITY_SERIES = ("temp", "hum", "light", "press", "red_gas", "ox_gas", "nh3")
+CAMERA_SERIES = ("count", "gauge_theta", "gauge_psi")
+
+
+class TimeSeriesRecorder:
+    """Bus subscriber that writes camera and air quality payloads into the store."""
+
+    def __init__(self, store: TimeSeriesStore, bus, primary_camera: Optional[str] = None):
+        self.store = store
+        self.bus = bus
+        # Camera series keep their plain names for this camera; others become "<name>.<camera_id>"
+        self.primary_camera = primary_camera
+        self.records = 0
+
+    def record(self, msg) -> None:
+        p = msg.payload
+        if msg.topic == "air_quality":
+            # Every sensor sample, not just the 2 s means, when the task publishes them
+            samples = p.get("series")
+            if samples is not None and len(samples["t"]):
+                for name, values in samples.items():
+                    if name != "t":
+                        self.store.append_many(name, samples["t"], values)
+            # Means at publish time for anything that isn't sampled (compensated temperature)
+            for name in AIR_QUALITY_SERIES:
+                if p.get(name) is not None and (samples is None or name not in samples):
+                    self.store.append(name, msg.time, p[name])
+        elif msg.topic == "camera":
+            if p.get("reused"):
+                return  # motion gate skipped the frame; nothing new to store
+            camera_id = p.get("camera_id")
+            suffix = "" if camera_id is None or camera_id == self.primary_camera else f".{camera_id}"
+            for name in CAMERA_SERIES:
+                if p.get(name) is not None:
+                    self.store.append(name + suffix, msg.time, p[name])
+            if "Valve_position" in p:
+                self.store.append("valve_open" + suffix, msg.time, 1.0 if p["Valve_position"] == "open" else 0.0)
+        self.records += 1
+
+    async def run(self) -> None:
+        sub = self.bus.subscribe(["camera", "air_quality"], name="timeseries")
+        try:
+            async for msg in sub:
+                try:
+                    self.record(msg)
+                except Exception as e:
+                    logging.exception(f"timeseries: failed to record {msg.topic} #{msg.seq}: {e}")
+        except asyncio.CancelledError:
+            raise
+        finally:
+            sub.close()